@@ -11,8 +11,9 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models import SessionState
+from models import SessionState, TurnLog
 from services.azure_openai import chat_completion_json
+from services.llm_scheduler import Priority
 
 
 AUTOPSY_SYSTEM_PROMPT = """You are an expert teacher coach performing a post-session diagnostic autopsy.
@@ -60,30 +61,25 @@ Rules:
 """
 
 
-def _group_timeline_by_turn(timeline: list[dict]) -> list[dict]:
-    """Group timeline entries by teacher turn, collecting student responses that follow."""
+def _group_timeline_by_turn(timeline: TurnLog) -> list[dict]:
+    """Group timeline entries by teacher turn, collecting the student responses of that turn."""
     turns: list[dict] = []
-    current: dict | None = None
-
-    for entry in timeline:
-        if entry.get("speaker") == "teacher":
-            if current is not None:
-                turns.append(current)
-            current = {
-                "turn": entry.get("turn"),
-                "teacher_text": entry.get("text", ""),
-                "student_responses": [],
-            }
-        elif current is not None:
-            current["student_responses"].append({
-                "student": entry.get("speaker"),
-                "text": entry.get("text", ""),
-                "comprehension_delta": entry.get("comprehension_delta", 0),
-                "engagement_delta": entry.get("engagement_delta", 0),
-            })
-
-    if current is not None:
-        turns.append(current)
+
+    for entry in timeline.for_speaker("teacher"):
+        turns.append({
+            "turn": entry.get("turn"),
+            "teacher_text": entry.get("text", ""),
+            "student_responses": [
+                {
+                    "student": response.get("speaker"),
+                    "text": response.get("text", ""),
+                    "comprehension_delta": response.get("comprehension_delta", 0),
+                    "engagement_delta": response.get("engagement_delta", 0),
+                }
+                for response in timeline.for_turn(entry.get("turn", 0))
+                if response.get("speaker") != "teacher"
+            ],
+        })
 
     return turns
 
@@ -133,6 +129,7 @@ async def generate_autopsy(session: SessionState) -> list[dict]:
             messages=messages,
             temperature=0.3,   # low temperature for consistent diagnostic output
             max_tokens=min(max_tokens, 4000),
+            priority=Priority.ANALYSIS,  # never competes with live turns
         )
         return result.get("annotations", [])
     except Exception as e:
@@ -44,12 +44,13 @@ async def generate_feedback(session: SessionState) -> dict:
 
     import json
     from services.azure_openai import chat_completion
+    from services.llm_scheduler import Priority
 
     messages = [
         {"role": "system", "content": FEEDBACK_SYSTEM_PROMPT},
         {"role": "user", "content": json.dumps(summary, indent=2)},
     ]
-    feedback_text = await chat_completion(messages, json_mode=False)
+    feedback_text = await chat_completion(messages, json_mode=False, priority=Priority.ANALYSIS)
 
     return {
         "summary": summary,
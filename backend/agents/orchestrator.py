@@ -15,17 +15,22 @@ Interface contract with Dev 2:
 """
 
 import json
+import math
 import random
+import re
 import sys
 import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models import SessionState, EmotionalState
+import numpy as np
+
+from models import EMOTION_CODES, EMOTIONS, SessionState, EmotionalState
 from personas.personas import PERSONAS
 
 try:
     from services.azure_openai import chat_completion_json
+    from services.llm_scheduler import Priority
 except ImportError:
     chat_completion_json = None  # Dev 2's module not yet ready
 
@@ -81,6 +86,175 @@ def _is_group_address(teacher_input: str) -> bool:
     return any(kw in lower for kw in _GROUP_ADDRESS_KEYWORDS)
 
 
+# ---------------------------------------------------------------------------
+# Local fast path
+# ---------------------------------------------------------------------------
+
+# A student is selected when their score reaches _SELECT_THRESHOLD. If any score lands
+# within ORCHESTRATOR_FAST_PATH_MARGIN of it the turn is ambiguous and goes to the LLM.
+# A margin of 0.5 or more sends every turn to the LLM.
+_SELECT_THRESHOLD = 0.5
+_FAST_PATH_MARGIN = float(os.getenv("ORCHESTRATOR_FAST_PATH_MARGIN", "0.1"))
+
+# Statements draw far fewer replies than questions, so the likelihood is damped on them:
+# an eager Maya lands in the escalation band instead of answering every "Good job.".
+# Confused or anxious students may still answer a statement with a question, and the
+# class clown with an aside, so both get a flat bump that can put them in the band.
+_STATEMENT_DAMPING = 0.4
+_STATEMENT_QUESTION_BUMP = 0.25
+_CLASS_CLOWN_BUMP = 0.3
+# Logistic slope around the threshold: with the default margin, raw likelihoods within
+# about 0.08 of 0.5 are escalated.
+_SPREAD = 5.0
+
+_QUESTION_STARTERS = re.compile(
+    r"^\s*(who|what|when|where|why|how|which|can|could|would|do|does|did|is|are|anyone|any)\b",
+    re.IGNORECASE,
+)
+
+_fast_path_stats = {"fast_path": 0, "llm": 0}
+
+
+def _is_question(teacher_input: str) -> bool:
+    return "?" in teacher_input or bool(_QUESTION_STARTERS.match(teacher_input))
+
+
+def _is_named(student_name: str, teacher_input: str) -> bool:
+    return re.search(rf"\b{re.escape(student_name)}\b", teacher_input, re.IGNORECASE) is not None
+
+
+def _is_addressed(student_name: str, teacher_input: str) -> bool:
+    """Named as the addressee ("Priya — ...", "Jake!", "..., Maya?") rather than mentioned in passing."""
+    name = re.escape(student_name)
+    return re.search(
+        rf"\b{name}\b\s*(?:[,!?:;—–-]|$)|,\s*{name}\b", teacher_input, re.IGNORECASE
+    ) is not None
+
+
+def score_responders(teacher_input: str, session: SessionState) -> dict[str, float]:
+    """
+    Local 0-1 likelihood that each student responds this turn.
+
+    Combines the persona's base response_probability with current engagement,
+    emotional state, question detection, name mentions and the
+    consecutive_turns_speaking rule — the same signals the LLM orchestrator is
+    asked to weigh. A student who is mentioned but not addressed scores exactly
+    the threshold, so the LLM decides whether they react.
+    """
+    question = _is_question(teacher_input)
+    scores: dict[str, float] = {}
+    for sid, student in session.students.items():
+        if _is_named(student.name, teacher_input):
+            scores[sid] = 1.0 if _is_addressed(student.name, teacher_input) else _SELECT_THRESHOLD
+            continue
+        if student.consecutive_turns_speaking >= 2:
+            scores[sid] = 0.0
+            continue
+
+        persona = PERSONAS.get(sid)
+        score = (persona.response_probability if persona else 0.5) * (0.5 + student.engagement)
+
+        emotion = student.emotional_state
+        if emotion in (EmotionalState.bored, EmotionalState.distracted):
+            score *= 0.6
+        elif emotion in (EmotionalState.confused, EmotionalState.anxious):
+            if question:
+                score += 0.15  # may respond with questions
+        elif emotion in (EmotionalState.eager, EmotionalState.engaged):
+            score *= 1.15
+
+        if not question:
+            score *= _STATEMENT_DAMPING
+            if emotion in (EmotionalState.confused, EmotionalState.anxious):
+                score += _STATEMENT_QUESTION_BUMP
+            if student.persona == "class_clown":
+                score += _CLASS_CLOWN_BUMP
+        elif emotion not in (EmotionalState.bored, EmotionalState.distracted):
+            score *= 1.2
+
+        scores[sid] = 1.0 / (1.0 + math.exp(-_SPREAD * (score - _SELECT_THRESHOLD)))
+    return scores
+
+
+def _fast_path_responders(teacher_input: str, session: SessionState) -> list[dict] | None:
+    """Decide responders locally, or return None if the scores are too close to call."""
+    scores = score_responders(teacher_input, session)
+    if any(abs(score - _SELECT_THRESHOLD) < _FAST_PATH_MARGIN for score in scores.values()):
+        return None
+
+    named = {sid for sid, s in session.students.items() if _is_addressed(s.name, teacher_input)}
+    selected = sorted(
+        (sid for sid, score in scores.items() if score >= _SELECT_THRESHOLD),
+        key=lambda sid: (sid in named, scores[sid]),
+        reverse=True,
+    )
+    # Whether a classmate joins in next to a named student ("just you" vs. a debate
+    # others pile into) depends on wording the scores can't read
+    if named and selected[len(named):2]:
+        return None
+    return [
+        {"student_id": sid, "reason": "named by teacher" if sid in named else f"fast path score {scores[sid]:.2f}"}
+        for sid in selected[:2]
+    ]
+
+
+def needs_llm_decision(teacher_input: str, session: SessionState) -> bool:
+    """True if decide_responders() will escalate this input to the LLM orchestrator."""
+    return not _is_group_address(teacher_input) and _fast_path_responders(teacher_input, session) is None
+
+
+# Reasons that make a reply independent of classmates' replies this turn
+_INDEPENDENT_REASONS = ("named by teacher", "direct question fallback", "chaos_resolution")
+_DEBATE_REASON = re.compile(
+    r"\b(disagree|debate|argu|react|respond(s|ing)? to|build(s|ing)? on|correct|challeng|classmate)",
+    re.IGNORECASE,
+)
+_scheduling_stats = {"sequential": 0, "first_then_parallel": 0, "parallel": 0}
+
+
+def resolve_scheduling(mode: str, responders: list[dict], session: SessionState) -> str:
+    """
+    Pick how a turn's responders are generated.
+
+    Explicit modes are returned as-is. "auto" reads the orchestrator's reasons:
+    a reason that mentions a classmate or a debate means replies depend on each
+    other (sequential); replies to the teacher alone — named students, fallbacks,
+    chaos resolution — run in parallel; anything else lets the first reply set
+    the scene and the rest react to it together (first_then_parallel).
+    """
+    if mode == "auto" and len(responders) > 1:
+        reasons = [str(r.get("reason", "")) for r in responders]
+
+        def mentions_classmate(responder: dict) -> bool:
+            reason = str(responder.get("reason", ""))
+            return any(
+                _is_named(s.name, reason)
+                for sid, s in session.students.items() if sid != responder.get("student_id")
+            )
+
+        if any(_DEBATE_REASON.search(reason) for reason in reasons) or any(map(mentions_classmate, responders)):
+            mode = "sequential"
+        elif all(reason.startswith(_INDEPENDENT_REASONS) for reason in reasons):
+            mode = "parallel"
+        else:
+            mode = "first_then_parallel"
+    elif mode == "auto":
+        mode = "sequential"
+    _scheduling_stats[mode] += 1
+    return mode
+
+
+def get_orchestrator_stats() -> dict:
+    """How many turns were decided locally vs. escalated to the LLM orchestrator."""
+    total = _fast_path_stats["fast_path"] + _fast_path_stats["llm"]
+    return {
+        **_fast_path_stats,
+        "fast_path_fraction": round(_fast_path_stats["fast_path"] / total, 4) if total else 0.0,
+        "margin": _FAST_PATH_MARGIN,
+        "scheduling": dict(_scheduling_stats),
+    }
+
+
 # ---------------------------------------------------------------------------
 # decide_responders
 # ---------------------------------------------------------------------------
@@ -92,39 +266,18 @@ async def decide_responders(teacher_input: str, session: SessionState) -> list[d
 
     Returns a list of dicts: [{"student_id": str, "reason": str}]
     """
-    # Build a compact JSON summary of all students for the prompt
-    students_summary = {
-        sid: {
-            "engagement": round(s.engagement, 3),
-            "comprehension": round(s.comprehension, 3),
-            "emotional_state": s.emotional_state.value,
-            "consecutive_turns_speaking": s.consecutive_turns_speaking,
-        }
-        for sid, s in session.students.items()
-    }
-
-    user_message = (
-        f"Teacher said: \"{teacher_input}\"\n\n"
-        f"Current student states:\n{json.dumps(students_summary, indent=2)}\n\n"
-        f"Select 0-2 students to respond this turn. Remember: avoid students with "
-        f"consecutive_turns_speaking >= 2 unless the teacher directly addressed them."
-    )
-
-    messages = [
-        {"role": "system", "content": ORCHESTRATOR_SYSTEM_PROMPT},
-        {"role": "user", "content": user_message},
-    ]
+    # Group addresses and clear-cut turns are decided locally; only ambiguous
+    # turns pay for an LLM round trip.
+    if _is_group_address(teacher_input):
+        raw_responders = []
+    else:
+        raw_responders = _fast_path_responders(teacher_input, session)
 
-    # --- Call GPT-4o orchestrator ---
-    if chat_completion_json is not None:
-        try:
-            result = await chat_completion_json(messages)
-            raw_responders = result.get("responders", [])
-        except Exception:
-            raw_responders = _fallback_responders(session)
+    if raw_responders is not None:
+        _fast_path_stats["fast_path"] += 1
     else:
-        # Dev 2's service not yet available — use local heuristic fallback
-        raw_responders = _fallback_responders(session)
+        _fast_path_stats["llm"] += 1
+        raw_responders = await _llm_responders(teacher_input, session)
 
     # Validate responders
     valid_ids = set(session.students.keys())
@@ -158,6 +311,42 @@ async def decide_responders(teacher_input: str, session: SessionState) -> list[d
     return responders
 
 
+async def _llm_responders(teacher_input: str, session: SessionState) -> list:
+    """Ask the LLM orchestrator which students respond (unvalidated)."""
+    # Build a compact JSON summary of all students for the prompt
+    students_summary = {
+        sid: {
+            "engagement": round(s.engagement, 3),
+            "comprehension": round(s.comprehension, 3),
+            "emotional_state": s.emotional_state.value,
+            "consecutive_turns_speaking": s.consecutive_turns_speaking,
+        }
+        for sid, s in session.students.items()
+    }
+
+    user_message = (
+        f"Teacher said: \"{teacher_input}\"\n\n"
+        f"Current student states:\n{json.dumps(students_summary, indent=2)}\n\n"
+        f"Select 0-2 students to respond this turn. Remember: avoid students with "
+        f"consecutive_turns_speaking >= 2 unless the teacher directly addressed them."
+    )
+
+    messages = [
+        {"role": "system", "content": ORCHESTRATOR_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message},
+    ]
+
+    # --- Call GPT-4o orchestrator ---
+    if chat_completion_json is not None:
+        try:
+            result = await chat_completion_json(messages, priority=Priority.ORCHESTRATOR)
+            return result.get("responders", [])
+        except Exception:
+            return _fallback_responders(session)
+    # Dev 2's service not yet available — use local heuristic fallback
+    return _fallback_responders(session)
+
+
 def _fallback_responders(session: SessionState) -> list[dict]:
     """
     Heuristic fallback when the Azure OpenAI service is unavailable.
@@ -198,98 +387,124 @@ def update_student_states(session: SessionState, responses: list[dict]) -> None:
 
     Side effects:
     - Mutates session.students in place.
-    - Appends events to session.timeline.
-    """
-    responding_ids = {r["student_id"] for r in responses}
+    - Records each response that has text once in session.timeline.
 
-    # --- Apply updates for responding students ---
+    Works on the classroom arrays for the whole roster at once; responders are
+    expected to be distinct students (as decide_responders returns them).
+    """
+    classroom = session.students
+    rows: list[int] = []
+    comp_deltas: list[float] = []
+    eng_deltas: list[float] = []
+    emotions: list[int] = []
+    recorded: list[dict] = []
     for response in responses:
-        sid = response.get("student_id")
-        if sid not in session.students:
+        row = classroom.row(response.get("student_id"))
+        if row is None:
             continue
-        student = session.students[sid]
-
+        rows.append(row)
         # student_agent returns deltas on a 0-100 scale; session state uses 0.0-1.0
         # Divisor of 60 (instead of 100) amplifies reactions for more visible avatar changes
-        comp_delta = float(response.get("comprehension_delta", 0.0)) / 60.0
-        eng_delta = float(response.get("engagement_delta", 0.0)) / 60.0
-
-        new_emotion = response.get("emotional_state")
+        comp_deltas.append(float(response.get("comprehension_delta", 0.0)) / 60.0)
+        eng_deltas.append(float(response.get("engagement_delta", 0.0)) / 60.0)
+        emotions.append(EMOTION_CODES.get(response.get("emotional_state") or "", -1))
+        recorded.append(response)
 
+    # --- Apply updates for responding students ---
+    if rows:
+        idx = np.array(rows, dtype=np.intp)
+        emotion = np.array(emotions, dtype=np.int8)
+        eng_delta = np.array(eng_deltas)
         # Enforce consistency: bored/distracted can't have positive delta;
         # eager/engaged can't have negative delta. Other states allow either direction.
-        if new_emotion in ("bored", "distracted") and eng_delta > 0:
-            eng_delta = -abs(eng_delta)
-        elif new_emotion in ("eager", "engaged") and eng_delta < 0:
-            eng_delta = abs(eng_delta)
-
-        student.comprehension = _clamp(student.comprehension + comp_delta)
-        student.engagement = _clamp(student.engagement + eng_delta)
-
-        if new_emotion and new_emotion in EmotionalState._value2member_map_:
-            student.emotional_state = EmotionalState(new_emotion)
-
-        student.consecutive_turns_speaking += 1
-
-        # Append to timeline
-        session.timeline.append({
-            "turn": session.turn_count,
-            "speaker": sid,
-            "text": response.get("text", ""),
-            "emotional_state": student.emotional_state.value,
-            "engagement": round(student.engagement, 4),
-            "comprehension": round(student.comprehension, 4),
-        })
+        eng_delta = np.where(np.isin(emotion, _FALLING_EMOTIONS), -np.abs(eng_delta), eng_delta)
+        eng_delta = np.where(np.isin(emotion, _RISING_EMOTIONS), np.abs(eng_delta), eng_delta)
+
+        classroom.comprehension[idx] = np.clip(classroom.comprehension[idx] + comp_deltas, 0.0, 1.0)
+        classroom.engagement[idx] = np.clip(classroom.engagement[idx] + eng_delta, 0.0, 1.0)
+        known = emotion >= 0
+        classroom.emotion[idx[known]] = emotion[known]
+        classroom.consecutive[idx] += 1
+
+        # The turn log's only write for each response (prompts, hints, summary and autopsy all read it);
+        # silent replies change state but are not logged
+        for row, response in zip(rows, recorded):
+            if not response.get("text", "").strip():
+                continue
+            session.timeline.append({
+                "turn": session.turn_count,
+                "speaker": classroom.names[row],
+                "student_id": classroom.ids[row],
+                "text": response.get("text", ""),
+                "emotional_state": EMOTIONS[classroom.emotion[row]].value,
+                "engagement": round(float(classroom.engagement[row]), 4),
+                "comprehension": round(float(classroom.comprehension[row]), 4),
+                "comprehension_delta": response.get("comprehension_delta", 0),
+                "engagement_delta": response.get("engagement_delta", 0),
+            })
 
     # --- Apply passive drift for non-responding students ---
-    for sid, student in session.students.items():
-        if sid in responding_ids:
-            continue
-
-        # Engagement drift based on current emotional state (amplified for demo)
-        if student.emotional_state in (EmotionalState.bored, EmotionalState.distracted):
-            eng_drift = -0.06
-        elif student.emotional_state in (EmotionalState.anxious, EmotionalState.frustrated):
-            eng_drift = -0.04
-        elif student.emotional_state == EmotionalState.confused:
-            eng_drift = -0.02
-        elif student.emotional_state == EmotionalState.engaged:
-            eng_drift = +0.02
-        else:  # eager
-            eng_drift = -0.02  # eager students get restless when not called on
-
-        # Comprehension drifts down when student isn't actively responding
-        if student.emotional_state == EmotionalState.confused:
-            comp_drift = -0.04  # confusion deepens without intervention
-        elif student.emotional_state in (EmotionalState.bored, EmotionalState.distracted):
-            comp_drift = -0.02
-        else:
-            comp_drift = 0.0
-
-        student.engagement = _clamp(student.engagement + eng_drift)
-        student.comprehension = _clamp(student.comprehension + comp_drift)
-        student.consecutive_turns_speaking = 0
-
-        derived = _emotion_from_scores(student.engagement, student.comprehension)
-        if derived is not None:
-            student.emotional_state = derived
-
-
-def _emotion_from_scores(engagement: float, comprehension: float) -> EmotionalState | None:
-    """Derive a baseline emotional state from score levels for passive students."""
-    if engagement >= 0.65 and comprehension >= 0.55:
-        return EmotionalState.engaged
-    elif comprehension < 0.35:
-        return EmotionalState.confused
-    elif engagement < 0.30:
-        return EmotionalState.bored
-    elif engagement < 0.45:
-        return EmotionalState.distracted
-    return None  # keep current emotion (frustration/anxiety valid at mid-range scores)
-
-
-def _clamp(value: float, lo: float = 0.0, hi: float = 1.0) -> float:
-    return max(lo, min(hi, value))
+    passive = np.ones(len(classroom), dtype=bool)
+    passive[rows] = False
+    if not passive.any():
+        return
+    emotion = classroom.emotion[passive]
+    # Engagement drifts by emotional state (amplified for demo); comprehension
+    # drifts down when a student isn't actively responding
+    engagement = np.clip(classroom.engagement[passive] + _ENGAGEMENT_DRIFT[emotion], 0.0, 1.0)
+    comprehension = np.clip(classroom.comprehension[passive] + _COMPREHENSION_DRIFT[emotion], 0.0, 1.0)
+    classroom.engagement[passive] = engagement
+    classroom.comprehension[passive] = comprehension
+    classroom.consecutive[passive] = 0
+
+    derived = _emotions_from_scores(engagement, comprehension)
+    classroom.emotion[passive] = np.where(derived >= 0, derived, emotion)
+
+
+def _emotion_table(values: dict[EmotionalState, float], default: float = 0.0) -> np.ndarray:
+    """Per-emotion constants as an array indexed by emotion code."""
+    return np.array([values.get(e, default) for e in EMOTIONS])
+
+
+_FALLING_EMOTIONS = [EMOTION_CODES["bored"], EMOTION_CODES["distracted"]]
+_RISING_EMOTIONS = [EMOTION_CODES["eager"], EMOTION_CODES["engaged"]]
+
+_ENGAGEMENT_DRIFT = _emotion_table({
+    EmotionalState.bored: -0.06,
+    EmotionalState.distracted: -0.06,
+    EmotionalState.anxious: -0.04,
+    EmotionalState.frustrated: -0.04,
+    EmotionalState.confused: -0.02,
+    EmotionalState.engaged: +0.02,
+    EmotionalState.eager: -0.02,  # eager students get restless when not called on
+})
+_COMPREHENSION_DRIFT = _emotion_table({
+    EmotionalState.confused: -0.04,  # confusion deepens without intervention
+    EmotionalState.bored: -0.02,
+    EmotionalState.distracted: -0.02,
+})
+
+
+def _emotions_from_scores(engagement: np.ndarray, comprehension: np.ndarray) -> np.ndarray:
+    """
+    Derive baseline emotion codes from score levels for passive students;
+    -1 keeps the current emotion (frustration/anxiety valid at mid-range scores).
+    """
+    return np.select(
+        [
+            (engagement >= 0.65) & (comprehension >= 0.55),
+            comprehension < 0.35,
+            engagement < 0.30,
+            engagement < 0.45,
+        ],
+        [
+            EMOTION_CODES["engaged"],
+            EMOTION_CODES["confused"],
+            EMOTION_CODES["bored"],
+            EMOTION_CODES["distracted"],
+        ],
+        default=-1,
+    ).astype(np.int8)
 
 
 # ---------------------------------------------------------------------------
@@ -303,50 +518,39 @@ def generate_coaching_hint(session: SessionState) -> str:
     students = session.students
 
     # Priority 1: any student is confused
-    for sid, student in students.items():
-        if student.emotional_state == EmotionalState.confused:
-            return f"💡 {student.name} looks confused — try simplifying your language"
+    confused = np.flatnonzero(students.emotion == EMOTION_CODES["confused"])
+    if confused.size:
+        return f"💡 {students.names[confused[0]]} looks confused — try simplifying your language"
 
     # Priority 2: low engagement + bored/distracted
-    for sid, student in students.items():
-        if student.engagement < 0.35 and student.emotional_state in (
-            EmotionalState.bored, EmotionalState.distracted
-        ):
-            return f"⚠️ {student.name} is disengaging — try calling on them directly"
+    disengaging = np.flatnonzero((students.engagement < 0.35) & np.isin(students.emotion, _FALLING_EMOTIONS))
+    if disengaging.size:
+        return f"⚠️ {students.names[disengaging[0]]} is disengaging — try calling on them directly"
 
     # Priority 3: student hasn't spoken in last 5 teacher turns
-    # Find non-teacher speakers in the last 5 teacher-turn entries
-    teacher_turns = [e for e in session.timeline if e.get("speaker") == "teacher"]
+    # A student's latest entry tells whether they spoke since the 5th-last teacher turn
+    teacher_turns = session.timeline.for_speaker("teacher")
     cutoff_turn = teacher_turns[-5]["turn"] if len(teacher_turns) >= 5 else 0
-    recent_speakers = {
-        e["speaker"]
-        for e in session.timeline
-        if e.get("speaker") != "teacher" and e.get("turn", 0) >= cutoff_turn
-    }
     for sid, student in students.items():
-        if sid not in recent_speakers:
+        spoken = session.timeline.for_speaker(sid)
+        if not spoken or spoken[-1].get("turn", 0) < cutoff_turn:
             return f"⚠️ {student.name} hasn't spoken in a while — consider calling on them"
 
     # Priority 4: student just re-engaged (was bored/distracted last turn, now engaged & high)
     # Check by looking at the second-to-last timeline entry for each student
-    student_timeline: dict[str, list[dict]] = {sid: [] for sid in students}
-    for event in session.timeline:
-        spk = event.get("speaker")
-        if spk and spk in student_timeline:
-            student_timeline[spk].append(event)
-
     for sid, student in students.items():
+        spoken = session.timeline.for_speaker(sid)
         if (
             student.emotional_state == EmotionalState.engaged
             and student.engagement > 0.65
-            and len(student_timeline[sid]) >= 2
+            and len(spoken) >= 2
         ):
-            prev = student_timeline[sid][-2]
+            prev = spoken[-2]
             if prev.get("emotional_state") in ("bored", "distracted"):
                 return f"✅ {student.name} just re-engaged — keep the energy up"
 
     # Priority 5: all students highly engaged
-    if all(s.engagement >= 0.65 for s in students.values()):
+    if np.all(students.engagement >= 0.65):
         return "✅ Class is engaged — great pacing, keep it up"
 
     # Default fallback
@@ -384,12 +588,8 @@ def get_session_summary(session: SessionState) -> dict:
         ]
     }
     """
-    # Collect per-student timeline entries
-    student_turns: dict[str, list[dict]] = {sid: [] for sid in session.students}
-    for event in session.timeline:
-        sid = event.get("speaker")
-        if sid and sid in student_turns:
-            student_turns[sid].append(event)
+    # Per-student timeline entries
+    student_turns = {sid: session.timeline.for_speaker(sid) for sid in session.students}
 
     students_summary: dict[str, dict] = {}
     all_engagements: list[float] = []
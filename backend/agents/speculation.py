@@ -0,0 +1,118 @@
+"""
+Speculative student generation
+
+While the LLM orchestrator decides who responds, replies for the one or two
+students most likely to be picked (by the local scores in orchestrator.py) are
+generated in parallel. Once the decision arrives, a reply is committed only if
+the student was chosen and its prompt is still valid — i.e. it would have been
+generated with exactly the same history (first responder of the turn). Anything
+else is cancelled and counted as waste, as is a committed reply that fails or
+times out (the turn gets nothing from it). Generation never touches session state;
+all mutation still happens after the decision, in the turn loop.
+"""
+
+import asyncio
+
+from agents.orchestrator import score_responders
+from agents.student_agent import StudentResponse, estimate_prompt_tokens, generate_response
+from models import SessionState
+
+_MAX_SPECULATIVE = 2
+# Students scoring below this are unlikely enough that speculating is pure waste
+_MIN_SCORE = 0.3
+
+_stats = {"turns": 0, "started": 0, "hits": 0, "wasted": 0, "wasted_tokens": 0}
+
+
+class Speculation:
+    """In-flight speculative generations for one turn, keyed by student id."""
+
+    def __init__(self) -> None:
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._prompt_tokens: dict[str, int] = {}
+
+    def start(
+        self,
+        student_id: str,
+        student_state: dict,
+        teacher_input: str,
+        history: list[dict],
+        lesson_context: dict | None,
+        use_cache: bool = True,
+    ) -> None:
+        task = asyncio.ensure_future(
+            generate_response(student_state, teacher_input, history, lesson_context, use_cache=use_cache)
+        )
+        # Failures only matter if the reply is committed; don't warn about unretrieved errors
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[student_id] = task
+        self._prompt_tokens[student_id] = estimate_prompt_tokens(student_state, teacher_input, history, lesson_context)
+        _stats["started"] += 1
+
+    def take(self, student_id: str) -> asyncio.Task | None:
+        """
+        Commit the speculative reply for `student_id`, if one is running.
+
+        It counts as a hit once it returns a reply; if it fails or is cancelled
+        (e.g. by the caller's timeout) it counts as waste.
+        """
+        task = self._tasks.pop(student_id, None)
+        if task is not None:
+            prompt_tokens = self._prompt_tokens.pop(student_id, 0)
+
+            def settle(t: asyncio.Task) -> None:
+                if not t.cancelled() and t.exception() is None:
+                    _stats["hits"] += 1
+                else:
+                    _stats["wasted"] += 1
+                    _stats["wasted_tokens"] += prompt_tokens
+
+            task.add_done_callback(settle)
+        return task
+
+    def discard(self, student_id: str | None = None) -> None:
+        """Cancel one speculative generation (or all remaining ones) and account the waste."""
+        ids = [student_id] if student_id is not None else list(self._tasks)
+        for sid in ids:
+            task = self._tasks.pop(sid, None)
+            if task is None:
+                continue
+            wasted = self._prompt_tokens.pop(sid, 0)
+            if task.done() and not task.cancelled() and task.exception() is None:
+                wasted += _completion_tokens(task.result())
+            else:
+                task.cancel()
+            _stats["wasted"] += 1
+            _stats["wasted_tokens"] += wasted
+
+
+def _completion_tokens(response: StudentResponse) -> int:
+    return max(1, len(response.text) // 4)
+
+
+def speculate(
+    teacher_input: str,
+    session: SessionState,
+    student_states: dict[str, dict],
+    history: list[dict],
+    lesson_context: dict | None,
+) -> Speculation:
+    """Start generating replies for the students most likely to be selected this turn."""
+    _stats["turns"] += 1
+    speculation = Speculation()
+    scores = score_responders(teacher_input, session)
+    likely = sorted((sid for sid, score in scores.items() if score >= _MIN_SCORE), key=scores.get, reverse=True)
+    for sid in likely[:_MAX_SPECULATIVE]:
+        speculation.start(
+            sid, student_states[sid], teacher_input, history, lesson_context,
+            use_cache=session.config.response_cache,
+        )
+    return speculation
+
+
+def get_speculation_stats() -> dict:
+    settled = _stats["hits"] + _stats["wasted"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / settled, 4) if settled else 0.0,
+    }
@@ -5,12 +5,29 @@ Generates student responses based on persona, current state, and conversation co
 Each student agent embodies a distinct student archetype with unique personality and behavior patterns.
 """
 
+import hashlib
 import json
+import os
+import re
 from dataclasses import dataclass
-from typing import Literal
+from functools import lru_cache
+from typing import Awaitable, Callable, Literal
 
 from personas.personas import get_persona, PersonaDefinition, EmotionalState
-from services.azure_openai import chat_completion_json
+from services.azure_openai import chat_completion_json, chat_completion_stream
+from services.hedging import hedged
+from services.llm_scheduler import Priority, estimate_tokens
+from services.lru_cache import LRUCache
+
+# Timeline entries a student sees: the last 3 exchanges. Callers only need to pass this many.
+HISTORY_WINDOW = 6
+
+# Response cache for repeated (persona, state, teacher input, context) combinations.
+# STUDENT_CACHE_SIZE=0 disables it for the whole process.
+_response_cache = LRUCache(
+    max_entries=int(os.getenv("STUDENT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("STUDENT_CACHE_TTL", "300")),
+)
 
 
 @dataclass
@@ -32,6 +49,7 @@ class StudentState:
     response_history: list[str]
 
 
+@lru_cache(maxsize=32)
 def _grade_level_instruction(grade_level: str) -> str:
     """Return age-appropriate language and behavior instructions based on grade level."""
     grade_str = grade_level.lower().replace("grade", "").strip()
@@ -87,60 +105,69 @@ You are an upper high school student (age 16-18). Adjust your responses:
     return ""
 
 
-def _build_context_message(
-    state: StudentState,
-    persona: PersonaDefinition,
-    teacher_input: str,
-    history: list[dict],
-    lesson_context: dict | None = None,
-) -> str:
-    """Build the context message that includes current state and teacher input."""
+def _lesson_block(subject: str, topic: str, grade_level: str) -> str:
+    if not (subject or topic or grade_level):
+        return ""
+    return (
+        f"LESSON CONTEXT:\n"
+        f"- Subject: {subject or 'Unknown'}\n"
+        f"- Topic: {topic or 'Unknown'}\n"
+        f"- Grade level: {grade_level or 'Unknown'}\n\n"
+    )
 
-    # Grade level adaptation block
-    grade_level = lesson_context.get("grade_level", "") if lesson_context else ""
-    grade_instruction = _grade_level_instruction(grade_level) if grade_level else ""
 
-    # Lesson context block
-    if lesson_context:
-        lesson_block = (
-            f"LESSON CONTEXT:\n"
-            f"- Subject: {lesson_context.get('subject', 'Unknown')}\n"
-            f"- Topic: {lesson_context.get('topic', 'Unknown')}\n"
-            f"- Grade level: {lesson_context.get('grade_level', 'Unknown')}\n\n"
-        )
-    else:
-        lesson_block = ""
+def _lesson_key(lesson_context: dict | None) -> tuple[str, str, str]:
+    """(subject, topic, grade_level) — the hashable lesson part of a prompt prefix."""
+    if not lesson_context:
+        return ("", "", "")
+    return (
+        lesson_context.get("subject", ""),
+        lesson_context.get("topic", ""),
+        lesson_context.get("grade_level", ""),
+    )
 
-    # Recent history summary (last few exchanges)
+
+def _recent_history_block(history: list[dict]) -> str:
+    """Recent history summary (last few exchanges)."""
     recent_history = ""
     if history:
-        recent = history[-6:]  # Last 3 exchanges
+        recent = history[-HISTORY_WINDOW:]
         for entry in recent:
             speaker = entry.get("speaker", "unknown")
             text = entry.get("text", "")
             recent_history += f"  {speaker}: {text}\n"
+    return recent_history
+
 
-    triggers_block = "\n".join(
+def _triggers_block(persona: PersonaDefinition) -> str:
+    return "\n".join(
         f"  - {trigger.replace('_', ' ')}: → {emotion}"
         for trigger, emotion in persona.emotional_triggers.items()
     )
 
-    return f"""{grade_instruction}{lesson_block}CURRENT STATE:
-- Comprehension level: {state.comprehension}/100
-- Engagement level: {state.engagement}/100
-- Current emotion: {state.emotional_state}
 
-YOUR EMOTIONAL TRIGGERS:
-{triggers_block}
+@lru_cache(maxsize=256)
+def compile_prompt(persona_name: str, subject: str, topic: str, grade_level: str) -> str:
+    """
+    Build the immutable system prompt for one student in one lesson.
 
-RECENT CONVERSATION:
-{recent_history if recent_history else "  (Start of lesson)"}
+    Everything that does not change turn to turn — persona, grade adaptation,
+    lesson context, emotional triggers and the response contract — lives here,
+    ahead of any per-turn content, so it is rendered once per (persona, lesson)
+    and forms a stable prefix for upstream prompt caching.
+    """
+    persona = get_persona(persona_name)
+    grade_instruction = _grade_level_instruction(grade_level) if grade_level else ""
+    lesson_block = _lesson_block(subject, topic, grade_level)
 
-TEACHER JUST SAID:
-"{teacher_input}"
+    return f"""{persona.system_prompt}
+
+{grade_instruction}{lesson_block}YOUR EMOTIONAL TRIGGERS:
+{_triggers_block(persona)}
 
 RESPONSE INSTRUCTIONS:
-Respond naturally as {persona.display_name} would in this moment. Consider:
+Each turn you will be given your current state, the recent conversation and what the teacher
+just said. Respond naturally as {persona.display_name} would in that moment. Consider:
 - Your current comprehension and engagement levels
 - Your personality and typical speech patterns
 - Whether you would even speak right now (you might stay quiet)
@@ -168,53 +195,62 @@ Rules for deltas:
 - Use small values (±5 to ±10) for neutral or mildly relevant input"""
 
 
-async def generate_response(
-    student_state: dict | StudentState,
+def precompile_prompts(persona_names: list[str], lesson_context: dict | None = None) -> None:
+    """Warm the prompt prefixes for a session's students (call at session creation)."""
+    for name in persona_names:
+        compile_prompt(get_persona(name).name, *_lesson_key(lesson_context))
+
+
+def _build_context_message(
+    state: StudentState,
     teacher_input: str,
     history: list[dict],
-    lesson_context: dict | None = None,
-) -> StudentResponse:
-    """
-    Generate a student response to teacher input.
+) -> str:
+    """Build the per-turn message: current state, recent conversation and teacher input."""
+    recent_history = _recent_history_block(history)
 
-    Args:
-        student_state: Current state of the student (dict or StudentState)
-        teacher_input: What the teacher just said
-        history: Conversation history [{speaker, text, ...}, ...]
-        lesson_context: Optional dict with subject, topic, grade_level from SessionConfig
+    return f"""CURRENT STATE:
+- Comprehension level: {state.comprehension}/100
+- Engagement level: {state.engagement}/100
+- Current emotion: {state.emotional_state}
 
-    Returns:
-        StudentResponse with text, emotional_state, and state deltas
-    """
-    # Convert dict to StudentState if needed
+RECENT CONVERSATION:
+{recent_history if recent_history else "  (Start of lesson)"}
+
+TEACHER JUST SAID:
+"{teacher_input}"
+
+Respond as JSON following your response instructions."""
+
+
+def _to_state(student_state: dict | StudentState) -> StudentState:
+    """Convert a session student dict to StudentState if needed."""
     if isinstance(student_state, dict):
-        state = StudentState(
+        return StudentState(
             name=student_state["name"],
             comprehension=student_state.get("comprehension", 50),
             engagement=student_state.get("engagement", 50),
             emotional_state=student_state.get("emotional_state", "curious"),
             response_history=student_state.get("response_history", []),
         )
-    else:
-        state = student_state
+    return student_state
 
-    # Get persona definition
-    persona = get_persona(state.name)
 
-    # Build messages
-    messages = [
-        {"role": "system", "content": persona.system_prompt},
-        {"role": "user", "content": _build_context_message(state, persona, teacher_input, history, lesson_context)},
+def _build_messages(
+    state: StudentState,
+    persona: PersonaDefinition,
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None,
+) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": compile_prompt(persona.name, *_lesson_key(lesson_context))},
+        {"role": "user", "content": _build_context_message(state, teacher_input, history)},
     ]
 
-    # Call LLM
-    response_data = await chat_completion_json(
-        messages=messages,
-        temperature=0.8,  # Some creativity for natural responses
-        max_tokens=80,
-    )
 
-    # Parse and validate response
+def _parse_response(response_data: dict, state: StudentState) -> StudentResponse:
+    """Validate raw LLM JSON into a StudentResponse."""
     text = response_data.get("text", "")
     emotional_state = response_data.get("emotional_state", state.emotional_state)
     comprehension_delta = _clamp(int(response_data.get("comprehension_delta", 0)), -30, 30)
@@ -233,6 +269,370 @@ async def generate_response(
     )
 
 
+_NON_WORD = re.compile(r"[^\w\s?]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, drop punctuation (except '?') and collapse whitespace."""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", text.lower())).strip()
+
+
+def _cache_key(
+    state: StudentState,
+    persona: PersonaDefinition,
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None,
+) -> tuple:
+    """
+    Key for the response cache. Scores are bucketed to tens so near-identical
+    states share entries; history covers the same window the prompt shows.
+    """
+    lesson = lesson_context or {}
+    context = hashlib.sha1()
+    for part in (lesson.get("subject", ""), lesson.get("topic", "")):
+        context.update(_normalize(part).encode())
+        context.update(b"\x00")
+    for entry in history[-HISTORY_WINDOW:]:
+        context.update(f"{entry.get('speaker', '')}:{_normalize(entry.get('text', ''))}\x00".encode())
+    return (
+        persona.name,
+        _normalize(lesson.get("grade_level", "")),
+        int(state.comprehension) // 10,
+        int(state.engagement) // 10,
+        state.emotional_state,
+        _normalize(teacher_input),
+        context.hexdigest(),
+    )
+
+
+def estimate_prompt_tokens(
+    student_state: dict | StudentState,
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None = None,
+) -> int:
+    """Approximate prompt tokens generate_response() would send for these inputs."""
+    state = _to_state(student_state)
+    messages = _build_messages(state, get_persona(state.name), teacher_input, history, lesson_context)
+    return estimate_tokens(messages, 0)
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters for the student response cache."""
+    return _response_cache.stats()
+
+
+async def generate_response(
+    student_state: dict | StudentState,
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None = None,
+    use_cache: bool = True,
+) -> StudentResponse:
+    """
+    Generate a student response to teacher input.
+
+    Args:
+        student_state: Current state of the student (dict or StudentState)
+        teacher_input: What the teacher just said
+        history: Conversation history [{speaker, text, ...}, ...]
+        lesson_context: Optional dict with subject, topic, grade_level from SessionConfig
+        use_cache: Reuse a cached reply for an equivalent prompt (False forces a fresh call)
+
+    Returns:
+        StudentResponse with text, emotional_state, and state deltas
+    """
+    state = _to_state(student_state)
+
+    # Get persona definition
+    persona = get_persona(state.name)
+
+    if use_cache:
+        key = _cache_key(state, persona, teacher_input, history, lesson_context)
+        cached = _response_cache.get(key)
+        if cached is not None:
+            return cached
+
+    # Build messages
+    messages = _build_messages(state, persona, teacher_input, history, lesson_context)
+
+    # Call LLM (hedged with a duplicate request if it runs past the rolling tail latency)
+    response_data = await hedged("student", lambda: chat_completion_json(
+        messages=messages,
+        temperature=0.8,  # Some creativity for natural responses
+        max_tokens=80,
+        priority=Priority.LIVE,
+    ))
+
+    # Parse and validate response
+    response = _parse_response(response_data, state)
+    if use_cache:
+        _response_cache.set(key, response)
+    return response
+
+
+_TEXT_VALUE_START = re.compile(r'"text"\s*:\s*"')
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+
+
+class _TextFieldStreamer:
+    """
+    Incrementally decodes the "text" string value out of a JSON object that is
+    still being generated, so the words can be shown before the object closes.
+    Malformed \\u escapes and unpaired surrogates decode to U+FFFD instead of
+    raising; surrogate pairs are combined into one character.
+    """
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self._pos: int | None = None  # index of the next undecoded char of the value
+        self._done = False
+
+    def feed(self, fragment: str) -> str:
+        """Add a fragment of raw output; return newly decoded text (may be empty)."""
+        self.buffer += fragment
+        if self._done:
+            return ""
+        if self._pos is None:
+            match = _TEXT_VALUE_START.search(self.buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out: list[str] = []
+        buf, i = self.buffer, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self._done = True
+                i += 1
+                break
+            if ch != "\\":
+                out.append(ch)
+                i += 1
+                continue
+            # Escape sequence — wait for the rest of it if it was split across fragments
+            if i + 1 >= len(buf):
+                break
+            code = buf[i + 1]
+            if code == "u":
+                if i + 6 > len(buf):
+                    break
+                if not _HEX4.fullmatch(buf, i + 2, i + 6):
+                    out.append("\ufffd")
+                    i += 2  # the characters after "\u" are decoded as ordinary text
+                    continue
+                unit = int(buf[i + 2:i + 6], 16)
+                if 0xD800 <= unit < 0xDC00:
+                    # High surrogate: needs the "\uDC00"-"\uDFFF" that should follow it
+                    low = buf[i + 6:i + 12]
+                    if len(low) < 6 and "\\u".startswith(low[:2]):
+                        break
+                    if low.startswith("\\u") and _HEX4.fullmatch(low, 2) and 0xDC00 <= int(low[2:], 16) < 0xE000:
+                        out.append(chr(0x10000 + ((unit - 0xD800) << 10) + int(low[2:], 16) - 0xDC00))
+                        i += 12
+                        continue
+                    unit = 0xFFFD
+                elif 0xDC00 <= unit < 0xE000:
+                    unit = 0xFFFD
+                out.append(chr(unit))
+                i += 6
+            else:
+                out.append(self._ESCAPES.get(code, code))
+                i += 2
+        self._pos = i
+        return "".join(out)
+
+
+async def stream_response(
+    student_state: dict | StudentState,
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None = None,
+    on_text: Callable[[str], Awaitable[None]] | None = None,
+    use_cache: bool = True,
+) -> StudentResponse:
+    """
+    Generate a student response, streaming the spoken text as it is produced.
+
+    Same prompt, validation and cache as generate_response(), but `on_text` is
+    awaited with each new fragment of the "text" field while the model is still
+    writing. A cache hit delivers the whole text as a single fragment.
+
+    Returns:
+        StudentResponse with text, emotional_state, and state deltas
+    """
+    state = _to_state(student_state)
+    persona = get_persona(state.name)
+
+    if use_cache:
+        key = _cache_key(state, persona, teacher_input, history, lesson_context)
+        cached = _response_cache.get(key)
+        if cached is not None:
+            if cached.text and on_text is not None:
+                await on_text(cached.text)
+            return cached
+
+    messages = _build_messages(state, persona, teacher_input, history, lesson_context)
+
+    streamer = _TextFieldStreamer()
+    async for fragment in chat_completion_stream(
+        messages=messages,
+        temperature=0.8,
+        max_tokens=80,
+        json_mode=True,
+        priority=Priority.LIVE,
+    ):
+        delta = streamer.feed(fragment)
+        if delta and on_text is not None:
+            await on_text(delta)
+
+    response = _parse_response(json.loads(streamer.buffer), state)
+    if use_cache:
+        _response_cache.set(key, response)
+    return response
+
+
+CLASSROOM_BATCH_SYSTEM_PROMPT = """You are voicing several students in the same classroom at once.
+Each student below has their own persona, current state and emotional triggers. Stay fully in character
+for each one — they must sound like different people, not variations of one voice.
+
+Students react in the order they are listed. A later student may naturally build on, agree with,
+or gently push back on what an earlier student just said — realistic classroom dynamics.
+Any student may also stay quiet (empty text) if that is what they would realistically do."""
+
+
+@lru_cache(maxsize=64)
+def _compile_batch_prompt(
+    students: tuple[tuple[str, str], ...],
+    subject: str,
+    topic: str,
+    grade_level: str,
+) -> str:
+    """Static system prompt for a batch of (student id, persona name) pairs in one lesson."""
+    grade_instruction = _grade_level_instruction(grade_level) if grade_level else ""
+
+    profiles = []
+    for sid, persona_name in students:
+        persona = get_persona(persona_name)
+        profiles.append(f"""=== STUDENT id="{sid}" ({persona.display_name}) ===
+{persona.system_prompt}
+
+EMOTIONAL TRIGGERS:
+{_triggers_block(persona)}
+
+Response length: {persona.response_length[0]}-{persona.response_length[1]} words.""")
+
+    ids = ", ".join(f'"{sid}"' for sid, _ in students)
+    student_blocks = "\n\n".join(profiles)
+    return f"""{CLASSROOM_BATCH_SYSTEM_PROMPT}
+
+{grade_instruction}{_lesson_block(subject, topic, grade_level)}{student_blocks}
+
+RESPONSE INSTRUCTIONS:
+Each turn you will be given every student's current state, the recent conversation and what the
+teacher just said. Respond as each student would in that moment. Vocabulary, sentence complexity,
+and reasoning style MUST match the grade level above.
+
+Provide your response as JSON with one entry per student id ({ids}):
+{{
+  "responses": {{
+    "<student id>": {{
+      "text": "What they say (or empty string if they stay silent)",
+      "emotional_state": "eager|confused|bored|frustrated|engaged|anxious|distracted",
+      "comprehension_delta": <integer -30 to +30, how this affected their understanding>,
+      "engagement_delta": <integer -30 to +30, how this affected their engagement>
+    }}
+  }}
+}}
+
+Rules for deltas:
+- Positive delta = the teacher's input helped/engaged the student
+- Negative delta = the teacher's input confused/disengaged the student
+- Zero = no significant change
+- Use strong values (±20 to ±30) when the input clearly matches or violates a student's triggers
+- Use small values (±5 to ±10) for neutral or mildly relevant input"""
+
+
+def _build_batch_message(
+    states: dict[str, tuple[StudentState, PersonaDefinition]],
+    teacher_input: str,
+    history: list[dict],
+) -> str:
+    """Build the per-turn batch message: each student's state plus the conversation."""
+    recent_history = _recent_history_block(history)
+    state_lines = "\n".join(
+        f'- {sid}: comprehension {state.comprehension}/100, engagement {state.engagement}/100, '
+        f'emotion {state.emotional_state}'
+        for sid, (state, _) in states.items()
+    )
+
+    return f"""CURRENT STATES (in speaking order):
+{state_lines}
+
+RECENT CONVERSATION:
+{recent_history if recent_history else "  (Start of lesson)"}
+
+TEACHER JUST SAID:
+"{teacher_input}"
+
+Respond as JSON following your response instructions."""
+
+
+async def generate_classroom_batch(
+    student_states: dict[str, dict | StudentState],
+    teacher_input: str,
+    history: list[dict],
+    lesson_context: dict | None = None,
+) -> dict[str, StudentResponse]:
+    """
+    Generate replies for several students with a single LLM call.
+
+    Args:
+        student_states: Student id -> state (dict or StudentState), in speaking order
+        teacher_input: What the teacher just said
+        history: Conversation history [{speaker, text, ...}, ...]
+        lesson_context: Optional dict with subject, topic, grade_level from SessionConfig
+
+    Returns:
+        Dict mapping student id to a StudentResponse validated the same way as
+        generate_response(). Students the model left out are omitted.
+    """
+    states: dict[str, tuple[StudentState, PersonaDefinition]] = {}
+    for sid, student_state in student_states.items():
+        state = _to_state(student_state)
+        states[sid] = (state, get_persona(state.name))
+
+    prefix = _compile_batch_prompt(
+        tuple((sid, persona.name) for sid, (_, persona) in states.items()),
+        *_lesson_key(lesson_context),
+    )
+    messages = [
+        {"role": "system", "content": prefix},
+        {"role": "user", "content": _build_batch_message(states, teacher_input, history)},
+    ]
+
+    response_data = await hedged("classroom_batch", lambda: chat_completion_json(
+        messages=messages,
+        temperature=0.8,
+        max_tokens=80 * len(states) + 60,  # per-student budget plus JSON keys
+        priority=Priority.LIVE,
+    ))
+
+    raw = response_data.get("responses", {})
+    if not isinstance(raw, dict):
+        return {}
+    return {
+        sid: _parse_response(raw[sid], state)
+        for sid, (state, _) in states.items()
+        if isinstance(raw.get(sid), dict)
+    }
+
+
 def _clamp(value: int, min_val: int, max_val: int) -> int:
     """Clamp a value to a range."""
     return max(min_val, min(max_val, value))
@@ -244,6 +644,7 @@ async def generate_responses_batch(
     history: list[dict],
     selected_students: list[str],
     lesson_context: dict | None = None,
+    classroom_batch: bool = False,
 ) -> dict[str, StudentResponse]:
     """
     Generate responses for multiple selected students.
@@ -254,6 +655,7 @@ async def generate_responses_batch(
         history: Conversation history
         selected_students: Names of students who should respond
         lesson_context: Optional dict with subject, topic, grade_level from SessionConfig
+        classroom_batch: If True, generate all replies in one LLM call instead of one per student
 
     Returns:
         Dict mapping student name to their response
@@ -263,6 +665,14 @@ async def generate_responses_batch(
     # Filter to selected students
     states_to_process = [s for s in student_states if s["name"] in selected_students]
 
+    if classroom_batch:
+        return await generate_classroom_batch(
+            {state["name"]: state for state in states_to_process},
+            teacher_input,
+            history,
+            lesson_context,
+        )
+
     # Generate responses in parallel
     tasks = [
         generate_response(state, teacher_input, history, lesson_context)
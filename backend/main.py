@@ -2,18 +2,30 @@ import uuid
 import json
 import base64
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from typing import Awaitable, Callable
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from models import (
     SessionState, SessionConfig, StudentState,
-    StudentResponse, StateUpdate,
-    SessionEndMessage, ErrorMessage, EmotionalState, ChaosResolvedMessage
+    StudentResponse, StudentResponseDelta, StudentResponseAborted, StateUpdate,
+    SessionEndMessage, ErrorMessage, EmotionalState, ChaosResolvedMessage, TranscriptUpdate
 )
-from agents.orchestrator import decide_responders, update_student_states, generate_coaching_hint
-from agents.student_agent import generate_response
-from services.azure_speech import text_to_speech, speech_to_text
+from agents.orchestrator import decide_responders, needs_llm_decision, resolve_scheduling, update_student_states, generate_coaching_hint, get_orchestrator_stats
+from agents.speculation import speculate, get_speculation_stats
+from agents.student_agent import HISTORY_WINDOW, generate_response, stream_response, generate_classroom_batch, get_cache_stats, precompile_prompts
+from services.azure_speech import (
+    text_to_speech, synthesize_speech, synthesize_speech_many, stream_speech, speech_to_text,
+    warm_up_tts, close_tts, close_stt, get_tts_cache_stats, get_tts_executor_stats, get_stt_stats,
+)
+from services.stt_stream import UtteranceStream
+from services.audio_delivery import AUDIO_FORMAT, encode_audio_frame, new_response_id, park_audio, fetch_audio
+from services.azure_openai import close_client, get_pool_stats, get_scheduler_stats
+from services.hedging import get_hedging_stats
+from services.session_store import SessionBusy, SessionConflict, session_store_from_env
+from services.session_actor import SessionActors
 from agents.feedback_agent import generate_feedback
 from chaos_events import get_random_chaos_event, get_chaos_event_by_id
 from agents.autopsy_agent import generate_autopsy
@@ -30,7 +42,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-sessions: dict[str, SessionState] = {}
+# Bounded, evicting store (SESSION_STORE=memory|sqlite, shared between workers with sqlite).
+# Sessions are mutated only by commands submitted to their actor, which holds the
+# store lease while a command runs and saves after it.
+sessions = session_store_from_env(SessionState)
+actors = SessionActors(sessions)
 
 DEFAULT_STUDENTS = [
     StudentState(id="maya", name="Maya", persona="overachiever", voice_id="en-US-AriaNeural", engagement=0.95, comprehension=0.9, emotional_state=EmotionalState.eager),
@@ -44,9 +60,38 @@ class STTRequest(BaseModel):
     audio_base64: str
 
 
+def student_dict_for(student: StudentState) -> dict:
+    """Student state in the 0-100 dict form the student agent expects."""
+    return {"name": student.name, "comprehension": round(student.comprehension * 100), "engagement": round(student.engagement * 100), "emotional_state": student.emotional_state.value, "response_history": []}
+
+
+@app.exception_handler(SessionBusy)
+@app.exception_handler(SessionConflict)
+async def session_contention(request: Request, exc: RuntimeError):
+    # Another worker is mid-turn on this session (or won a race); the client may retry
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok", "sessions_active": len(sessions)}
+    return {"status": "ok", "sessions_active": await sessions.count()}
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "llm_pool": get_pool_stats(),
+        "llm_scheduler": get_scheduler_stats(),
+        "student_cache": get_cache_stats(),
+        "hedging": get_hedging_stats(),
+        "orchestrator": get_orchestrator_stats(),
+        "speculation": get_speculation_stats(),
+        "tts_cache": get_tts_cache_stats(),
+        "tts_executor": get_tts_executor_stats(),
+        "stt": get_stt_stats(),
+        "sessions": sessions.stats(),
+        "session_actors": actors.stats(),
+    }
 
 
 @app.post("/stt")
@@ -63,7 +108,12 @@ async def create_session(config: SessionConfig):
     session_id = str(uuid.uuid4())
     students = {s.id: s.model_copy(deep=True) for s in DEFAULT_STUDENTS}
     session = SessionState(session_id=session_id, config=config, students=students)
-    sessions[session_id] = session
+    await sessions.save(session)
+    # Render each student's static prompt prefix once, up front
+    precompile_prompts(
+        [s.name for s in students.values()],
+        {"subject": config.subject, "topic": config.topic, "grade_level": config.grade_level},
+    )
     return {
         "session_id": session_id,
         "students": [{"id": s.id, "name": s.name, "persona": s.persona, "voice_id": s.voice_id} for s in students.values()],
@@ -71,14 +121,18 @@ async def create_session(config: SessionConfig):
 
 @app.get("/session/{session_id}")
 async def get_session(session_id: str):
-    session = sessions.get(session_id)
+    # Served from the actor's snapshot when current, without queueing behind a turn
+    snapshot = await actors.snapshot(session_id)
+    if snapshot is not None:
+        return Response(content=snapshot, media_type="application/json")
+    session = await sessions.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
 
-@app.post("/session/{session_id}/end")
-async def end_session(session_id: str):
-    session = sessions.get(session_id)
+
+async def end_lesson(session: SessionState | None) -> dict:
+    """Actor command: end the lesson and collect feedback + autopsy."""
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     session.active = False
@@ -97,17 +151,27 @@ async def end_session(session_id: str):
         autopsy = []
         print(f"[end_session] Autopsy failed: {e}")
 
+    # Saved when the command returns — results collected, the ended session only waits out SESSION_ENDED_TTL
     return {
-        "session_id": session_id,
-        "timeline": session.timeline,
+        "session_id": session.session_id,
+        "timeline": list(session.timeline),
         "feedback": feedback,
         "autopsy": autopsy,
     }
 
 
-@app.post("/session/{session_id}/chaos")
-async def inject_chaos(session_id: str, event_id: str | None = None):
-    session = sessions.get(session_id)
+@app.post("/session/{session_id}/end")
+async def end_session(session_id: str):
+    return await actors.submit(session_id, end_lesson)
+
+
+async def apply_chaos(session: SessionState | None, event_id: str | None, audio: str) -> Callable[[], Awaitable[dict]]:
+    """
+    Actor command: inject a chaos event and collect every student's reaction.
+
+    Returns a function building the response, which waits for the reactions'
+    audio after the actor has saved the session and released its lease.
+    """
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     if not session.active:
@@ -124,153 +188,387 @@ async def inject_chaos(session_id: str, event_id: str | None = None):
     session.timeline.append({"turn": session.turn_count, "speaker": "teacher", "text": f"[CHAOS] {event['description']}"})
     lesson_context = {"subject": session.config.subject, "topic": session.config.topic, "grade_level": session.config.grade_level}
 
-    # All students react in parallel (LLM + TTS)
+    # Classroom batch mode: every student's reaction comes back from one LLM call
+    batch_results = None
+    if session.config.classroom_batch:
+        try:
+            batch_results = await asyncio.wait_for(generate_classroom_batch({sid: student_dict_for(s) for sid, s in session.students.items()}, event["teacher_prompt"], list(session.timeline.recent(HISTORY_WINDOW)), lesson_context), timeout=15.0)
+        except Exception as e:
+            print(f"[inject_chaos] Classroom batch failed, generating per student: {e}")
+
+    # All students react in parallel, then their audio is synthesized in one multi-voice request
     async def respond(sid: str):
         student = session.students.get(sid)
         if not student:
             return None
-        student_dict = {"name": student.name, "comprehension": round(student.comprehension * 100), "engagement": round(student.engagement * 100), "emotional_state": student.emotional_state.value, "response_history": []}
-        try:
-            resp = await asyncio.wait_for(generate_response(student_dict, event["teacher_prompt"], list(session.timeline), lesson_context), timeout=10.0)
-        except asyncio.TimeoutError:
-            return None
-        try:
-            audio = await asyncio.wait_for(text_to_speech(resp.text, student.voice_id), timeout=8.0)
-        except (asyncio.TimeoutError, Exception):
-            audio = None
-        return {"student_id": sid, "student_name": student.name, "voice_id": student.voice_id, "text": resp.text, "emotional_state": resp.emotional_state, "comprehension_delta": resp.comprehension_delta, "engagement_delta": resp.engagement_delta, "audio_base64": audio}
+        if batch_results is not None:
+            resp = batch_results.get(sid)
+            if resp is None:
+                return None
+        else:
+            try:
+                resp = await asyncio.wait_for(generate_response(student_dict_for(student), event["teacher_prompt"], list(session.timeline.recent(HISTORY_WINDOW)), lesson_context, use_cache=session.config.response_cache), timeout=10.0)
+            except asyncio.TimeoutError:
+                return None
+        return {"student_id": sid, "student_name": student.name, "voice_id": student.voice_id, "text": resp.text, "emotional_state": resp.emotional_state, "comprehension_delta": resp.comprehension_delta, "engagement_delta": resp.engagement_delta, "audio_base64": None, "response_id": None}
 
     results = await asyncio.gather(*[respond(sid) for sid in session.students.keys()])
     responses = [r for r in results if r is not None]
 
+    speaking = [r for r in responses if r["text"].strip()]
+    synthesis = asyncio.create_task(synthesize_speech_many([(r["voice_id"], r["text"]) for r in speaking]))
+    if audio == "binary":
+        # Reply without waiting for TTS; audio is fetched raw from /audio/{response_id}
+        async def clip(index: int) -> bytes | None:
+            return (await synthesis)[index]
+
+        for index, r in enumerate(speaking):
+            r["response_id"] = new_response_id()
+            park_audio(r["response_id"], asyncio.create_task(clip(index)))
+
     update_student_states(session, responses)
     session.chaos_active = True
     session.chaos_event = event
-    return {"event": event, "responders": [{"student_id": r["student_id"], "student_name": r["student_name"], "text": r["text"], "emotional_state": r["emotional_state"], "audio_base64": r["audio_base64"]} for r in responses], "turn": session.turn_count}
+    turn = session.turn_count
+
+    async def with_audio() -> dict:
+        if audio != "binary":
+            for r, audio_bytes in zip(speaking, await synthesis):
+                r["audio_base64"] = base64.b64encode(audio_bytes).decode("utf-8") if audio_bytes else None
+        return {"event": event, "responders": [{"student_id": r["student_id"], "student_name": r["student_name"], "text": r["text"], "emotional_state": r["emotional_state"], "audio_base64": r["audio_base64"], "response_id": r["response_id"]} for r in responses], "turn": turn}
+
+    return with_audio
+
+
+@app.post("/session/{session_id}/chaos")
+async def inject_chaos(session_id: str, event_id: str | None = None, audio: str = "base64"):
+    respond = await actors.submit(session_id, apply_chaos, event_id, audio)
+    return await respond()
+
+
+@app.get("/audio/{response_id}")
+async def get_audio(response_id: str):
+    audio = await fetch_audio(response_id)
+    if audio is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return Response(content=audio, media_type=AUDIO_FORMAT)
 
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await websocket.accept()
-    session = sessions.get(session_id)
+    session = await sessions.get(session_id)
     if not session:
         await websocket.send_text(ErrorMessage(message=f"Session {session_id} not found").model_dump_json())
         await websocket.close()
         return
-    try:
-        while True:
-            raw = await websocket.receive_text()
-            data = json.loads(raw)
-            if data.get("type") == "teacher_input":
-                teacher_text = data.get("text", "")
-                session.turn_count += 1
-                session.timeline.append({"turn": session.turn_count, "speaker": "teacher", "text": teacher_text})
+    # ?stream=1 pushes each student's words as student_response_delta frames while generating
+    stream_text = websocket.query_params.get("stream", "").lower() in ("1", "true")
+    # ?audio=binary sends replies as soon as their text is ready and the MP3 afterwards
+    # as a binary frame tagged with the reply's response_id (default: base64 in the JSON).
+    # ?audio=stream does the same but forwards MP3 chunks while they are synthesized.
+    audio_mode = websocket.query_params.get("audio", "base64").lower()
+    audio_binary = audio_mode in ("binary", "stream")
+
+    async def send_audio(response_id: str, student_id: str, text: str, voice_id: str) -> None:
+        header = {"type": "student_audio", "response_id": response_id, "student_id": student_id, "format": AUDIO_FORMAT}
+        if audio_mode != "stream":
+            try:
+                audio = await asyncio.wait_for(synthesize_speech(text, voice_id), timeout=8.0)
+            except (asyncio.TimeoutError, Exception):
+                audio = None
+            if audio:
+                await websocket.send_bytes(encode_audio_frame(header, audio))
+            return
+
+        # Same 8 s budget as whole-utterance TTS, spread over the chunks
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 8.0
+        chunks = stream_speech(text, voice_id)
+        seq = 0
+        try:
+            while True:
+                chunk = await asyncio.wait_for(anext(chunks), timeout=deadline - loop.time())
+                await websocket.send_bytes(encode_audio_frame({**header, "seq": seq, "final": False}, chunk))
+                seq += 1
+        except StopAsyncIteration:
+            pass
+        except (asyncio.TimeoutError, Exception) as e:
+            print(f"[ws] Streaming TTS stopped after {seq} chunks: {e!r}")
+        finally:
+            await chunks.aclose()
+        if seq:
+            # Empty end-of-stream marker so clients can flush their playback buffer
+            await websocket.send_bytes(encode_audio_frame({**header, "seq": seq, "final": True}, b""))
+    async def turn_command(current: SessionState | None, teacher_text: str) -> Callable[[], Awaitable[None]] | None:
+        nonlocal session
+        if current is None:
+            await websocket.send_text(ErrorMessage(message=f"Session {session_id} has expired").model_dump_json())
+            return None
+        session = current
+        return await play_turn(teacher_text)
 
-                # Detect and clear chaos state
-                was_chaos_active = session.chaos_active
-                chaos_event_saved = session.chaos_event
-                if was_chaos_active:
-                    session.chaos_active = False
-                    session.chaos_event = None
+    async def run_turn(teacher_text: str) -> None:
+        """Play a turn in the session's actor, so chaos/end (from any worker) never interleave with it."""
+        try:
+            deliver = await actors.submit(session_id, turn_command, teacher_text)
+        except (SessionBusy, SessionConflict) as e:
+            await websocket.send_text(ErrorMessage(message=str(e)).model_dump_json())
+            return
+        # The session is saved and its lease released; the last audio no longer holds up /chaos or /end
+        if deliver is not None:
+            await deliver()
+
+    async def play_turn(teacher_text: str) -> Callable[[], Awaitable[None]]:
+        """
+        One teacher turn: orchestrate, generate, voice and update state.
+
+        Returns the turn's delivery: the audio still being synthesized and the
+        state push, which read only what the turn already computed and run once
+        the actor has saved the session.
+        """
+        session.turn_count += 1
+        session.timeline.append({"turn": session.turn_count, "speaker": "teacher", "text": teacher_text})
+
+        # Detect and clear chaos state
+        was_chaos_active = session.chaos_active
+        chaos_event_saved = session.chaos_event
+        if was_chaos_active:
+            session.chaos_active = False
+            session.chaos_event = None
+
+        lesson_context = {
+            "subject": session.config.subject,
+            "topic": session.config.topic,
+            "grade_level": session.config.grade_level,
+        }
+
+        # Build generation prompt and choose responders
+        speculation = None
+        try:
+            if was_chaos_active:
+                chaos_desc = chaos_event_saved.get("description", "disruption") if chaos_event_saved else "disruption"
+                generation_prompt = f"[CHAOS RESOLUTION] Teacher says: '{teacher_text}' to restore order after: {chaos_desc}. React naturally."
+                responders = [{"student_id": sid, "reason": "chaos_resolution"} for sid in session.students.keys()]
+            else:
+                generation_prompt = teacher_text
+                # Speculation: while the LLM orchestrator deliberates, start the
+                # likeliest responders' replies (read-only — no state is touched)
+                if session.config.speculative_generation and needs_llm_decision(teacher_text, session):
+                    speculation = speculate(
+                        teacher_text, session,
+                        {sid: student_dict_for(s) for sid, s in session.students.items()},
+                        list(session.timeline.recent(HISTORY_WINDOW)), lesson_context,
+                    )
+                # 1. Orchestrator decides which students respond this turn
+                responders = await decide_responders(teacher_text, session)
+
+            # 2. Generate each selected student's response
+            # Classroom batch mode: one LLM call returns every responder's reply
+            batch_results = None
+            if session.config.classroom_batch and len(responders) > 1:
+                if speculation is not None:
+                    speculation.discard()
+                batch_states = {}
+                for responder in responders:
+                    student = session.students.get(responder["student_id"])
+                    if student:
+                        batch_states[student.id] = student_dict_for(student)
+                try:
+                    batch_results = await asyncio.wait_for(
+                        generate_classroom_batch(batch_states, generation_prompt, list(session.timeline.recent(HISTORY_WINDOW)), lesson_context),
+                        timeout=15.0
+                    )
+                except Exception as e:
+                    print(f"[ws] Classroom batch failed, generating per student: {e}")
+
+            # Pipeline: student N's TTS runs while student N+1's LLM runs.
+            # Debate preserved: live_history_texts captures each student's text
+            # immediately after their LLM completes, before TTS finishes.
+            responses: list[dict] = []
+            live_history_texts: list[dict] = []
+            pending_tts_task: asyncio.Task | None = None
+            pending_result: dict | None = None
+            pending_msg: StudentResponse | None = None
+            audio_tasks: list[asyncio.Task] = []
+
+            async def generate(student: StudentState, debate: list[dict]) -> StudentResponse | None:
+                """One student's reply given the classmates' replies it may react to."""
+                sid = student.id
+                live_history = [*session.timeline.recent(HISTORY_WINDOW), *debate]
+
+                # A speculative reply is only valid if it saw no classmates this
+                # turn — otherwise it was generated without the debate context
+                speculative = None
+                if speculation is not None:
+                    if debate:
+                        speculation.discard(sid)
+                    else:
+                        speculative = speculation.take(sid)
+
+                streamed = False
+                if speculative is not None:
+                    generation = speculative
+                elif stream_text:
+                    async def push_delta(delta: str) -> None:
+                        nonlocal streamed
+                        streamed = True
+                        await websocket.send_text(
+                            StudentResponseDelta(student_id=sid, student_name=student.name, delta=delta).model_dump_json()
+                        )
+                    generation = stream_response(student_dict_for(student), generation_prompt, live_history, lesson_context, on_text=push_delta, use_cache=session.config.response_cache)
+                else:
+                    generation = generate_response(student_dict_for(student), generation_prompt, live_history, lesson_context, use_cache=session.config.response_cache)
+                try:
+                    resp = await asyncio.wait_for(generation, timeout=10.0)
+                except asyncio.TimeoutError:
+                    if streamed:
+                        # The client already shows part of this reply; no student_response will follow
+                        await websocket.send_text(
+                            StudentResponseAborted(student_id=sid, student_name=student.name, reason="timeout").model_dump_json()
+                        )
+                    return None
+                if speculative is not None and stream_text and resp.text:
+                    await websocket.send_text(
+                        StudentResponseDelta(student_id=sid, student_name=student.name, delta=resp.text).model_dump_json()
+                    )
+                return resp
+
+            def debate_so_far() -> list[dict]:
+                return [
+                    {"speaker": e["speaker"], "text": e["text"]}
+                    for e in live_history_texts if e["text"].strip()
+                ]
+
+            def start_remaining(after: int) -> dict[str, asyncio.Task]:
+                """Generate every later responder concurrently against the current debate."""
+                debate = debate_so_far()
+                return {
+                    r["student_id"]: asyncio.create_task(generate(session.students[r["student_id"]], debate))
+                    for r in responders[after + 1:]
+                    if r["student_id"] in session.students
+                }
 
-                # Build generation prompt and choose responders
-                if was_chaos_active:
-                    chaos_desc = chaos_event_saved.get("description", "disruption") if chaos_event_saved else "disruption"
-                    generation_prompt = f"[CHAOS RESOLUTION] Teacher says: '{teacher_text}' to restore order after: {chaos_desc}. React naturally."
-                    responders = [{"student_id": sid, "reason": "chaos_resolution"} for sid in session.students.keys()]
+            # Scheduling: sequential lets every student react to the previous ones;
+            # parallel/first_then_parallel trade that for fewer serial LLM latencies.
+            # Messages are always sent in responder order.
+            scheduling = resolve_scheduling(session.config.responder_scheduling, responders, session)
+            started: dict[str, asyncio.Task] = {}
+            fan_out = False
+            if batch_results is None and scheduling == "parallel":
+                started = start_remaining(-1)
+
+            for index, responder in enumerate(responders):
+                sid = responder["student_id"]
+                student = session.students.get(sid)
+                if not student:
+                    continue
+
+                # Run current student's LLM — overlaps with previous student's TTS
+                if batch_results is not None:
+                    resp = batch_results.get(sid)
+                elif sid in started:
+                    try:
+                        resp = await started.pop(sid)
+                    except BaseException:
+                        for task in started.values():
+                            task.cancel()
+                        raise
                 else:
-                    generation_prompt = teacher_text
-                    # 1. Orchestrator decides which students respond this turn
-                    responders = await decide_responders(teacher_text, session)
-
-                # 2. Generate each selected student's response (in parallel)
-                lesson_context = {
-                    "subject": session.config.subject,
-                    "topic": session.config.topic,
-                    "grade_level": session.config.grade_level,
+                    resp = await generate(student, debate_so_far())
+                    fan_out = scheduling == "first_then_parallel"
+                if resp is None:
+                    continue
+
+                # Record text immediately for next student's debate context
+                live_history_texts.append({"speaker": student.name, "text": resp.text})
+                # first_then_parallel: the rest start once the first reply is in their debate
+                if fan_out:
+                    started = start_remaining(index)
+                    fan_out = False
+
+                result = {
+                    "student_id": sid,
+                    "student_name": student.name,
+                    "voice_id": student.voice_id,
+                    "text": resp.text,
+                    "emotional_state": resp.emotional_state,
+                    "comprehension_delta": resp.comprehension_delta,
+                    "engagement_delta": resp.engagement_delta,
+                    "audio_base64": None,
                 }
+                msg = StudentResponse(
+                    student_id=sid,
+                    student_name=student.name,
+                    text=resp.text,
+                    emotional_state=EmotionalState(resp.emotional_state),
+                    engagement=student.engagement,
+                    comprehension=student.comprehension,
+                    comprehension_delta=resp.comprehension_delta,
+                    engagement_delta=resp.engagement_delta,
+                    audio_base64=None,
+                )
 
-                # Pipeline: student N's TTS runs while student N+1's LLM runs.
-                # Debate preserved: live_history_texts captures each student's text
-                # immediately after their LLM completes, before TTS finishes.
-                responses: list[dict] = []
-                live_history_texts: list[dict] = []
-                pending_tts_task: asyncio.Task | None = None
-                pending_result: dict | None = None
-                pending_msg: StudentResponse | None = None
+                responses.append(result)
 
-                for responder in responders:
-                    sid = responder["student_id"]
-                    student = session.students.get(sid)
-                    if not student:
-                        continue
-
-                    student_dict = {
-                        "name": student.name,
-                        "comprehension": round(student.comprehension * 100),
-                        "engagement": round(student.engagement * 100),
-                        "emotional_state": student.emotional_state.value,
-                        "response_history": [],
-                    }
-                    # Build debate context from LLM-completed responses this turn
-                    live_history = list(session.timeline) + [
-                        {"speaker": e["speaker"], "text": e["text"]}
-                        for e in live_history_texts if e["text"].strip()
-                    ]
-
-                    # Run current student's LLM — overlaps with previous student's TTS
+                # Binary audio: text goes out now, audio follows on its own frame
+                if audio_binary:
+                    if resp.text.strip():
+                        msg.response_id = new_response_id()
+                        await websocket.send_text(msg.model_dump_json())
+                        audio_tasks.append(asyncio.create_task(
+                            send_audio(msg.response_id, sid, resp.text, student.voice_id)
+                        ))
+                    continue
+
+                # Flush previous student's TTS (may already be done)
+                if pending_tts_task is not None:
                     try:
-                        resp = await asyncio.wait_for(
-                            generate_response(student_dict, generation_prompt, live_history, lesson_context),
-                            timeout=10.0
-                        )
-                    except asyncio.TimeoutError:
-                        continue
-
-                    # Record text immediately for next student's debate context
-                    live_history_texts.append({"speaker": student.name, "text": resp.text})
-
-                    # Flush previous student's TTS (may already be done)
-                    if pending_tts_task is not None:
-                        try:
-                            audio = await pending_tts_task
-                        except (asyncio.TimeoutError, Exception):
-                            audio = None
-                        pending_result["audio_base64"] = audio
-                        responses.append(pending_result)
-                        if pending_msg and pending_result["text"].strip():
-                            pending_msg.audio_base64 = audio
-                            await websocket.send_text(pending_msg.model_dump_json())
-                        pending_tts_task = None
-                        pending_result = None
-                        pending_msg = None
-
-                    # Start current student's TTS as a background task
-                    pending_tts_task = asyncio.create_task(
-                        asyncio.wait_for(
-                            text_to_speech(resp.text, student.voice_id),
-                            timeout=8.0
-                        )
-                    )
-                    pending_result = {
-                        "student_id": sid,
-                        "student_name": student.name,
-                        "voice_id": student.voice_id,
-                        "text": resp.text,
-                        "emotional_state": resp.emotional_state,
-                        "comprehension_delta": resp.comprehension_delta,
-                        "engagement_delta": resp.engagement_delta,
-                        "audio_base64": None,
-                    }
-                    pending_msg = StudentResponse(
-                        student_id=sid,
-                        student_name=student.name,
-                        text=resp.text,
-                        emotional_state=EmotionalState(resp.emotional_state),
-                        engagement=student.engagement,
-                        comprehension=student.comprehension,
-                        audio_base64=None,
+                        audio = await pending_tts_task
+                    except (asyncio.TimeoutError, Exception):
+                        audio = None
+                    pending_result["audio_base64"] = audio
+                    if pending_msg and pending_result["text"].strip():
+                        pending_msg.audio_base64 = audio
+                        await websocket.send_text(pending_msg.model_dump_json())
+                    pending_tts_task = None
+                    pending_result = None
+                    pending_msg = None
+
+                # Start current student's TTS as a background task
+                pending_tts_task = asyncio.create_task(
+                    asyncio.wait_for(
+                        text_to_speech(resp.text, student.voice_id),
+                        timeout=8.0
                     )
-
+                )
+                pending_result = result
+                pending_msg = msg
+
+            for task in started.values():
+                task.cancel()
+            # Speculated students the orchestrator did not pick
+            if speculation is not None:
+                speculation.discard()
+
+            # 4. Update session state with deltas from this turn (also records the replies in the turn log)
+            update_student_states(session, responses)
+
+            # 5. Updated state snapshot, pushed once the last reply's audio is out
+            state_snapshot = {
+                sid: {
+                    "engagement": s.engagement,
+                    "comprehension": s.comprehension,
+                    "emotional_state": s.emotional_state,
+                }
+                for sid, s in session.students.items()
+            }
+            state_update = StateUpdate(
+                turn=session.turn_count,
+                students=state_snapshot,
+                coaching_hint=generate_coaching_hint(session),
+            )
+
+            async def deliver() -> None:
                 # Flush the last student's TTS
                 if pending_tts_task is not None:
                     try:
@@ -278,48 +576,74 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                     except (asyncio.TimeoutError, Exception):
                         audio = None
                     pending_result["audio_base64"] = audio
-                    responses.append(pending_result)
                     if pending_msg and pending_result["text"].strip():
                         pending_msg.audio_base64 = audio
                         await websocket.send_text(pending_msg.model_dump_json())
-
-                # 4a. Log student responses into timeline (needed for autopsy)
-                for r in responses:
-                    if r["text"].strip():
-                        session.timeline.append({
-                            "turn": session.turn_count,
-                            "speaker": r["student_name"],
-                            "text": r["text"],
-                            "comprehension_delta": r["comprehension_delta"],
-                            "engagement_delta": r["engagement_delta"],
-                        })
-
-                # 4b. Update session state with deltas from this turn
-                update_student_states(session, responses)
-
-                # 5. Push updated state snapshot
-                state_snapshot = {
-                    sid: {
-                        "engagement": s.engagement,
-                        "comprehension": s.comprehension,
-                        "emotional_state": s.emotional_state,
-                    }
-                    for sid, s in session.students.items()
-                }
-                coaching_hint = generate_coaching_hint(session)
-                await websocket.send_text(
-                    StateUpdate(
-                        turn=session.turn_count,
-                        students=state_snapshot,
-                        coaching_hint=coaching_hint,
-                    ).model_dump_json()
-                )
+                await websocket.send_text(state_update.model_dump_json())
                 if was_chaos_active:
                     await websocket.send_text(
                         ChaosResolvedMessage(
                             coaching_hint="Chaos resolved — observe how your students responded to your intervention"
                         ).model_dump_json()
                     )
+                # Binary audio frames may trail the state update; finish them before the next turn
+                if audio_tasks:
+                    await asyncio.gather(*audio_tasks, return_exceptions=True)
+
+            return deliver
+        finally:
+            # Speculative replies left running when orchestration or generation failed
+            if speculation is not None:
+                speculation.discard()
+
+    # Streamed teacher audio: audio_start, binary chunks, audio_end (see services/stt_stream.py)
+    utterance: UtteranceStream | None = None
+    partial_task: asyncio.Task | None = None
+
+    async def send_partial(current: UtteranceStream) -> None:
+        text = await speech_to_text(current.audio, pcm16=current.pcm16, partial=True)
+        if text and utterance is current:  # drop partials that finish after the utterance did
+            await websocket.send_text(TranscriptUpdate(text=text).model_dump_json())
+
+    async def finish_utterance(current: UtteranceStream) -> None:
+        if partial_task is not None:
+            partial_task.cancel()
+        if not current.has_speech():
+            return
+        text = await speech_to_text(current.audio, pcm16=current.pcm16)
+        await websocket.send_text(TranscriptUpdate(text=text, final=True).model_dump_json())
+        if text.strip():
+            await run_turn(text)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            if message.get("bytes") is not None:
+                if utterance is None:
+                    continue  # audio outside audio_start/audio_end
+                if utterance.feed(message["bytes"]):
+                    # End of utterance by VAD: start the turn now, keep listening for the next one
+                    finished, utterance = utterance, UtteranceStream(utterance.format)
+                    await finish_utterance(finished)
+                elif utterance.partial_due() and (partial_task is None or partial_task.done()):
+                    partial_task = asyncio.create_task(send_partial(utterance))
+                continue
+
+            data = json.loads(message["text"])
+            if data.get("type") == "teacher_input":
+                await run_turn(data.get("text", ""))
+            elif data.get("type") == "audio_start":
+                try:
+                    utterance = UtteranceStream(data.get("format", "webm"))
+                except ValueError as e:
+                    await websocket.send_text(ErrorMessage(message=str(e)).model_dump_json())
+            elif data.get("type") == "audio_end":
+                if utterance is not None:
+                    finished, utterance = utterance, None
+                    await finish_utterance(finished)
             elif data.get("type") == "session_end":
                 await websocket.send_text(SessionEndMessage(session_id=session_id).model_dump_json())
                 break
@@ -327,6 +651,9 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         print(f"Client disconnected from session {session_id}")
     except Exception as e:
         await websocket.send_text(ErrorMessage(message=str(e)).model_dump_json())
+    finally:
+        if partial_task is not None:
+            partial_task.cancel()
 
 
 @app.on_event("startup")
@@ -334,3 +661,31 @@ async def startup_message():
     print("\n\n  TeachLab API is running!")
     print("  Health check: http://127.0.0.1:8000/health")
     print("  API docs:     http://127.0.0.1:8000/docs\n")
+
+
+@app.on_event("startup")
+async def warm_speech_synthesizers():
+    # In the background so a slow Speech endpoint doesn't hold up startup
+    asyncio.create_task(warm_up_tts([s.voice_id for s in DEFAULT_STUDENTS]))
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    async def sweep_forever():
+        while True:
+            await asyncio.sleep(60)
+            try:
+                await sessions.sweep()
+            except Exception as e:
+                print(f"[sessions] Sweep failed: {e}")
+
+    asyncio.create_task(sweep_forever())
+
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await close_client()
+    close_tts()
+    close_stt()
+    actors.close()
+    sessions.close()
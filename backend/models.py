@@ -1,7 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+import json
+
+from pydantic import BaseModel, Field, GetCoreSchemaHandler
+from pydantic_core import core_schema
+from typing import Any, Iterable, Iterator, Literal, Optional, Sequence, overload
 from enum import Enum
 
+import numpy as np
+
 
 class EmotionalState(str, Enum):
     eager = "eager"
@@ -25,22 +30,223 @@ class StudentState(BaseModel):
     history: list[dict] = []
 
 
+# Emotion codes used by ClassroomState: index into EMOTIONS
+EMOTIONS: tuple[EmotionalState, ...] = tuple(EmotionalState)
+EMOTION_CODES: dict[str, int] = {e.value: code for code, e in enumerate(EMOTIONS)}
+
+
+class ClassroomState:
+    """
+    A session's roster in array form: one row per student, in roster order.
+
+      engagement, comprehension: float64 (0.0-1.0)
+      emotion:                   int8 code into EMOTIONS
+      consecutive:               int32 consecutive turns speaking
+
+    Turn updates (agents/orchestrator.update_student_states) work on the arrays
+    for the whole roster at once. The dict-like interface (students[sid],
+    .get, .items, .values, ...) hands out StudentState snapshots for the API
+    boundary and prompt building; changing a snapshot does not change the
+    classroom. Validates from and serializes as {student_id: StudentState}.
+    """
+
+    def __init__(self, students: Iterable[StudentState] = ()) -> None:
+        students = list(students)
+        self.ids: list[str] = [s.id for s in students]
+        self._rows: dict[str, int] = {sid: row for row, sid in enumerate(self.ids)}
+        self.names: list[str] = [s.name for s in students]
+        self._personas = [s.persona for s in students]
+        self._voices = [s.voice_id for s in students]
+        self._histories = [s.history for s in students]
+        self.engagement = np.array([s.engagement for s in students], dtype=np.float64)
+        self.comprehension = np.array([s.comprehension for s in students], dtype=np.float64)
+        self.emotion = np.array([EMOTION_CODES[s.emotional_state.value] for s in students], dtype=np.int8)
+        self.consecutive = np.array([s.consecutive_turns_speaking for s in students], dtype=np.int32)
+        # Roster size is fixed, so its serialized size is measured once
+        self.bytes = sum(len(s.model_dump_json()) for s in students)
+
+    def row(self, student_id: str) -> int | None:
+        return self._rows.get(student_id)
+
+    def view(self, row: int) -> StudentState:
+        return StudentState.model_construct(
+            id=self.ids[row],
+            name=self.names[row],
+            persona=self._personas[row],
+            voice_id=self._voices[row],
+            engagement=float(self.engagement[row]),
+            comprehension=float(self.comprehension[row]),
+            emotional_state=EMOTIONS[self.emotion[row]],
+            consecutive_turns_speaking=int(self.consecutive[row]),
+            history=self._histories[row],
+        )
+
+    def __getitem__(self, student_id: str) -> StudentState:
+        return self.view(self._rows[student_id])
+
+    def get(self, student_id: str, default: StudentState | None = None) -> StudentState | None:
+        row = self._rows.get(student_id)
+        return default if row is None else self.view(row)
+
+    def __contains__(self, student_id: object) -> bool:
+        return student_id in self._rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def keys(self) -> list[str]:
+        return list(self.ids)
+
+    def values(self) -> list[StudentState]:
+        return [self.view(row) for row in range(len(self.ids))]
+
+    def items(self) -> list[tuple[str, StudentState]]:
+        return [(sid, self.view(row)) for row, sid in enumerate(self.ids)]
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        as_dict = handler.generate_schema(dict[str, StudentState])
+        from_dict = core_schema.no_info_after_validator_function(lambda students: cls(students.values()), as_dict)
+        return core_schema.json_or_python_schema(
+            json_schema=from_dict,
+            python_schema=core_schema.union_schema([core_schema.is_instance_schema(cls), from_dict]),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda classroom: dict(classroom.items()), return_schema=as_dict
+            ),
+        )
+
+
 class SessionConfig(BaseModel):
     subject: str
     topic: str
     grade_level: str
+    classroom_batch: bool = False  # one LLM call for all responders when several students reply
+    response_cache: bool = True  # False opts the session out of cached student replies
+    speculative_generation: bool = False  # start likely responders' replies while the LLM orchestrator decides
+    # How a turn's responders are generated: one after another (each sees the previous
+    # replies), first then the rest together, all at once, or picked per turn ("auto")
+    responder_scheduling: Literal["sequential", "first_then_parallel", "parallel", "auto"] = "sequential"
+
+
+class EntryView(Sequence[dict]):
+    """
+    Read-only window onto one of a TurnLog's lists: entries [start, stop) as
+    they were when the view was taken. Creating one copies nothing; later
+    appends to the log are not visible through it.
+    """
+
+    __slots__ = ("_entries", "_start", "_stop")
+
+    def __init__(self, entries: list[dict], start: int = 0, stop: int | None = None) -> None:
+        self._entries = entries
+        self._start = start
+        self._stop = len(entries) if stop is None else stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> dict: ...
+    @overload
+    def __getitem__(self, index: slice) -> "EntryView": ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return EntryView(self._entries, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("entry index out of range")
+        return self._entries[self._start + index]
+
+    def __iter__(self) -> Iterator[dict]:
+        return map(self._entries.__getitem__, range(self._start, self._stop))
+
+    def __repr__(self) -> str:
+        return f"EntryView({list(self)!r})"
+
+
+_NO_ENTRIES: list[dict] = []
+
+
+class TurnLog:
+    """
+    Append-only session timeline, indexed by turn number and by speaker.
+
+    Entries are written once and never changed:
+      teacher: {"turn", "speaker": "teacher", "text"}
+      student: {"turn", "speaker": <name>, "student_id", "text", "emotional_state",
+                "engagement", "comprehension", "comprehension_delta", "engagement_delta"}
+    Silent replies (empty text) are left out. Readers get EntryView windows
+    onto the stored lists instead of copies, so a lookup costs the same however
+    long the session runs. Serializes as a list of dicts.
+    """
+
+    def __init__(self, entries: list[dict] | None = None) -> None:
+        self._entries: list[dict] = []
+        self._by_turn: dict[int, list[dict]] = {}
+        self._by_speaker: dict[str, list[dict]] = {}
+        self.bytes = 0  # running serialized size, for the session store's memory budget
+        for entry in entries or ():
+            self.append(entry)
+
+    def append(self, entry: dict) -> None:
+        self._entries.append(entry)
+        self.bytes += len(json.dumps(entry, default=str))
+        self._by_turn.setdefault(entry.get("turn", 0), []).append(entry)
+        self._by_speaker.setdefault(entry.get("student_id", entry.get("speaker")), []).append(entry)
+
+    def recent(self, n: int) -> EntryView:
+        """The last n entries."""
+        total = len(self._entries)
+        return EntryView(self._entries, max(total - n, 0) if n > 0 else total, total)
+
+    def for_turn(self, turn: int) -> EntryView:
+        return EntryView(self._by_turn.get(turn, _NO_ENTRIES))
+
+    def for_speaker(self, speaker: str) -> EntryView:
+        """Entries by "teacher" or by a student id, oldest first."""
+        return EntryView(self._by_speaker.get(speaker, _NO_ENTRIES))
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        from_list = core_schema.no_info_after_validator_function(cls, handler.generate_schema(list[dict]))
+        return core_schema.json_or_python_schema(
+            json_schema=from_list,
+            python_schema=core_schema.union_schema([core_schema.is_instance_schema(cls), from_list]),
+            serialization=core_schema.plain_serializer_function_ser_schema(lambda log: list(log._entries)),
+        )
+
+
+_SESSION_ENVELOPE_BYTES = 1024  # config, flags and chaos event
 
 
 class SessionState(BaseModel):
     session_id: str
     config: SessionConfig
-    students: dict[str, StudentState] = {}
-    timeline: list[dict] = []
+    students: ClassroomState = Field(default_factory=ClassroomState)
+    timeline: TurnLog = Field(default_factory=TurnLog)
     turn_count: int = 0
     active: bool = True
     chaos_active: bool = False
     chaos_event: Optional[dict] = None
 
+    def approx_bytes(self) -> int:
+        """Serialized size estimate kept without serializing (see services/session_store.py)."""
+        return _SESSION_ENVELOPE_BYTES + self.students.bytes + self.timeline.bytes
+
 
 class TeacherMessage(BaseModel):
     type: str = "teacher_input"
@@ -56,7 +262,30 @@ class StudentResponse(BaseModel):
     emotional_state: EmotionalState
     engagement: float
     comprehension: float
+    comprehension_delta: Optional[int] = None
+    engagement_delta: Optional[int] = None
     audio_base64: Optional[str] = None
+    response_id: Optional[str] = None  # binary audio mode: matches the audio frame that follows
+
+
+class TranscriptUpdate(BaseModel):
+    type: str = "transcript"
+    text: str
+    final: bool = False  # True once the utterance has ended; the turn starts right after
+
+
+class StudentResponseDelta(BaseModel):
+    type: str = "student_response_delta"
+    student_id: str
+    student_name: str
+    delta: str
+
+
+class StudentResponseAborted(BaseModel):
+    type: str = "student_response_aborted"
+    student_id: str
+    student_name: str
+    reason: str  # "timeout"
 
 
 class StateUpdate(BaseModel):
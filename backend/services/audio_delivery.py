@@ -0,0 +1,67 @@
+"""
+Out-of-band delivery of synthesized student audio
+
+Binary WebSocket mode (?audio=binary) sends each student reply as a small JSON
+frame carrying a `response_id`, followed by the MP3 as a binary frame:
+
+    [uint16 big-endian header length][UTF-8 JSON header][MP3 bytes]
+
+The header is {"type": "student_audio", "response_id", "student_id", "format"}.
+Streaming mode (?audio=stream) sends one frame per synthesized chunk with
+"seq" and "final" added to the header; the last frame has an empty payload and
+"final": true.
+For HTTP replies (chaos injection with ?audio=binary) the audio is parked here
+instead and fetched raw from GET /audio/{response_id} once synthesis finishes.
+Parked audio lives in the worker that synthesized it, so with several workers
+the fetch must be routed back to it (see Running Multiple Workers in
+docs/architecture.md).
+"""
+
+import asyncio
+import json
+import os
+import struct
+import uuid
+
+from services.lru_cache import LRUCache
+
+AUDIO_FORMAT = "audio/mpeg"
+
+# Pending/finished syntheses for GET /audio/{response_id}; a client that never
+# fetches its audio just lets the entry expire.
+_pending_audio = LRUCache(
+    max_entries=int(os.getenv("AUDIO_STORE_SIZE", "256")),
+    ttl=float(os.getenv("AUDIO_STORE_TTL", "120")),
+)
+
+
+def new_response_id() -> str:
+    return uuid.uuid4().hex
+
+
+def encode_audio_frame(header: dict, audio: bytes) -> bytes:
+    """Pack a JSON header and raw audio into one binary WebSocket frame."""
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return struct.pack(">H", len(encoded)) + encoded + audio
+
+
+def decode_audio_frame(frame: bytes) -> tuple[dict, bytes]:
+    """Inverse of encode_audio_frame (used by Python clients and load tests)."""
+    (length,) = struct.unpack_from(">H", frame)
+    return json.loads(frame[2:2 + length]), frame[2 + length:]
+
+
+def park_audio(response_id: str, synthesis: asyncio.Task) -> None:
+    """Keep a running synthesis so its audio can be fetched by response id."""
+    _pending_audio.set(response_id, synthesis)
+
+
+async def fetch_audio(response_id: str) -> bytes | None:
+    """Wait for parked audio; None if unknown, expired or synthesis failed."""
+    synthesis = _pending_audio.get(response_id)
+    if synthesis is None:
+        return None
+    try:
+        return await asyncio.shield(synthesis)
+    except Exception:
+        return None
@@ -3,21 +3,247 @@ Azure OpenAI Service Wrapper
 
 Provides a unified interface for LLM calls.
 Falls back to standard OpenAI SDK if Azure credentials aren't configured.
+
+A single client (and keep-alive connection pool) is shared by every call in the
+process. Pool limits come from LLM_MAX_CONNECTIONS / LLM_MAX_KEEPALIVE_CONNECTIONS;
+call close_client() on shutdown.
+
+Requests go through a pluggable LLMProvider. LLM_PROVIDER=mock swaps in the offline
+mock from services/mock_llm.py, so the backend runs without network access.
 """
 
 import os
 import json
-from typing import Any
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator
+import httpx
 from dotenv import load_dotenv
 from openai import AsyncAzureOpenAI, AsyncOpenAI
 
+from services.llm_scheduler import LLMScheduler, Priority, estimate_tokens
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Connection pool sizing for the shared client (one pool per process)
+_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+_POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", "10"))
+_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+_provider: "LLMProvider | None" = None
+
+# Central admission control: quota buckets, priority lanes and 429 backoff
+_scheduler = LLMScheduler.from_env()
+
+
+class _PoolStats:
+    """Counters describing how the shared connection pool is being used."""
+
+    def __init__(self) -> None:
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "max_connections": _MAX_CONNECTIONS,
+            "max_keepalive_connections": _MAX_KEEPALIVE_CONNECTIONS,
+            "connections_in_use": self.in_use,
+            "peak_connections_in_use": self.peak_in_use,
+            "requests_waiting": self.waiting,
+            "requests_total": self.requests,
+            "avg_wait_ms": round(self.wait_total / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+_pool_stats = _PoolStats()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that releases the pool slot once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release) -> None:
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled HTTP transport to record connections in use and the time
+    each request spends waiting for a ready connection (pool wait + connect).
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+        released = False
+        upstream_trace = request.extensions.get("trace")
+
+        def acquire() -> None:
+            nonlocal acquired
+            if acquired:
+                return
+            acquired = True
+            waited = time.perf_counter() - started
+            _pool_stats.waiting -= 1
+            _pool_stats.in_use += 1
+            _pool_stats.peak_in_use = max(_pool_stats.peak_in_use, _pool_stats.in_use)
+            _pool_stats.wait_total += waited
+            _pool_stats.wait_max = max(_pool_stats.wait_max, waited)
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            if acquired:
+                _pool_stats.in_use -= 1
+            else:
+                _pool_stats.waiting -= 1
+
+        async def trace(event_name: str, info: dict) -> None:
+            # Headers are only written once the pool has handed us a live connection
+            if event_name.endswith("send_request_headers.started"):
+                acquire()
+            if upstream_trace is not None:
+                await upstream_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        _pool_stats.requests += 1
+        _pool_stats.waiting += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Create the keep-alive HTTP client shared by every LLM call in this process."""
+    limits = httpx.Limits(
+        max_connections=_MAX_CONNECTIONS,
+        max_keepalive_connections=_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=_KEEPALIVE_EXPIRY,
+    )
+    transport = _MeteredTransport(httpx.AsyncHTTPTransport(limits=limits))
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(_REQUEST_TIMEOUT, pool=_POOL_TIMEOUT),
+    )
+
+
+class LLMProvider(ABC):
+    """A backend that serves chat completion requests (OpenAI-style kwargs)."""
+
+    @abstractmethod
+    async def complete(self, request: dict[str, Any]) -> str:
+        """Return the full assistant message for `request`."""
+
+    @abstractmethod
+    def stream(self, request: dict[str, Any]) -> AsyncIterator[str]:
+        """Yield content fragments of the assistant message for `request`."""
+
+    async def close(self) -> None:
+        """Release any connections held by the provider."""
+
+
+class OpenAIProvider(LLMProvider):
+    """Azure OpenAI / OpenAI over the shared keep-alive connection pool."""
+
+    def __init__(self) -> None:
+        self.client = _create_client()
+
+    async def complete(self, request: dict[str, Any]) -> str:
+        response = await self.client.chat.completions.create(**request)
+        return response.choices[0].message.content or ""
+
+    async def stream(self, request: dict[str, Any]) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(**request, stream=True)
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def _get_provider() -> LLMProvider:
+    """
+    Get the process-wide provider, creating it on first use.
+
+    LLM_PROVIDER=mock selects the offline mock (services/mock_llm.py); anything
+    else uses Azure OpenAI or OpenAI depending on which credentials are set.
+    """
+    global _provider
+    if _provider is None:
+        if os.getenv("LLM_PROVIDER", "").lower() == "mock":
+            from services.mock_llm import MockProvider
+            _provider = MockProvider()
+        else:
+            _provider = OpenAIProvider()
+    return _provider
+
+
+def set_provider(provider: LLMProvider | None) -> None:
+    """Install a specific provider (e.g. a configured MockProvider for benchmarks)."""
+    global _provider
+    _provider = provider
+
+
+async def close_client() -> None:
+    """Close the shared provider and its connection pool (call on app shutdown)."""
+    global _provider
+    if _provider is not None:
+        provider, _provider = _provider, None
+        await provider.close()
+
+
+def get_pool_stats() -> dict:
+    """Return connection pool statistics for sizing LLM_MAX_CONNECTIONS."""
+    return _pool_stats.as_dict()
+
+
+def get_scheduler_stats() -> dict:
+    """Return queue depth / wait time per priority lane and rate-limit counters."""
+    return _scheduler.stats()
+
 
 # Determine which client to use based on environment
-def _get_client() -> AsyncAzureOpenAI | AsyncOpenAI:
-    """Get the appropriate OpenAI client based on available credentials."""
+def _create_client() -> AsyncAzureOpenAI | AsyncOpenAI:
+    """Build the appropriate OpenAI client based on available credentials."""
     azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     azure_key = os.getenv("AZURE_OPENAI_API_KEY")
 
@@ -26,6 +252,8 @@ def _get_client() -> AsyncAzureOpenAI | AsyncOpenAI:
             azure_endpoint=azure_endpoint,
             api_key=azure_key,
             api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview"),
+            http_client=_build_http_client(),
+            max_retries=0,  # retries and 429 backoff are handled by the scheduler
         )
 
     # Fallback to standard OpenAI
@@ -37,7 +265,7 @@ def _get_client() -> AsyncAzureOpenAI | AsyncOpenAI:
             "  - OPENAI_API_KEY (for standard OpenAI)"
         )
 
-    return AsyncOpenAI(api_key=openai_key)
+    return AsyncOpenAI(api_key=openai_key, http_client=_build_http_client(), max_retries=0)
 
 
 def _get_model() -> str:
@@ -46,11 +274,33 @@ def _get_model() -> str:
     return os.getenv("AZURE_OPENAI_DEPLOYMENT", os.getenv("OPENAI_MODEL", "gpt-4o"))
 
 
+def _build_request(
+    messages: list[dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    json_mode: bool,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    request_kwargs: dict[str, Any] = {
+        "model": _get_model(),
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        **kwargs,
+    }
+
+    if json_mode:
+        request_kwargs["response_format"] = {"type": "json_object"}
+
+    return request_kwargs
+
+
 async def chat_completion(
     messages: list[dict[str, str]],
     temperature: float = 0.7,
     max_tokens: int = 500,
     json_mode: bool = False,
+    priority: Priority = Priority.ORCHESTRATOR,
     **kwargs: Any,
 ) -> str:
     """
@@ -61,34 +311,58 @@ async def chat_completion(
         temperature: Sampling temperature (0-2)
         max_tokens: Maximum tokens in response
         json_mode: If True, request JSON output format
+        priority: Scheduler lane (LIVE student replies go ahead of everything else)
         **kwargs: Additional arguments passed to the API
 
     Returns:
         The assistant's response text
     """
-    client = _get_client()
-    model = _get_model()
+    request_kwargs = _build_request(messages, temperature, max_tokens, json_mode, **kwargs)
+    provider = _get_provider()
+    return await _scheduler.run(
+        priority,
+        estimate_tokens(messages, max_tokens),
+        lambda: provider.complete(request_kwargs),
+    )
 
-    request_kwargs: dict[str, Any] = {
-        "model": model,
-        "messages": messages,
-        "temperature": temperature,
-        "max_tokens": max_tokens,
-        **kwargs,
-    }
 
-    if json_mode:
-        request_kwargs["response_format"] = {"type": "json_object"}
+async def chat_completion_stream(
+    messages: list[dict[str, str]],
+    temperature: float = 0.7,
+    max_tokens: int = 500,
+    json_mode: bool = False,
+    priority: Priority = Priority.ORCHESTRATOR,
+    **kwargs: Any,
+) -> AsyncIterator[str]:
+    """
+    Send a streaming chat completion request.
 
-    response = await client.chat.completions.create(**request_kwargs)
+    Args:
+        messages: List of message dicts with 'role' and 'content'
+        temperature: Sampling temperature (0-2)
+        max_tokens: Maximum tokens in response
+        json_mode: If True, request JSON output format
+        priority: Scheduler lane (LIVE student replies go ahead of everything else)
+        **kwargs: Additional arguments passed to the API
 
-    return response.choices[0].message.content or ""
+    Yields:
+        Content fragments of the assistant's response as they are generated
+    """
+    request_kwargs = _build_request(messages, temperature, max_tokens, json_mode, **kwargs)
+    provider = _get_provider()
+    async for fragment in _scheduler.stream(
+        priority,
+        estimate_tokens(messages, max_tokens),
+        lambda: provider.stream(request_kwargs),
+    ):
+        yield fragment
 
 
 async def chat_completion_json(
     messages: list[dict[str, str]],
     temperature: float = 0.7,
     max_tokens: int = 500,
+    priority: Priority = Priority.ORCHESTRATOR,
     **kwargs: Any,
 ) -> dict:
     """
@@ -98,6 +372,7 @@ async def chat_completion_json(
         messages: List of message dicts with 'role' and 'content'
         temperature: Sampling temperature (0-2)
         max_tokens: Maximum tokens in response
+        priority: Scheduler lane (LIVE student replies go ahead of everything else)
         **kwargs: Additional arguments passed to the API
 
     Returns:
@@ -111,6 +386,7 @@ async def chat_completion_json(
         temperature=temperature,
         max_tokens=max_tokens,
         json_mode=True,
+        priority=priority,
         **kwargs,
     )
 
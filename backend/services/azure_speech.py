@@ -7,67 +7,288 @@ Requires environment variables:
 
 STT priority:
   1. Azure STT  — used when AZURE_SPEECH_KEY is set (expects PCM/WAV bytes)
-  2. faster-whisper — local fallback; handles WebM/Opus from browser MediaRecorder
+  2. faster-whisper — local fallback; handles WebM/Opus from browser MediaRecorder,
+     decoded in memory in a worker process pool (services/stt_worker.py)
+
+Before either recognizer runs on a final transcript, a local Silero VAD
+(STT_VAD, on by default) trims silence, returns "" for clips with no speech
+without calling anything, and splits long monologues into segments of at
+most STT_MAX_SEGMENT_S (default 15) that whisper transcribes concurrently.
+The VAD runs on its own small thread pool (STT_VAD_WORKERS, default 2) and
+never starts the whisper workers. Streaming partials skip it.
 
 TTS returns None when unavailable — frontend silently skips audio playback.
+Completed syntheses are kept in a content-addressed cache (services/tts_cache.py).
+synthesize_speech() returns raw MP3 bytes (binary WebSocket audio frames);
+text_to_speech() wraps it as base64 for JSON payloads. stream_speech() yields
+MP3 chunks as the synthesizer produces them so playback can start early.
+Synthesis runs on a dedicated bounded executor (TTS_WORKERS, default 8) with
+synthesizers reused per voice (TTS_SYNTHESIZERS_PER_VOICE, default 2) and
+pre-warmed at startup by warm_up_tts(). STT does not share it: whisper decodes
+in a spawn-started process pool (STT_WORKERS, default 2), the VAD has its own
+threads, and only Azure STT calls go through the default executor.
 """
 
 import os
 import asyncio
 import base64
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator
+from xml.sax.saxutils import escape, quoteattr
 from dotenv import load_dotenv
 
+from services import stt_worker
+from services.tts_cache import TTSCache, cache_key
+from services.tts_pool import MeteredExecutor, SynthesizerPool
+
 load_dotenv()
 
 _KEY = os.getenv("AZURE_SPEECH_KEY")
 _REGION = os.getenv("AZURE_SPEECH_REGION", "eastus")
 _AVAILABLE = bool(_KEY)
+# Part of the TTS cache key — change it together with the format in _create_synthesizer
+_OUTPUT_FORMAT = "audio-16khz-32kbitrate-mono-mp3"
+# That format is constant-bitrate MPEG-2 Layer III: 576 samples (36 ms) per frame,
+# 72 * 32000 / 16000 = 144 bytes per frame, which lets batch audio be cut on frame boundaries
+_MP3_FRAME_BYTES = 144
+_MP3_FRAME_SECONDS = 576 / 16000
+# Multi-voice requests (e.g. chaos fan-out) use one SSML synthesis; TTS_SSML_BATCH=0 disables
+_SSML_BATCH = os.getenv("TTS_SSML_BATCH", "1").lower() in ("1", "true")
+# Clips cut from a batch are estimated at frame granularity and may clip or carry a sliver
+# of the next voice, so they are cached under their own format and never served as a
+# single-voice synthesis
+_BATCH_CLIP_FORMAT = f"{_OUTPUT_FORMAT}+ssml-batch"
+
+_tts_cache = TTSCache.from_env()
 
 if _AVAILABLE:
     import azure.cognitiveservices.speech as speechsdk
 
-# Lazy-loaded faster-whisper model (downloaded once, cached in ~/.cache/huggingface)
-_whisper_model = None
+# faster-whisper runs in a dedicated process pool (STT_WORKERS, default 2): CTranslate2
+# decoding is CPU-bound, so threads would contend with the event loop and TTS. Each
+# worker loads the model once (downloaded once, cached in ~/.cache/huggingface).
+_WHISPER_MODEL = "tiny"
+_STT_WORKERS = max(1, int(os.getenv("STT_WORKERS", "2")))
+_stt_pool: ProcessPoolExecutor | None = None
+_stt_stats = {"requests": 0, "in_flight": 0, "total_seconds": 0.0}
+
+
+def _get_stt_pool() -> ProcessPoolExecutor:
+    global _stt_pool
+    if _stt_pool is None:
+        print(f"[STT] Starting {_STT_WORKERS} faster-whisper worker(s) ('{_WHISPER_MODEL}' model; first-time download may take ~30s)…")
+        cpu_threads = max(1, (os.cpu_count() or 1) // _STT_WORKERS)  # don't oversubscribe cores
+        _stt_pool = ProcessPoolExecutor(
+            max_workers=_STT_WORKERS,
+            # spawn, not fork: the parent has live event-loop, SDK and HTTP client threads
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=stt_worker.init_worker,
+            initargs=(_WHISPER_MODEL, "int8", cpu_threads),
+        )
+    return _stt_pool
+
+
+class _STTBatcher:
+    """
+    Micro-batching queue in front of the whisper workers.
+
+    Requests arriving within STT_BATCH_WINDOW_MS (default 20) of the first queued
+    one — typically from different classrooms — are transcribed as one batch of
+    up to STT_MAX_BATCH (default 8). A window of 0 sends every request alone.
+    """
+
+    def __init__(self, window: float, max_batch: int) -> None:
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._queue: list[tuple[bytes, bool, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.batch_sizes: dict[int, int] = {}
+        self._delay_total = 0.0
+        self._delay_max = 0.0
+        self._items = 0
+
+    async def submit(self, audio_data: bytes, pcm16: bool) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((audio_data, pcm16, future, time.monotonic()))
+        if len(self._queue) >= self.max_batch or self.window <= 0:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            asyncio.ensure_future(self._run(batch))
 
+    async def _run(self, batch: list[tuple[bytes, bool, asyncio.Future, float]]) -> None:
+        now = time.monotonic()
+        for *_, queued_at in batch:
+            self._delay_total += now - queued_at
+            self._delay_max = max(self._delay_max, now - queued_at)
+        self._items += len(batch)
+        self.batches += 1
+        self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
 
-def _get_whisper_model():
-    global _whisper_model
-    if _whisper_model is None:
+        loop = asyncio.get_running_loop()
         try:
-            from faster_whisper import WhisperModel
-            print("[STT] Loading faster-whisper 'tiny' model (first-time download may take ~30s)…")
-            _whisper_model = WhisperModel("tiny", device="cpu", compute_type="int8")
-            print("[STT] faster-whisper ready.")
+            texts = await loop.run_in_executor(
+                _get_stt_pool(), stt_worker.transcribe_batch, [(audio, pcm16) for audio, pcm16, _, _ in batch]
+            )
         except Exception as e:
-            print(f"[STT] Could not load faster-whisper: {e}")
-    return _whisper_model
+            for *_, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future, _), text in zip(batch, texts):
+            if not future.done():  # the caller may have given up
+                future.set_result(text)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": round(self.window * 1000, 1),
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "avg_batch_size": round(self._items / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "avg_queue_delay_ms": round(self._delay_total / self._items * 1000, 2) if self._items else 0.0,
+            "max_queue_delay_ms": round(self._delay_max * 1000, 2),
+        }
+
+
+_stt_batcher = _STTBatcher(
+    window=float(os.getenv("STT_BATCH_WINDOW_MS", "20")) / 1000,
+    max_batch=int(os.getenv("STT_MAX_BATCH", "8")),
+)
 
+_VAD_ENABLED = os.getenv("STT_VAD", "1").lower() in ("1", "true")
+_MAX_SEGMENT_S = float(os.getenv("STT_MAX_SEGMENT_S", "15"))
+_VAD_WORKERS = max(1, int(os.getenv("STT_VAD_WORKERS", "2")))
+# Silero is a small ONNX model that releases the GIL while it runs, so threads are
+# enough — and unlike the whisper pool they load no recognizer
+_vad_executor: ThreadPoolExecutor | None = None
+_vad_stats = {"clips": 0, "silent_dropped": 0, "segments": 0, "failed": 0, "seconds_in": 0.0, "seconds_speech": 0.0}
 
-async def _whisper_stt(audio_data: bytes) -> str:
-    """Transcribe WebM/Opus audio bytes using local faster-whisper."""
-    import tempfile
-    import os as _os
 
-    model = _get_whisper_model()
-    if not model:
+def _get_vad_executor() -> ThreadPoolExecutor:
+    global _vad_executor
+    if _vad_executor is None:
+        _vad_executor = ThreadPoolExecutor(max_workers=_VAD_WORKERS, thread_name_prefix="stt-vad")
+    return _vad_executor
+
+
+async def _speech_segments(audio_data: bytes, pcm16: bool) -> list[bytes] | None:
+    """Speech-only pcm16 segments of the clip ([] = no speech), or None if the VAD couldn't run."""
+    try:
+        segments, duration = await asyncio.get_running_loop().run_in_executor(
+            _get_vad_executor(), stt_worker.speech_segments, audio_data, pcm16, _MAX_SEGMENT_S
+        )
+    except Exception as e:
+        _vad_stats["failed"] += 1
+        print(f"[STT] VAD failed, transcribing the untrimmed clip: {e}")
+        return None
+    _vad_stats["clips"] += 1
+    _vad_stats["seconds_in"] += duration
+    _vad_stats["seconds_speech"] += sum(len(s) for s in segments) / 2 / stt_worker.SAMPLE_RATE
+    _vad_stats["segments"] += len(segments)
+    if not segments:
+        _vad_stats["silent_dropped"] += 1
+    return segments
+
+
+async def _whisper_stt(audio_data: bytes, pcm16: bool = False) -> str:
+    """Transcribe WebM/Opus (or raw 16 kHz PCM) audio bytes in memory using local faster-whisper."""
+    started = time.monotonic()
+    _stt_stats["requests"] += 1
+    _stt_stats["in_flight"] += 1
+    try:
+        return await _stt_batcher.submit(audio_data, pcm16)
+    except Exception as e:
+        print(f"[STT] faster-whisper transcription failed: {e}")
         return ""
+    finally:
+        _stt_stats["in_flight"] -= 1
+        _stt_stats["total_seconds"] += time.monotonic() - started
+
+
+def close_stt() -> None:
+    global _stt_pool, _vad_executor
+    if _vad_executor is not None:
+        _vad_executor.shutdown(wait=False, cancel_futures=True)
+        _vad_executor = None
+    if _stt_pool is not None:
+        _stt_pool.shutdown(wait=False, cancel_futures=True)
+        _stt_pool = None
+
 
-    loop = asyncio.get_event_loop()
+def get_stt_stats() -> dict:
+    completed = _stt_stats["requests"] - _stt_stats["in_flight"]
+    return {
+        "workers": _STT_WORKERS,
+        "started": _stt_pool is not None,
+        "requests": _stt_stats["requests"],
+        "in_flight": _stt_stats["in_flight"],
+        "avg_ms": round(_stt_stats["total_seconds"] / completed * 1000, 1) if completed else 0.0,
+        "batching": _stt_batcher.stats(),
+        "vad": {
+            "enabled": _VAD_ENABLED,
+            "workers": _VAD_WORKERS,
+            "max_segment_s": _MAX_SEGMENT_S,
+            "clips": _vad_stats["clips"],
+            "silent_dropped": _vad_stats["silent_dropped"],
+            "segments": _vad_stats["segments"],
+            "failed": _vad_stats["failed"],
+            "seconds_in": round(_vad_stats["seconds_in"], 2),
+            "seconds_speech": round(_vad_stats["seconds_speech"], 2),
+        },
+    }
 
-    def _run() -> str:
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as f:
-            f.write(audio_data)
-            tmp_path = f.name
+
+def _create_synthesizer(voice_id: str):
+    """Synthesizer for one voice, producing MP3 in memory (no speaker output)."""
+    speech_config = speechsdk.SpeechConfig(subscription=_KEY, region=_REGION)
+    speech_config.speech_synthesis_voice_name = voice_id
+    speech_config.set_speech_synthesis_output_format(
+        speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
+    )
+    return speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+
+_tts_executor = MeteredExecutor(int(os.getenv("TTS_WORKERS", "8")), name="tts")
+_synthesizers = SynthesizerPool(_create_synthesizer, int(os.getenv("TTS_SYNTHESIZERS_PER_VOICE", "2")))
+
+
+def _open_connection(synthesiser) -> None:
+    """Connect ahead of the first request so it doesn't pay the TLS/websocket handshake."""
+    speechsdk.Connection.from_speech_synthesizer(synthesiser).open(True)
+
+
+async def warm_up_tts(voice_ids: list[str]) -> None:
+    """Pre-create connected synthesizers for each voice (no-op without Azure credentials)."""
+    if not _AVAILABLE:
+        return
+
+    async def _warm(voice_id: str) -> None:
         try:
-            segments, _ = model.transcribe(tmp_path, language="en")
-            return " ".join(s.text for s in segments).strip()
-        finally:
-            _os.unlink(tmp_path)
+            await _tts_executor.run(_synthesizers.warm, voice_id, _open_connection)
+        except Exception as e:
+            print(f"[TTS] Could not warm synthesizers for {voice_id}: {e}")
 
-    return await loop.run_in_executor(None, _run)
+    await asyncio.gather(*(_warm(v) for v in dict.fromkeys(voice_ids)))
 
 
-async def text_to_speech(text: str, voice_id: str) -> str | None:
+def close_tts() -> None:
+    _tts_executor.shutdown()
+
+
+async def synthesize_speech(text: str, voice_id: str) -> bytes | None:
     """
     Convert text to speech using Azure TTS.
 
@@ -76,34 +297,208 @@ async def text_to_speech(text: str, voice_id: str) -> str | None:
         voice_id: Azure Neural voice name, e.g. "en-US-AriaNeural".
 
     Returns:
-        Base64-encoded MP3 audio string, or None if unavailable / empty text.
+        MP3 audio bytes (16 kHz, 32 kbit/s mono), or None if unavailable / empty text.
     """
     if not text or not text.strip():
         return None
 
     if not _AVAILABLE:
-        return None  # Frontend skips audio playback when audio_base64 is null
+        return None  # Frontend skips audio playback when no audio arrives
 
-    loop = asyncio.get_running_loop()
+    key = cache_key(voice_id, _OUTPUT_FORMAT, text)
+    cached = await _tts_cache.get(key)
+    if cached is not None:
+        return cached
 
-    def _synthesize() -> str | None:
-        speech_config = speechsdk.SpeechConfig(subscription=_KEY, region=_REGION)
-        speech_config.speech_synthesis_voice_name = voice_id
-        speech_config.set_speech_synthesis_output_format(
-            speechsdk.SpeechSynthesisOutputFormat.Audio16Khz32KBitRateMonoMp3
-        )
-        synthesiser = speechsdk.SpeechSynthesizer(
-            speech_config=speech_config, audio_config=None
-        )
-        result = synthesiser.speak_text_async(text).get()
+    def _synthesize() -> bytes | None:
+        synthesiser = _synthesizers.acquire(voice_id)
+        try:
+            result = synthesiser.speak_text_async(text).get()
+        finally:
+            _synthesizers.release(voice_id, synthesiser)
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-            return base64.b64encode(result.audio_data).decode("utf-8")
+            return result.audio_data
         return None
 
-    return await loop.run_in_executor(None, _synthesize)
+    audio = await _tts_executor.run(_synthesize)
+    if audio:
+        await _tts_cache.set(key, audio)
+    return audio
+
+
+def _batch_ssml(segments: list[tuple[str, str]]) -> str:
+    """One SSML document with a <voice> per segment, each opening with bookmark "s<i>"."""
+    voices = "".join(
+        f"<voice name={quoteattr(voice_id)}><bookmark mark=\"s{i}\"/>{escape(text)}</voice>"
+        for i, (voice_id, text) in enumerate(segments)
+    )
+    return (
+        '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">'
+        f"{voices}</speak>"
+    )
+
+
+def _split_mp3(audio: bytes, offsets: list[float]) -> list[bytes]:
+    """Cut CBR MP3 audio at the frame boundaries nearest to each start offset (seconds)."""
+    start = audio.find(b"\xff")
+    while start != -1 and (start + 1 >= len(audio) or audio[start + 1] & 0xE0 != 0xE0):
+        start = audio.find(b"\xff", start + 1)  # skip to the first frame sync (past any ID3 tag)
+    start = max(start, 0)
+    cuts = [
+        min(len(audio), start + round(offset / _MP3_FRAME_SECONDS) * _MP3_FRAME_BYTES)
+        for offset in offsets
+    ]
+    cuts[0] = start
+    return [audio[begin:end] for begin, end in zip(cuts, cuts[1:] + [len(audio)])]
+
+
+def _synthesize_ssml_batch(segments: list[tuple[str, str]]) -> list[bytes] | None:
+    """Blocking: synthesize all segments in one request and split per segment."""
+    synthesiser = _synthesizers.acquire(segments[0][0])  # the SSML picks the voices
+    offsets: dict[int, float] = {}
 
+    def _on_bookmark(evt) -> None:
+        offsets[int(evt.text[1:])] = evt.audio_offset / 10_000_000  # 100 ns ticks
 
-async def speech_to_text(audio_data: bytes) -> str:
+    synthesiser.bookmark_reached.connect(_on_bookmark)
+    try:
+        result = synthesiser.speak_ssml_async(_batch_ssml(segments)).get()
+    finally:
+        synthesiser.bookmark_reached.disconnect_all()
+        _synthesizers.release(segments[0][0], synthesiser)
+    if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted or len(offsets) != len(segments):
+        return None
+    return _split_mp3(result.audio_data, [offsets[i] for i in range(len(segments))])
+
+
+async def synthesize_speech_many(segments: list[tuple[str, str]], timeout: float = 8.0) -> list[bytes | None]:
+    """
+    Synthesize several (voice_id, text) segments, e.g. every student's chaos reaction.
+
+    Cached segments are served from the cache; the rest go out as a single
+    multi-voice SSML request whose audio is split at per-segment bookmarks.
+    Split clips are cached under their own key, which only this function reads.
+    If the batch fails, segments are synthesized individually. Returns audio
+    per segment, in order (None for empty text / unavailable TTS).
+    """
+    clips: list[bytes | None] = [None] * len(segments)
+    if not _AVAILABLE:
+        return clips
+
+    keys = [cache_key(voice_id, _OUTPUT_FORMAT, text) for voice_id, text in segments]
+    batch_keys = [cache_key(voice_id, _BATCH_CLIP_FORMAT, text) for voice_id, text in segments]
+    missing = []
+    for i, (voice_id, text) in enumerate(segments):
+        if text and text.strip():
+            clips[i] = await _tts_cache.get(keys[i], batch_keys[i])
+            if clips[i] is None:
+                missing.append(i)
+
+    if _SSML_BATCH and len(missing) > 1:
+        try:
+            batch = await asyncio.wait_for(
+                _tts_executor.run(_synthesize_ssml_batch, [segments[i] for i in missing]),
+                timeout=timeout,
+            )
+        except Exception as e:
+            print(f"[TTS] SSML batch failed, synthesizing per segment: {e!r}")
+            batch = None
+        if batch is not None:
+            for i, audio in zip(missing, batch):
+                clips[i] = audio
+                await _tts_cache.set(batch_keys[i], audio)
+            return clips
+
+    async def _single(i: int) -> None:
+        try:
+            clips[i] = await asyncio.wait_for(synthesize_speech(segments[i][1], segments[i][0]), timeout=timeout)
+        except (asyncio.TimeoutError, Exception):
+            clips[i] = None
+
+    await asyncio.gather(*(_single(i) for i in missing))
+    return clips
+
+
+async def stream_speech(text: str, voice_id: str) -> AsyncIterator[bytes]:
+    """
+    Synthesize text and yield MP3 chunks as soon as Azure produces them.
+
+    Chunks arrive on the SDK's `synthesizing` event (a worker thread) and are
+    handed to the event loop through a queue. Yields nothing when TTS is
+    unavailable or the text is empty; stops early if synthesis is cancelled.
+    """
+    if not text or not text.strip() or not _AVAILABLE:
+        return
+
+    key = cache_key(voice_id, _OUTPUT_FORMAT, text)
+    cached = await _tts_cache.get(key)
+    if cached is not None:
+        yield cached  # already complete — one chunk is as fast as it gets
+        return
+
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue()
+    synthesiser = await _tts_executor.run(_synthesizers.acquire, voice_id)
+    outcome = {"completed": False}
+
+    def _on_chunk(evt) -> None:
+        loop.call_soon_threadsafe(chunks.put_nowait, evt.result.audio_data)
+
+    def _on_completed(evt) -> None:
+        outcome["completed"] = True
+        loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    def _on_canceled(evt) -> None:
+        loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+    synthesiser.synthesizing.connect(_on_chunk)
+    synthesiser.synthesis_completed.connect(_on_completed)
+    synthesiser.synthesis_canceled.connect(_on_canceled)
+
+    synthesiser.speak_text_async(text)  # returns immediately; progress arrives via events
+    received: list[bytes] = []
+    finished = False
+    try:
+        while (chunk := await chunks.get()) is not None:
+            if chunk:
+                received.append(chunk)
+                yield chunk
+        finished = True
+    finally:
+        for signal in (synthesiser.synthesizing, synthesiser.synthesis_completed, synthesiser.synthesis_canceled):
+            signal.disconnect_all()
+        if finished:
+            _synthesizers.release(voice_id, synthesiser)
+        else:
+            synthesiser.stop_speaking_async()  # consumer gave up (timeout / disconnect); don't reuse
+    if outcome["completed"]:
+        await _tts_cache.set(key, b"".join(received))
+
+
+async def text_to_speech(text: str, voice_id: str) -> str | None:
+    """
+    Convert text to speech using Azure TTS.
+
+    Returns:
+        Base64-encoded MP3 audio string, or None if unavailable / empty text.
+    """
+    audio = await synthesize_speech(text, voice_id)
+    if audio is None:
+        return None
+    return base64.b64encode(audio).decode("utf-8")
+
+
+def get_tts_cache_stats() -> dict:
+    """Hit counters and sizes for the TTS audio cache."""
+    return _tts_cache.stats()
+
+
+def get_tts_executor_stats() -> dict:
+    """Queue depth of the TTS executor and synthesizer reuse per voice."""
+    return {**_tts_executor.stats(), "synthesizers": _synthesizers.stats()}
+
+
+async def speech_to_text(audio_data: bytes, pcm16: bool = False, partial: bool = False) -> str:
     """
     Transcribe audio bytes to text.
 
@@ -113,6 +508,9 @@ async def speech_to_text(audio_data: bytes) -> str:
 
     Args:
         audio_data: Raw audio bytes from the client.
+        pcm16:      Audio is raw 16 kHz, 16-bit mono PCM rather than a container.
+        partial:    Interim transcript of a streamed utterance — local whisper only,
+                    so repeated re-decodes don't each cost an Azure request.
 
     Returns:
         Transcribed text string, or empty string if transcription fails.
@@ -120,22 +518,40 @@ async def speech_to_text(audio_data: bytes) -> str:
     if not audio_data:
         return ""
 
+    # --- Local VAD: drop silence, split long monologues (final transcripts only) ---
+    segments = await _speech_segments(audio_data, pcm16) if _VAD_ENABLED and not partial else None
+    if segments == []:
+        return ""
+    if segments is not None:
+        # Trimmed segments are raw 16 kHz PCM — also what Azure's push stream expects
+        audio_data, pcm16 = b"".join(segments), True
+
     # --- Azure STT (works with PCM/WAV; skip gracefully on format mismatch) ---
-    if _AVAILABLE:
-        try:
-            speech_config = speechsdk.SpeechConfig(subscription=_KEY, region=_REGION)
-            audio_stream = speechsdk.audio.PushAudioInputStream()
-            audio_config = speechsdk.audio.AudioConfig(stream=audio_stream)
-            recogniser = speechsdk.SpeechRecognizer(
-                speech_config=speech_config, audio_config=audio_config
-            )
-            audio_stream.write(audio_data)
-            audio_stream.close()
-            result = recogniser.recognize_once_async().get()
-            if result.reason == speechsdk.ResultReason.RecognizedSpeech and result.text:
-                return result.text
-        except Exception as e:
-            print(f"[STT] Azure STT error, falling back to whisper: {e}")
+    if _AVAILABLE and not partial:
+        text = await asyncio.get_running_loop().run_in_executor(None, _azure_stt, audio_data)
+        if text:
+            return text
 
     # --- faster-whisper fallback (handles WebM/Opus natively) ---
-    return await _whisper_stt(audio_data)
+    if segments is not None and len(segments) > 1:
+        texts = await asyncio.gather(*(_whisper_stt(s, pcm16=True) for s in segments))
+        return " ".join(t for t in texts if t).strip()
+    return await _whisper_stt(audio_data, pcm16=pcm16)
+
+
+def _azure_stt(audio_data: bytes) -> str | None:
+    try:
+        speech_config = speechsdk.SpeechConfig(subscription=_KEY, region=_REGION)
+        audio_stream = speechsdk.audio.PushAudioInputStream()
+        audio_config = speechsdk.audio.AudioConfig(stream=audio_stream)
+        recogniser = speechsdk.SpeechRecognizer(
+            speech_config=speech_config, audio_config=audio_config
+        )
+        audio_stream.write(audio_data)
+        audio_stream.close()
+        result = recogniser.recognize_once_async().get()
+        if result.reason == speechsdk.ResultReason.RecognizedSpeech and result.text:
+            return result.text
+    except Exception as e:
+        print(f"[STT] Azure STT error, falling back to whisper: {e}")
+    return None
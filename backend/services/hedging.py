@@ -0,0 +1,129 @@
+"""
+Request hedging for latency-critical LLM calls
+
+Tracks a rolling latency window per agent type. When hedging is enabled
+(LLM_HEDGE=1) and a call has not finished by the agent's rolling percentile
+(LLM_HEDGE_PERCENTILE, default p95), an identical duplicate is fired; whichever
+finishes first wins and the other is cancelled. Trades a few percent extra
+tokens for a much shorter tail.
+
+The window holds one sample per call: its first attempt's upstream time,
+measured from admission by the LLM scheduler so queueing behind other requests
+does not read as a slow deployment. A first attempt cancelled because its
+duplicate won is recorded for as long as it had run (a lower bound); dropping
+it would leave only the fast calls and drag the percentile down.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from services.llm_scheduler import admitted_at
+
+T = TypeVar("T")
+
+_ENABLED = os.getenv("LLM_HEDGE", "").lower() in ("1", "true")
+_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+
+
+class _AgentLatency:
+    def __init__(self) -> None:
+        self.samples: deque[float] = deque(maxlen=_WINDOW)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def percentile(self, q: float) -> float | None:
+        if len(self.samples) < _MIN_SAMPLES:
+            return None  # not enough history to know what "slow" means yet
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def as_dict(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": len(self.samples),
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+_agents: dict[str, _AgentLatency] = {}
+
+
+def _tracker(agent: str) -> _AgentLatency:
+    if agent not in _agents:
+        _agents[agent] = _AgentLatency()
+    return _agents[agent]
+
+
+async def _timed(tracker: _AgentLatency, call: Callable[[], Awaitable[T]]) -> T:
+    """Await the call and record its upstream latency, also when it is cancelled."""
+    started = time.monotonic()
+
+    def admitted() -> float | None:
+        at = admitted_at()
+        return at if at is not None and at >= started else None  # earlier values are another call's
+
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        upstream_start = admitted()
+        if upstream_start is not None:  # cancelled while still queued: nothing upstream to record
+            tracker.samples.append(time.monotonic() - upstream_start)
+        raise
+    tracker.samples.append(time.monotonic() - (admitted() or started))
+    return result
+
+
+async def hedged(agent: str, call: Callable[[], Awaitable[T]]) -> T:
+    """
+    Await `call()`, firing a duplicate if it outlives the agent's hedge threshold.
+
+    Latency is always recorded so thresholds are warm when hedging is switched on.
+    Only first attempts are sampled, one per call, so which copy won does not skew the window.
+    """
+    tracker = _tracker(agent)
+    tracker.calls += 1
+    threshold = tracker.percentile(_PERCENTILE) if _ENABLED else None
+    if threshold is None:
+        return await _timed(tracker, call)
+
+    primary = asyncio.ensure_future(_timed(tracker, call))
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if done:
+            return primary.result()
+
+        tracker.hedged += 1
+        tasks.add(asyncio.ensure_future(call()))
+        while True:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if task.exception() is None), None)
+            if winner is not None:
+                if winner is not primary:
+                    tracker.hedge_wins += 1
+                return winner.result()
+            if not tasks:
+                raise done.pop().exception()
+            # One copy failed — keep waiting on the other
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def get_hedging_stats() -> dict:
+    return {
+        "enabled": _ENABLED,
+        "percentile": _PERCENTILE,
+        "agents": {agent: tracker.as_dict() for agent, tracker in _agents.items()},
+    }
@@ -0,0 +1,296 @@
+"""
+LLM request scheduler
+
+Every chat completion goes through one process-wide scheduler that enforces the
+deployment's quota and decides who goes first when there is contention:
+
+  - token buckets for requests/min (LLM_RPM_LIMIT) and tokens/min (LLM_TPM_LIMIT)
+  - an optional in-flight cap (LLM_MAX_CONCURRENT)
+  - priority lanes: LIVE student replies, then ORCHESTRATOR, then ANALYSIS
+    (post-session feedback/autopsy). Only the highest-priority waiter may take
+    capacity, and ANALYSIS must also leave LLM_ANALYSIS_RESERVE of the token
+    bucket free, so live turns never queue behind a 4000-token autopsy.
+  - 429 handling: the whole scheduler pauses for the server's retry-after
+    (exponential backoff if absent) and the request is retried.
+
+Limits of 0 mean "unlimited"; with no limits set the scheduler only handles retries.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import random
+import time
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# Transient upstream failures retried with backoff (without pausing other requests)
+_TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+# When the current task's latest request was admitted (time.monotonic()), so callers
+# can time the upstream call without its queueing and rate-limit pauses
+_admitted_at: ContextVar[float | None] = ContextVar("llm_admitted_at", default=None)
+
+
+def admitted_at() -> float | None:
+    """Monotonic time the current task's latest request left the admission queue."""
+    return _admitted_at.get()
+
+
+class Priority(IntEnum):
+    LIVE = 0          # student replies during a turn
+    ORCHESTRATOR = 1  # responder selection
+    ANALYSIS = 2      # post-session feedback and autopsy
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to `per_minute` units."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.level = per_minute
+        self._rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self._rate
+
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class _LaneStats:
+    def __init__(self) -> None:
+        self.queued = 0
+        self.started = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "started": self.started,
+            "avg_wait_ms": round(self.wait_total / self.started * 1000, 2) if self.started else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+        }
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        rpm: float = 0,
+        tpm: float = 0,
+        max_concurrent: int = 0,
+        analysis_reserve: float = 0.2,
+        max_retries: int = 4,
+    ) -> None:
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrent = max_concurrent
+        self.analysis_reserve = analysis_reserve
+        self.max_retries = max_retries
+
+        self._cond: asyncio.Condition | None = None
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._lanes = {p: _LaneStats() for p in Priority}
+        self.rate_limited = 0
+        self.retries = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM_LIMIT", "0")),
+            tpm=float(os.getenv("LLM_TPM_LIMIT", "0")),
+            max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", "0")),
+            analysis_reserve=float(os.getenv("LLM_ANALYSIS_RESERVE", "0.2")),
+            max_retries=int(os.getenv("LLM_MAX_RATE_LIMIT_RETRIES", "4")),
+        )
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def run(self, priority: Priority, tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call` once capacity is granted, retrying on 429 and transient errors."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, tokens)
+            try:
+                return await call()
+            except (openai.RateLimitError, *_TRANSIENT_ERRORS) as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                await self._release()
+            await self._back_off(error, attempt)
+        raise AssertionError("unreachable")
+
+    async def stream(
+        self,
+        priority: Priority,
+        tokens: int,
+        call: Callable[[], AsyncIterator[str]],
+    ) -> AsyncIterator[str]:
+        """Streaming variant of run(); retries only if nothing has been yielded yet."""
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, tokens)
+            started = False
+            try:
+                async for fragment in call():
+                    started = True
+                    yield fragment
+                return
+            except (openai.RateLimitError, *_TRANSIENT_ERRORS) as e:
+                if started or attempt == self.max_retries:
+                    raise
+                error = e
+            finally:
+                await self._release()
+            await self._back_off(error, attempt)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rpm_available": round(self._requests.level, 1) if self._requests else None,
+            "tpm_available": round(self._tokens.level, 1) if self._tokens else None,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "lanes": {p.name.lower(): lane.as_dict() for p, lane in self._lanes.items()},
+        }
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _delay(self, priority: Priority, tokens: int, now: float) -> float:
+        """Seconds the head waiter must still wait (inf = until a slot is released)."""
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self.max_concurrent and self._in_flight >= self.max_concurrent:
+            return math.inf
+        delay = 0.0
+        if self._requests:
+            delay = max(delay, self._requests.time_until(1, now))
+        if self._tokens:
+            needed = tokens
+            if priority == Priority.ANALYSIS:
+                needed += self.analysis_reserve * self._tokens.capacity
+            delay = max(delay, self._tokens.time_until(needed, now))
+        return delay
+
+    async def _acquire(self, priority: Priority, tokens: int) -> None:
+        cond = self._condition()
+        lane = self._lanes[priority]
+        ticket = (int(priority), next(self._seq))
+        started = time.monotonic()
+        lane.queued += 1
+        async with cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._waiters[0] == ticket:
+                        delay = self._delay(priority, tokens, time.monotonic())
+                        if delay <= 0:
+                            break
+                        timeout = None if math.isinf(delay) else delay
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                cond.notify_all()
+                lane.queued -= 1
+                raise
+
+            heapq.heappop(self._waiters)
+            now = time.monotonic()
+            if self._requests:
+                self._requests.consume(1, now)
+            if self._tokens:
+                self._tokens.consume(tokens, now)
+            self._in_flight += 1
+            cond.notify_all()  # the next waiter is now at the head
+
+        _admitted_at.set(time.monotonic())
+        waited = time.monotonic() - started
+        lane.queued -= 1
+        lane.started += 1
+        lane.wait_total += waited
+        lane.wait_max = max(lane.wait_max, waited)
+
+    async def _release(self) -> None:
+        cond = self._condition()
+        async with cond:
+            self._in_flight -= 1
+            cond.notify_all()
+
+    async def _back_off(self, error: Exception, attempt: int) -> None:
+        self.retries += 1
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+        if isinstance(error, openai.RateLimitError):
+            # Quota is shared, so everyone waits — not just this request
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            print(f"[LLM] Rate limited — pausing requests for {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds to wait according to the response's retry-after headers, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def estimate_tokens(messages: list[dict[str, str]], max_tokens: int) -> int:
+    """Rough token cost of a request (~4 characters per prompt token plus the completion budget)."""
+    return sum(len(m.get("content") or "") for m in messages) // 4 + max_tokens
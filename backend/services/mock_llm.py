@@ -0,0 +1,207 @@
+"""
+Offline mock LLM provider
+
+Returns schema-valid output for every prompt the backend sends (student replies,
+classroom batches, orchestrator decisions, feedback text and autopsies) without
+any network access, after sleeping for a latency drawn from a configurable
+distribution. Used for local development, load tests and benchmarks.
+
+Enable with LLM_PROVIDER=mock. Tuning:
+  MOCK_LLM_LATENCY        — time to first token:
+                              "fixed:0.4"               always 0.4 s
+                              "lognormal:0.5,0.4"       median 0.5 s, sigma 0.4 (default)
+                              "histogram:latencies.json" sample from recorded seconds
+                              "none"                    no delay
+  MOCK_LLM_TOKEN_LATENCY  — seconds per generated token after the first (default 0.01)
+  MOCK_LLM_SEED           — seed for reproducible runs
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import re
+from typing import Any, AsyncIterator
+
+from personas.personas import PERSONAS, PersonaDefinition
+from services.azure_openai import LLMProvider
+
+_EMOTIONS = ["eager", "confused", "bored", "frustrated", "engaged", "anxious", "distracted"]
+_STUDENT_IDS = re.compile(r'STUDENT id="(\w+)"')
+_ORCHESTRATOR_STATES = re.compile(r"Current student states:\n(\{.*?\n\})", re.DOTALL)
+
+
+class LatencyModel:
+    """Draws simulated upstream latencies (seconds) from a configured distribution."""
+
+    def __init__(self, spec: str, rng: random.Random) -> None:
+        self.spec = spec
+        self._rng = rng
+        kind, _, args = spec.partition(":")
+        self.kind = kind.strip().lower() or "none"
+
+        if self.kind == "fixed":
+            self._value = float(args)
+        elif self.kind == "lognormal":
+            median, sigma = (float(x) for x in args.split(","))
+            self._mu, self._sigma = math.log(median), sigma
+        elif self.kind == "histogram":
+            with open(args) as f:
+                self._samples = [float(x) for x in json.load(f)]
+            if not self._samples:
+                raise ValueError(f"Latency histogram {args} is empty")
+        elif self.kind != "none":
+            raise ValueError(
+                f"Unknown MOCK_LLM_LATENCY '{spec}'. "
+                "Use fixed:<s>, lognormal:<median>,<sigma>, histogram:<path> or none"
+            )
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self._value
+        if self.kind == "lognormal":
+            return self._rng.lognormvariate(self._mu, self._sigma)
+        if self.kind == "histogram":
+            return self._rng.choice(self._samples)
+        return 0.0
+
+
+class MockProvider(LLMProvider):
+    """LLMProvider that fabricates plausible responses locally."""
+
+    def __init__(
+        self,
+        latency: str | None = None,
+        token_latency: float | None = None,
+        seed: int | None = None,
+    ) -> None:
+        if seed is None and os.getenv("MOCK_LLM_SEED"):
+            seed = int(os.getenv("MOCK_LLM_SEED"))
+        self._rng = random.Random(seed)
+        self.latency = LatencyModel(
+            latency if latency is not None else os.getenv("MOCK_LLM_LATENCY", "lognormal:0.5,0.4"),
+            self._rng,
+        )
+        self.token_latency = (
+            token_latency if token_latency is not None
+            else float(os.getenv("MOCK_LLM_TOKEN_LATENCY", "0.01"))
+        )
+        self.calls: dict[str, int] = {}
+
+    async def complete(self, request: dict[str, Any]) -> str:
+        text = self._respond(request)
+        await asyncio.sleep(self.latency.sample() + self._tokens(text) * self.token_latency)
+        return text
+
+    async def stream(self, request: dict[str, Any]) -> AsyncIterator[str]:
+        text = self._respond(request)
+        await asyncio.sleep(self.latency.sample())
+        # ~4 characters per token
+        for i in range(0, len(text), 4):
+            yield text[i:i + 4]
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+
+    # ------------------------------------------------------------------
+    # Response fabrication
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def _respond(self, request: dict[str, Any]) -> str:
+        messages = request.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+
+        if "classroom orchestrator" in system:
+            kind, body = "orchestrator", self._orchestrator(user)
+        elif "diagnostic autopsy" in system:
+            kind, body = "autopsy", self._autopsy(user)
+        elif "teacher coach" in system:
+            kind, body = "feedback", self._feedback()
+        elif _STUDENT_IDS.search(system):
+            kind, body = "classroom_batch", {
+                "responses": {
+                    sid: self._student_reply(PERSONAS.get(name))
+                    for sid, name in self._batch_students(system)
+                }
+            }
+        else:
+            kind, body = "student", self._student_reply(self._persona_for(system))
+
+        self.calls[kind] = self.calls.get(kind, 0) + 1
+        return body if isinstance(body, str) else json.dumps(body)
+
+    @staticmethod
+    def _persona_for(system: str) -> PersonaDefinition | None:
+        return next((p for p in PERSONAS.values() if system.startswith(p.system_prompt)), None)
+
+    @staticmethod
+    def _batch_students(system: str) -> list[tuple[str, str]]:
+        """(student id, persona name) for each STUDENT block of a batch prompt."""
+        pairs = []
+        for match in re.finditer(r'STUDENT id="(\w+)" \((\w+)\)', system):
+            sid, display = match.groups()
+            name = next((p.name for p in PERSONAS.values() if p.display_name == display), sid)
+            pairs.append((sid, name))
+        return pairs
+
+    def _student_reply(self, persona: PersonaDefinition | None) -> dict:
+        if persona is not None and self._rng.random() < (1 - persona.response_probability) / 2:
+            text = ""  # less talkative personas sometimes stay quiet
+        elif persona is not None:
+            text = self._rng.choice(persona.speech_patterns)
+        else:
+            text = self._rng.choice(["Okay.", "I think I get it.", "Wait, what?"])
+        return {
+            "text": text,
+            "emotional_state": self._rng.choice(_EMOTIONS),
+            "comprehension_delta": self._rng.randint(-15, 15),
+            "engagement_delta": self._rng.randint(-15, 15),
+        }
+
+    def _orchestrator(self, user: str) -> dict:
+        match = _ORCHESTRATOR_STATES.search(user)
+        states: dict = json.loads(match.group(1)) if match else {}
+        available = [sid for sid, s in states.items() if s.get("consecutive_turns_speaking", 0) < 2]
+        chosen = self._rng.sample(available, k=min(len(available), self._rng.randint(0, 2)))
+        return {"responders": [{"student_id": sid, "reason": "mock selection"} for sid in chosen]}
+
+    def _autopsy(self, user: str) -> dict:
+        try:
+            turns = json.loads(user).get("turns", [])
+        except json.JSONDecodeError:
+            turns = []
+        sentiments = ["positive", "negative", "neutral"]
+        return {
+            "annotations": [
+                {
+                    "turn": turn.get("turn"),
+                    "teacher_text": turn.get("teacher_text", ""),
+                    "overall_impact": self._rng.choice(["positive", "negative", "neutral", "mixed"]),
+                    "tip": self._rng.choice([None, "Check for understanding before moving on."]),
+                    "student_impacts": [
+                        {
+                            "student": persona.display_name,
+                            "impact": "mock impact description for load testing the autopsy view",
+                            "sentiment": self._rng.choice(sentiments),
+                        }
+                        for persona in PERSONAS.values()
+                    ],
+                }
+                for turn in turns
+            ]
+        }
+
+    @staticmethod
+    def _feedback() -> str:
+        return (
+            "1. **Overall Assessment** — Mock feedback generated offline.\n\n"
+            "2. **Student-by-Student Highlights** — Each student responded at least once.\n\n"
+            "3. **Key Moments to Revisit** — None flagged in mock mode.\n\n"
+            "4. **Top 3 Actionable Suggestions**\n"
+            "- Check for understanding\n- Call on quiet students\n- Vary your pacing\n"
+        )
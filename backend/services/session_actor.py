@@ -0,0 +1,175 @@
+"""
+Per-session actors
+
+Each active session gets an asyncio actor: a mailbox plus one task that
+applies commands (a WebSocket turn, a chaos injection, the end of the
+lesson) one at a time, under the session store's lease. Commands for
+different sessions run concurrently; commands for one session never
+interleave, so turn_count / timeline / students / chaos_active cannot race.
+A command with slow work left once its state changes are done (a turn's
+remaining audio) returns that work for the caller to run after submit(),
+when the session is saved and its lease is free for other workers.
+
+Reads are served from a snapshot — the session's JSON at its last saved
+version — without entering the mailbox. The snapshot is built on demand, at
+most once per version: by the read itself while the actor is idle, or, once
+a session has been read, when the next command starts, so that reads during
+that command see the state before it. Sessions nobody reads are never
+serialized for it. An actor retires after SESSION_ACTOR_IDLE seconds
+(default 60) without commands; the next command starts a new one.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from services.session_store import SessionStore
+
+T = TypeVar("T")
+
+_IDLE = float(os.getenv("SESSION_ACTOR_IDLE", "60"))
+
+
+class _Actor:
+    def __init__(self, registry: "SessionActors", session_id: str) -> None:
+        self.session_id = session_id
+        self._registry = registry
+        self._mailbox: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self.snapshot: tuple[int, str] | None = None  # (version, JSON)
+        self.session: Any = None  # the object commands last ran on
+        self.watched = False  # set by the first read; commands then snapshot before they start
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def post(self, command: Callable[..., Awaitable[Any]], args: tuple) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._mailbox.put_nowait((command, args, future, time.monotonic()))
+        self._registry.max_mailbox = max(self._registry.max_mailbox, self._mailbox.qsize())
+        self.start()
+        return future
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        store = self._registry.store
+        while True:
+            try:
+                command, args, future, posted = await asyncio.wait_for(self._mailbox.get(), timeout=_IDLE)
+            except asyncio.TimeoutError:
+                if self._mailbox.empty():  # nothing slipped in: no await since the timeout
+                    self._registry.retire(self)
+                    return
+                continue
+            if future.cancelled():  # caller gave up (e.g. client went away) before its turn
+                continue
+            self._registry.record_wait(time.monotonic() - posted)
+            self.idle.clear()
+            try:
+                async with store.lease(self.session_id) as session:
+                    self.session = session
+                    if self.watched:
+                        # Reads made while the command runs see the state before it
+                        self.refresh_snapshot()
+                    result = await command(session, *args)
+            except BaseException as e:
+                if not future.done():
+                    future.set_exception(e)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                continue
+            finally:
+                self.idle.set()
+            if not future.done():
+                future.set_result(result)
+
+    def refresh_snapshot(self) -> None:
+        """Serialize the session unless the snapshot already has its current version."""
+        version = self._registry.store.known_version(self.session_id)
+        if self.session is None or version is None:
+            return
+        if self.snapshot is None or self.snapshot[0] != version:
+            self.snapshot = (version, self.session.model_dump_json())
+            self._registry.snapshots += 1
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class SessionActors:
+    """Registry of live actors, one per session id."""
+
+    def __init__(self, store: SessionStore) -> None:
+        self.store = store
+        self._actors: dict[str, _Actor] = {}
+        self.commands = 0
+        self.retired = 0
+        self.max_mailbox = 0
+        self.snapshots = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _actor(self, session_id: str) -> _Actor:
+        actor = self._actors.get(session_id)
+        if actor is None:
+            actor = self._actors[session_id] = _Actor(self, session_id)
+        return actor
+
+    async def submit(self, session_id: str, command: Callable[..., Awaitable[T]], *args: Any) -> T:
+        """Run command(session, *args) in the session's actor (session is None if unknown); returns its result."""
+        self.commands += 1
+        return await self._actor(session_id).post(command, args)
+
+    async def snapshot(self, session_id: str) -> str | None:
+        """The session's JSON as of its last command, if still current (another worker may have saved since)."""
+        actor = self._actors.get(session_id)
+        if actor is None:
+            if await self.store.version(session_id) is not None:
+                # Nothing is running, so the caller can read the store; start a watched
+                # actor (it retires when idle) so the next command snapshots before it runs
+                actor = self._actor(session_id)
+                actor.watched = True
+                actor.start()
+            return None
+        actor.watched = True
+        while True:
+            if actor.idle.is_set():
+                actor.refresh_snapshot()
+                break
+            if actor.snapshot is not None and actor.snapshot[0] == self.store.known_version(session_id):
+                break
+            # First read of this session and a command is running: its result is the next snapshot
+            await actor.idle.wait()
+        if actor.snapshot is None:
+            return None
+        version, data = actor.snapshot
+        return data if await self.store.version(session_id) == version else None
+
+    def retire(self, actor: _Actor) -> None:
+        if self._actors.get(actor.session_id) is actor:
+            del self._actors[actor.session_id]
+            self.retired += 1
+
+    def record_wait(self, waited: float) -> None:
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def close(self) -> None:
+        for actor in self._actors.values():
+            actor.stop()
+        self._actors.clear()
+
+    def stats(self) -> dict:
+        return {
+            "actors": len(self._actors),
+            "commands": self.commands,
+            "retired": self.retired,
+            "max_mailbox": self.max_mailbox,
+            "snapshots": self.snapshots,
+            "avg_wait_ms": round(self._wait_total / self.commands * 1000, 2) if self.commands else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
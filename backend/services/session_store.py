@@ -0,0 +1,449 @@
+"""
+Bounded session store
+
+Replaces the never-pruned global sessions dict. Sessions are evicted:
+
+  - idle:   not read or saved for SESSION_IDLE_TTL seconds (default 7200)
+  - ended:  SESSION_ENDED_TTL seconds (default 300) after the save that
+            follows /end, i.e. once feedback and autopsy have been collected
+  - memory: least-recently-used first (ended sessions before live ones) when
+            the size of resident sessions exceeds SESSION_MEMORY_BYTES
+            (default 256 MB). A model with an approx_bytes() method reports
+            its own running size; otherwise its JSON length is used.
+
+Backends (SESSION_STORE):
+
+  - memory: resident sessions are the only copy and are never serialized;
+            memory eviction deletes. Single worker only.
+  - sqlite: every save is written to SESSION_DB (default sessions.db, WAL
+            mode) as JSON; memory eviction only drops the resident copy,
+            which is reloaded on the next get(). Shared by every worker on
+            the host, so uvicorn can run with --workers N.
+
+Sessions are mutated in place by the request handlers inside
+`async with store.lease(session_id) as session:`, which saves on exit. A
+lease serializes mutations of one session across coroutines (asyncio lock)
+and across workers (an owner + expiry row lease, renewed while held;
+waiting longer than SESSION_LEASE_WAIT raises SessionBusy). Every row has a
+version: a lease starts by reloading the session if another worker saved a
+newer one, and a save whose version moved underneath it (a lease that
+expired mid-operation) raises SessionConflict instead of overwriting.
+
+An object still held by a handler (e.g. an open WebSocket) is handed back
+by get() even after it was evicted from the resident set, and refreshed in
+place, so no two copies of a session diverge within a worker.
+"""
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Generic, TypeVar
+
+from pydantic import BaseModel
+
+S = TypeVar("S", bound=BaseModel)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionBusy(RuntimeError):
+    """Another worker held the session's lease for longer than the wait budget."""
+
+
+class SessionConflict(RuntimeError):
+    """The session was saved by someone else since this copy was loaded."""
+
+
+class SessionStore(Generic[S]):
+    """In-memory backend; also the resident layer every backend shares."""
+
+    backend = "memory"
+    persistent = False  # whether sessions live outside this process
+
+    def __init__(
+        self, model: type[S], idle_ttl: float, ended_ttl: float, max_bytes: int,
+        lease_ttl: float = 30.0, lease_wait: float = 10.0,
+    ) -> None:
+        self._model = model
+        self.idle_ttl = idle_ttl
+        self.ended_ttl = ended_ttl
+        self.max_bytes = max_bytes
+        self.lease_ttl = lease_ttl
+        self.lease_wait = lease_wait
+        # session_id -> (session, approximate bytes); least recently used first
+        self._resident: OrderedDict[str, tuple[S, int]] = OrderedDict()
+        self._live: weakref.WeakValueDictionary[str, S] = weakref.WeakValueDictionary()
+        self._versions: dict[str, int] = {}
+        self._touched: dict[str, float] = {}
+        self._ended_at: dict[str, float] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self.bytes = 0
+        self.loads = 0
+        self.conflicts = 0
+        self.lease_waits = 0
+        self.evictions = {"idle": 0, "ended": 0, "memory": 0}
+
+    # --- backend hooks (no-ops in memory) ---
+
+    async def _load(self, session_id: str) -> tuple[str, int] | None:
+        """Serialized session and its version."""
+        return None
+
+    async def _version(self, session_id: str) -> int | None:
+        return self._versions.get(session_id)
+
+    async def _write(self, session_id: str, data: str | None, active: bool, expected: int | None) -> int:
+        """Persist if the stored version is still `expected` (None: new session); returns the new version."""
+        return (expected or 0) + 1
+
+    async def _remove(self, session_ids: list[str]) -> None:
+        pass
+
+    async def _expire(self, idle_before: float, ended_before: float, keep: set[str]) -> list[str]:
+        """Remove persisted sessions (other than `keep`, which are still tracked); returns their ids."""
+        return []
+
+    async def _try_acquire(self, session_id: str) -> bool:
+        return True
+
+    async def _renew(self, session_id: str) -> None:
+        pass
+
+    async def _release(self, session_id: str) -> None:
+        pass
+
+    async def count(self) -> int:
+        return len(self._resident)
+
+    def close(self) -> None:
+        pass
+
+    # --- public API ---
+
+    async def version(self, session_id: str) -> int | None:
+        """Version of the stored session (None if unknown)."""
+        return await self._version(session_id)
+
+    def known_version(self, session_id: str) -> int | None:
+        """Version of this worker's copy, as last loaded or saved."""
+        return self._versions.get(session_id)
+
+    async def get(self, session_id: str) -> S | None:
+        session = self._live.get(session_id)
+        if session is not None and self.persistent:
+            version = await self._version(session_id)
+            if version is None:  # expired or deleted by another worker
+                self._drop(session_id)
+                self._forget(session_id)
+                return None
+            if version != self._versions.get(session_id):
+                return await self._reload(session_id, session)
+        if session is None:
+            return await self._reload(session_id, None)
+        if session_id in self._resident:
+            self._resident.move_to_end(session_id)
+        else:
+            self._hold(session, self._size(session))
+            await self._trim()
+        self._touched[session_id] = time.monotonic()
+        return session
+
+    async def save(self, session: S) -> None:
+        # Only a backend that stores sessions outside the process needs them serialized
+        data = session.model_dump_json() if self.persistent else None
+        session_id = session.session_id
+        try:
+            self._versions[session_id] = await self._write(
+                session_id, data, session.active, self._versions.get(session_id)
+            )
+        except SessionConflict:
+            self.conflicts += 1
+            raise
+        if not session.active:
+            self._ended_at.setdefault(session_id, time.monotonic())
+        self._touched[session_id] = time.monotonic()
+        self._hold(session, len(data) if data is not None else self._size(session))
+        await self._trim()
+
+    @asynccontextmanager
+    async def lease(self, session_id: str) -> AsyncIterator[S | None]:
+        """Exclusive, up-to-date access to a session (None if unknown); saved when the block exits normally."""
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            await self._acquire(session_id)
+            renewer = asyncio.create_task(self._keep_lease(session_id)) if self.persistent else None
+            try:
+                session = await self.get(session_id)
+                yield session
+                if session is not None:
+                    await self.save(session)
+            finally:
+                if renewer is not None:
+                    renewer.cancel()
+                await self._release(session_id)
+
+    async def delete(self, session_id: str) -> None:
+        self._drop(session_id)
+        self._forget(session_id)
+        await self._remove([session_id])
+
+    async def sweep(self) -> None:
+        """Evict idle and ended sessions."""
+        now = time.monotonic()
+        evicted = set()
+        for session_id, touched in list(self._touched.items()):
+            ended = self._ended_at.get(session_id)
+            if ended is not None and now - ended > self.ended_ttl:
+                self.evictions["ended"] += 1
+            elif now - touched > self.idle_ttl:
+                self.evictions["idle"] += 1
+            else:
+                continue
+            self._drop(session_id)
+            self._forget(session_id)
+            evicted.add(session_id)
+        # Persisted rows go by their own (shared, wall-clock) timestamps, since
+        # another worker may still be using a session this one has gone idle on.
+        # Rows of sessions evicted above were counted with them.
+        expired = await self._expire(
+            time.time() - self.idle_ttl, time.time() - self.ended_ttl, set(self._touched)
+        )
+        self.evictions["idle"] += len(set(expired) - evicted)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "worker": WORKER_ID,
+            "resident": len(self._resident),
+            "resident_bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl,
+            "ended_ttl_seconds": self.ended_ttl,
+            "loads": self.loads,
+            "conflicts": self.conflicts,
+            "lease_waits": self.lease_waits,
+            "evictions": dict(self.evictions),
+        }
+
+    # --- leases ---
+
+    async def _acquire(self, session_id: str) -> None:
+        deadline = time.monotonic() + self.lease_wait
+        if await self._try_acquire(session_id):
+            return
+        self.lease_waits += 1
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            if await self._try_acquire(session_id):
+                return
+        raise SessionBusy(f"Session {session_id} is busy on another worker")
+
+    async def _keep_lease(self, session_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self._renew(session_id)
+            except Exception as e:
+                print(f"[sessions] Could not renew lease on {session_id}: {e}")
+
+    # --- resident layer ---
+
+    async def _reload(self, session_id: str, live: S | None) -> S | None:
+        loaded = await self._load(session_id)
+        if loaded is None:
+            return None
+        data, version = loaded
+        session = self._model.model_validate_json(data)
+        if live is not None:
+            # Refresh the object handlers already hold rather than handing out a second copy
+            for name in type(live).model_fields:
+                setattr(live, name, getattr(session, name))
+            session = live
+        self.loads += 1
+        self._versions[session_id] = version
+        self._touched[session_id] = time.monotonic()
+        self._hold(session, len(data))
+        await self._trim()
+        return session
+
+    @staticmethod
+    def _size(session: S) -> int:
+        approx_bytes = getattr(session, "approx_bytes", None)
+        return approx_bytes() if approx_bytes is not None else len(session.model_dump_json())
+
+    def _hold(self, session: S, size: int) -> None:
+        session_id = session.session_id
+        self._drop(session_id)
+        self._resident[session_id] = (session, size)
+        self._live[session_id] = session
+        self.bytes += size
+
+    def _drop(self, session_id: str) -> None:
+        entry = self._resident.pop(session_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def _forget(self, session_id: str) -> None:
+        self._live.pop(session_id, None)
+        self._versions.pop(session_id, None)
+        self._touched.pop(session_id, None)
+        self._ended_at.pop(session_id, None)
+        lock = self._locks.get(session_id)
+        if lock is not None and not lock.locked():
+            del self._locks[session_id]
+
+    async def _trim(self) -> None:
+        if self.bytes <= self.max_bytes:
+            return
+        # Ended sessions go first, then live ones least-recently used
+        order = sorted(self._resident, key=lambda sid: sid not in self._ended_at)
+        dropped = []
+        for session_id in order:
+            if self.bytes <= self.max_bytes or len(self._resident) == 1:
+                break
+            self._drop(session_id)
+            self.evictions["memory"] += 1
+            dropped.append(session_id)
+        if not self.persistent:
+            # Gone for good — unless a handler still holds the object, which get() then re-adopts
+            for session_id in dropped:
+                self._touched.pop(session_id, None)
+                self._ended_at.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore[S]):
+    """Write-through SQLite backend shared by all workers; the resident layer is a bounded cache over it."""
+
+    backend = "sqlite"
+    persistent = True
+
+    _COLUMNS = {"version": "INTEGER NOT NULL DEFAULT 1", "owner": "TEXT", "lease_until": "REAL"}
+
+    def __init__(self, model: type[S], path: str, idle_ttl: float, ended_ttl: float, max_bytes: int, **lease) -> None:
+        super().__init__(model, idle_ttl, ended_ttl, max_bytes, **lease)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        # WAL: readers never block the writer, so workers can share the file
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY, data TEXT NOT NULL, active INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL, ended_at REAL)"
+        )
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+        for column, definition in self._COLUMNS.items():
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE sessions ADD COLUMN {column} {definition}")
+
+    def _execute(self, sql: str, params: tuple | list = ()) -> tuple[list[tuple], int]:
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            return cursor.fetchall(), cursor.rowcount
+
+    async def _run(self, sql: str, params: tuple | list = ()) -> tuple[list[tuple], int]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def _load(self, session_id: str) -> tuple[str, int] | None:
+        rows, _ = await self._run("SELECT data, version FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0] if rows else None
+
+    async def _version(self, session_id: str) -> int | None:
+        rows, _ = await self._run("SELECT version FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else None
+
+    async def _write(self, session_id: str, data: str, active: bool, expected: int | None) -> int:
+        now = time.time()
+        ended_at = None if active else now
+        if expected is None:
+            try:
+                await self._run(
+                    "INSERT INTO sessions (session_id, data, active, updated_at, ended_at, version)"
+                    " VALUES (?, ?, ?, ?, ?, 1)",
+                    (session_id, data, int(active), now, ended_at),
+                )
+            except sqlite3.IntegrityError:
+                raise SessionConflict(f"Session {session_id} already exists")
+            return 1
+        _, updated = await self._run(
+            "UPDATE sessions SET data = ?, active = ?, updated_at = ?, ended_at = COALESCE(ended_at, ?),"
+            " version = version + 1 WHERE session_id = ? AND version = ?",
+            (data, int(active), now, ended_at, session_id, expected),
+        )
+        if updated == 0:
+            raise SessionConflict(f"Session {session_id} was modified by another worker")
+        return expected + 1
+
+    async def _remove(self, session_ids: list[str]) -> None:
+        marks = ",".join("?" * len(session_ids))
+        await self._run(f"DELETE FROM sessions WHERE session_id IN ({marks})", session_ids)
+
+    async def _expire(self, idle_before: float, ended_before: float, keep: set[str]) -> list[str]:
+        rows, _ = await self._run(
+            "SELECT session_id FROM sessions WHERE (updated_at < ? OR ended_at < ?)"
+            " AND (lease_until IS NULL OR lease_until < ?)",
+            (idle_before, ended_before, time.time()),
+        )
+        expired = [row[0] for row in rows if row[0] not in keep]
+        for start in range(0, len(expired), 500):
+            await self._remove(expired[start:start + 500])
+        return expired
+
+    async def _try_acquire(self, session_id: str) -> bool:
+        now = time.time()
+        _, updated = await self._run(
+            "UPDATE sessions SET owner = ?, lease_until = ? WHERE session_id = ?"
+            " AND (owner IS NULL OR owner = ? OR lease_until < ?)",
+            (WORKER_ID, now + self.lease_ttl, session_id, WORKER_ID, now),
+        )
+        if updated:
+            return True
+        # Unknown sessions have no lease to wait for; get() reports them as missing
+        rows, _ = await self._run("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,))
+        return not rows
+
+    async def _renew(self, session_id: str) -> None:
+        await self._run(
+            "UPDATE sessions SET lease_until = ? WHERE session_id = ? AND owner = ?",
+            (time.time() + self.lease_ttl, session_id, WORKER_ID),
+        )
+
+    async def _release(self, session_id: str) -> None:
+        await self._run(
+            "UPDATE sessions SET owner = NULL, lease_until = NULL WHERE session_id = ? AND owner = ?",
+            (session_id, WORKER_ID),
+        )
+
+    async def count(self) -> int:
+        rows, _ = await self._run("SELECT COUNT(*) FROM sessions")
+        return rows[0][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "path": self.path}
+
+
+def session_store_from_env(model: type[S]) -> SessionStore[S]:
+    idle_ttl = float(os.getenv("SESSION_IDLE_TTL", "7200"))
+    ended_ttl = float(os.getenv("SESSION_ENDED_TTL", "300"))
+    max_bytes = int(os.getenv("SESSION_MEMORY_BYTES", str(256 * 1024 * 1024)))
+    lease = {
+        "lease_ttl": float(os.getenv("SESSION_LEASE_TTL", "30")),
+        "lease_wait": float(os.getenv("SESSION_LEASE_WAIT", "10")),
+    }
+    backend = os.getenv("SESSION_STORE", "memory").lower()
+    if backend == "sqlite":
+        return SQLiteSessionStore(model, os.getenv("SESSION_DB", "sessions.db"), idle_ttl, ended_ttl, max_bytes, **lease)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE '{backend}' (expected memory or sqlite)")
+    return SessionStore(model, idle_ttl, ended_ttl, max_bytes, **lease)
@@ -0,0 +1,80 @@
+"""
+Streamed teacher audio over the session WebSocket
+
+The client sends {"type": "audio_start", "format": "pcm16" | "webm"}, then binary
+chunks, then {"type": "audio_end"}. UtteranceStream buffers one utterance and
+decides when to send partial transcripts and when the utterance is over:
+
+  - pcm16 (16 kHz, 16-bit little-endian mono): an energy VAD over 20 ms frames
+    ends the utterance after STT_END_SILENCE_MS (default 700) of silence that
+    follows speech, so the turn can start without waiting for audio_end.
+  - webm (MediaRecorder chunks): compressed, so no VAD — the utterance ends
+    at audio_end. The buffer is always a decodable prefix of the stream.
+
+Partial transcripts re-decode the buffer every STT_PARTIAL_INTERVAL seconds
+(default 1.0) while audio keeps arriving.
+"""
+
+import os
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+AUDIO_FORMATS = ("pcm16", "webm")
+
+_FRAME_BYTES = SAMPLE_RATE * 20 // 1000 * 2  # 20 ms of 16-bit samples
+_VAD_THRESHOLD = float(os.getenv("STT_VAD_THRESHOLD", "500"))  # RMS of int16 samples
+_END_SILENCE = float(os.getenv("STT_END_SILENCE_MS", "700")) / 1000
+_PARTIAL_INTERVAL = float(os.getenv("STT_PARTIAL_INTERVAL", "1.0"))
+
+
+class UtteranceStream:
+    def __init__(self, audio_format: str) -> None:
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format '{audio_format}' (expected one of {', '.join(AUDIO_FORMATS)})")
+        self.format = audio_format
+        self._chunks: list[bytes] = []
+        self._pending = b""  # pcm16 bytes not yet analysed (less than one frame)
+        self.speech_started = False
+        self._silence = 0.0
+        self._last_partial = time.monotonic()
+
+    @property
+    def pcm16(self) -> bool:
+        return self.format == "pcm16"
+
+    @property
+    def audio(self) -> bytes:
+        return b"".join(self._chunks)
+
+    def has_speech(self) -> bool:
+        # Without a VAD, any audio might be speech
+        return self.speech_started if self.pcm16 else bool(self._chunks)
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk; True once the VAD has seen the end of the utterance."""
+        self._chunks.append(chunk)
+        if not self.pcm16:
+            return False
+        data = self._pending + chunk
+        usable = len(data) - len(data) % _FRAME_BYTES
+        self._pending = data[usable:]
+        if usable == 0:
+            return False
+        frames = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32).reshape(-1, _FRAME_BYTES // 2)
+        voiced = np.sqrt(np.mean(frames ** 2, axis=1)) >= _VAD_THRESHOLD
+        for is_voiced in voiced:
+            if is_voiced:
+                self.speech_started = True
+                self._silence = 0.0
+            elif self.speech_started:
+                self._silence += 0.02
+        return self.speech_started and self._silence >= _END_SILENCE
+
+    def partial_due(self) -> bool:
+        """True (and resets the timer) when it's time for another partial transcript."""
+        if not self.has_speech() or time.monotonic() - self._last_partial < _PARTIAL_INTERVAL:
+            return False
+        self._last_partial = time.monotonic()
+        return True
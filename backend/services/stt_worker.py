@@ -0,0 +1,137 @@
+"""
+faster-whisper worker process
+
+Runs inside the STT process pool (see services/azure_speech.py). Each worker
+loads the model once in its initializer and transcribes audio straight from
+memory. Kept free of app imports so spawned workers start quickly.
+speech_segments() needs no whisper model: the app runs it on the VAD thread
+pool, not in these workers.
+
+transcribe_batch() decodes several requests' audio in one encoder/decoder pass:
+each clip is cut into 30 s windows, their mel features are stacked and run
+through BatchedInferencePipeline.generate_segment_batched. Single requests and
+batches share one set of decode options (_DECODE: beam search of 5,
+temperature 0 with no fallback, no timestamps, no conditioning on previous
+text), so a clip transcribes the same whether or not it was batched.
+"""
+
+import io
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+_WINDOW = 30 * SAMPLE_RATE  # whisper's fixed input length
+
+# Shared by WhisperModel.transcribe() and the batched TranscriptionOptions
+_DECODE = dict(
+    beam_size=5, best_of=5, patience=1, length_penalty=1, repetition_penalty=1,
+    no_repeat_ngram_size=0, log_prob_threshold=-1.0, no_speech_threshold=0.6,
+    compression_ratio_threshold=2.4, condition_on_previous_text=False,
+    suppress_blank=True, without_timestamps=True,
+)
+_TEMPERATURE = 0.0
+
+_model = None
+_pipeline = None
+_tokenizer = None
+_options = None
+
+
+def init_worker(model_size: str, compute_type: str, cpu_threads: int) -> None:
+    global _model, _pipeline, _tokenizer, _options
+    try:
+        from faster_whisper import BatchedInferencePipeline, WhisperModel
+        from faster_whisper.tokenizer import Tokenizer
+        from faster_whisper.transcribe import TranscriptionOptions, get_suppressed_tokens
+
+        _model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        _pipeline = BatchedInferencePipeline(_model)
+        _tokenizer = Tokenizer(_model.hf_tokenizer, _model.model.is_multilingual, task="transcribe", language="en")
+        _options = TranscriptionOptions(
+            **_DECODE, temperatures=[_TEMPERATURE],
+            prompt_reset_on_temperature=0.5, initial_prompt=None, prefix=None,
+            suppress_tokens=get_suppressed_tokens(_tokenizer, [-1]),
+            max_initial_timestamp=0.0, word_timestamps=False,
+            prepend_punctuations="\"'“¿([{-", append_punctuations="\"'.。,，!！?？:：”)]}、",
+            multilingual=False, max_new_tokens=None, clip_timestamps=[],
+            hallucination_silence_threshold=None, hotwords=None,
+        )
+    except Exception as e:
+        # Leave the pool usable; transcribe() returns "" like the old in-process fallback did
+        print(f"[STT] Could not load faster-whisper in worker: {e}")
+
+
+def transcribe(audio_data: bytes) -> str:
+    """Transcribe WebM/Opus (or any container PyAV can read) audio bytes."""
+    if _model is None:
+        return ""
+    segments, _ = _model.transcribe(io.BytesIO(audio_data), language="en", temperature=_TEMPERATURE, **_DECODE)
+    return " ".join(s.text for s in segments).strip()
+
+
+def _pcm16_samples(audio_data: bytes) -> np.ndarray:
+    return np.frombuffer(audio_data[: len(audio_data) // 2 * 2], dtype="<i2").astype(np.float32) / 32768.0
+
+
+def transcribe_pcm16(audio_data: bytes) -> str:
+    """Transcribe raw 16 kHz, 16-bit little-endian mono PCM."""
+    if _model is None or len(audio_data) < 2:
+        return ""
+    segments, _ = _model.transcribe(_pcm16_samples(audio_data), language="en", temperature=_TEMPERATURE, **_DECODE)
+    return " ".join(s.text for s in segments).strip()
+
+
+def speech_segments(audio_data: bytes, pcm16: bool, max_segment_s: float) -> tuple[list[bytes], float]:
+    """
+    Silero-VAD the clip: returns its speech as 16 kHz pcm16 segments of at most
+    `max_segment_s` (silence trimmed, nearby speech merged) plus the clip's
+    original duration in seconds. No segments means no speech at all.
+    """
+    from faster_whisper.audio import decode_audio
+    from faster_whisper.vad import VadOptions, collect_chunks, get_speech_timestamps
+
+    samples = _pcm16_samples(audio_data) if pcm16 else decode_audio(io.BytesIO(audio_data), sampling_rate=SAMPLE_RATE)
+    duration = len(samples) / SAMPLE_RATE
+    options = VadOptions(max_speech_duration_s=max_segment_s, min_silence_duration_ms=500, speech_pad_ms=200)
+    timestamps = get_speech_timestamps(samples, options, sampling_rate=SAMPLE_RATE)
+    if not timestamps:
+        return [], duration
+    chunks, _ = collect_chunks(samples, timestamps, sampling_rate=SAMPLE_RATE, max_duration=max_segment_s)
+    segments = [
+        (np.clip(chunk, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+        for chunk in chunks if len(chunk)
+    ]
+    return segments, duration
+
+
+def transcribe_batch(items: list[tuple[bytes, bool]]) -> list[str]:
+    """Transcribe several (audio bytes, is_pcm16) requests together; one text per request."""
+    if _model is None:
+        return [""] * len(items)
+    if len(items) == 1:
+        audio_data, pcm16 = items[0]
+        return [transcribe_pcm16(audio_data) if pcm16 else transcribe(audio_data)]
+
+    from faster_whisper.audio import decode_audio, pad_or_trim
+
+    windows: list[np.ndarray] = []
+    owners: list[int] = []
+    for index, (audio_data, pcm16) in enumerate(items):
+        try:
+            samples = _pcm16_samples(audio_data) if pcm16 else decode_audio(io.BytesIO(audio_data), sampling_rate=SAMPLE_RATE)
+        except Exception as e:
+            print(f"[STT] Could not decode audio in batch: {e}")
+            continue
+        for start in range(0, len(samples), _WINDOW):
+            windows.append(samples[start:start + _WINDOW])
+            owners.append(index)
+
+    texts: list[list[str]] = [[] for _ in items]
+    if windows:
+        features = np.stack([pad_or_trim(_model.feature_extractor(w)[..., :-1]) for w in windows])
+        _, outputs = _pipeline.generate_segment_batched(features, _tokenizer, _options)
+        for owner, output in zip(owners, outputs):
+            if output["no_speech_prob"] > _options.no_speech_threshold and output["avg_logprob"] < _options.log_prob_threshold:
+                continue  # silence, same rule as whisper's sequential decoding
+            texts[owner].append(_tokenizer.decode(output["tokens"]).strip())
+    return [" ".join(t).strip() for t in texts]
@@ -0,0 +1,170 @@
+"""
+Content-addressed TTS audio cache
+
+Synthesized audio is keyed by sha256(voice | output format | normalized text),
+so short stock reactions ("Huh?", chaos reactions, demo scripts) are only sent
+to Azure once. Two tiers:
+
+  - memory: LRU capped by total audio bytes (TTS_CACHE_MEMORY_BYTES, default
+    32 MB; 0 disables the cache)
+  - disk:   optional directory of <hash>.mp3 files (TTS_CACHE_DIR), trimmed
+    oldest-first to TTS_CACHE_DISK_BYTES (default 512 MB). Disk hits are
+    promoted back into memory. Survives restarts. Workers on one host may
+    point at the same directory: a lookup missing from a worker's index
+    checks for the file, so entries written by other workers are hits too,
+    but each worker trims against the bytes it knows about.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import threading
+
+from services.lru_cache import LRUCache
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def cache_key(voice_id: str, output_format: str, text: str) -> str:
+    # Only whitespace is normalized — case and punctuation change the prosody
+    normalized = _WHITESPACE.sub(" ", text).strip()
+    return hashlib.sha256(f"{voice_id}|{output_format}|{normalized}".encode("utf-8")).hexdigest()
+
+
+class _DiskStore:
+    """
+    Directory of audio files evicted oldest-modified first (hits refresh mtime).
+    Called from asyncio.to_thread workers: the index is guarded by a lock, file
+    reads and writes happen outside it.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._sizes: dict[str, int] = {}
+        for name in os.listdir(directory):
+            if name.endswith(".mp3"):
+                self._sizes[name[:-4]] = os.path.getsize(os.path.join(directory, name))
+        self.bytes = sum(self._sizes.values())
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def read(self, key: str) -> bytes | None:
+        # Tried even when not indexed: another worker sharing the directory may have written it
+        try:
+            with open(self._path(key), "rb") as f:
+                audio = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            with self._lock:
+                self.bytes -= self._sizes.pop(key, 0)
+            return None
+        with self._lock:
+            if key not in self._sizes:
+                self._sizes[key] = len(audio)
+                self.bytes += len(audio)
+        return audio
+
+    def write(self, key: str, audio: bytes) -> None:
+        with self._lock:
+            if key in self._sizes or len(audio) > self.max_bytes:
+                return
+        tmp = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, self._path(key))  # readers never see a partial file
+        with self._lock:
+            if key in self._sizes:  # written concurrently by another thread
+                return
+            self._sizes[key] = len(audio)
+            self.bytes += len(audio)
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Trim to 90% of the budget; called with the lock held."""
+        def mtime(key: str) -> float:
+            try:
+                return os.path.getmtime(self._path(key))
+            except OSError:
+                return 0.0
+
+        for key in sorted(self._sizes, key=mtime):
+            if self.bytes <= self.max_bytes * 0.9:  # trim with headroom to avoid evicting on every write
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+
+class TTSCache:
+    def __init__(self, memory_bytes: int, disk_dir: str | None = None, disk_bytes: int = 0) -> None:
+        self.enabled = memory_bytes > 0
+        self._memory = LRUCache(max_entries=1_000_000, max_weight=memory_bytes, weigher=len)
+        self._disk = _DiskStore(disk_dir, disk_bytes) if disk_dir and self.enabled else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_env(cls) -> "TTSCache":
+        return cls(
+            memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024))),
+            disk_dir=os.getenv("TTS_CACHE_DIR") or None,
+            disk_bytes=int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024))),
+        )
+
+    async def get(self, key: str, *fallbacks: str) -> bytes | None:
+        """Audio for the first of the keys that is cached; one lookup in the stats."""
+        if not self.enabled:
+            return None
+        for key in (key, *fallbacks):
+            audio = self._memory.get(key)
+            if audio is not None:
+                self.memory_hits += 1
+            elif self._disk is not None:
+                audio = await asyncio.to_thread(self._disk.read, key)
+                if audio is not None:
+                    self.disk_hits += 1
+                    self._memory.set(key, audio)
+            if audio is not None:
+                self.bytes_saved += len(audio)
+                return audio
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, audio: bytes) -> None:
+        if not self.enabled or not audio:
+            return
+        self._memory.set(key, audio)
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.write, key, audio)
+            except OSError as e:
+                print(f"[TTS] Could not write audio cache entry: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory.weight,
+            "memory_max_bytes": self._memory.max_weight,
+            "disk_bytes": self._disk.bytes if self._disk else None,
+            "disk_max_bytes": self._disk.max_bytes if self._disk else None,
+            "disk_evictions": self._disk.evictions if self._disk else None,
+        }
@@ -0,0 +1,128 @@
+"""
+TTS worker resources
+
+  - MeteredExecutor: a dedicated, bounded thread pool for blocking speech SDK
+    calls, so TTS throughput does not compete with STT (whisper's process pool,
+    the VAD's threads) and queue depth / wait time are observable.
+  - SynthesizerPool: idle synthesizers kept per voice id and reused across
+    calls instead of building a new SpeechConfig + SpeechSynthesizer each time.
+
+Both are SDK-agnostic; services/azure_speech.py supplies the factory.
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class MeteredExecutor:
+    """ThreadPoolExecutor wrapper that tracks queued/active work and queueing delay."""
+
+    def __init__(self, workers: int, name: str) -> None:
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        submitted = time.monotonic()
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+        def _call() -> T:
+            waited = time.monotonic() - submitted
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, _call)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+            }
+
+
+class SynthesizerPool:
+    """
+    Reusable synthesizers keyed by voice id (thread-safe; used from executor threads).
+
+    acquire() hands out an idle synthesizer or builds one; release() returns it
+    unless `per_voice` are already idle. A failed synthesis leaves the
+    synthesizer usable and it is released as usual; one in an unknown state
+    (an abandoned stream) should simply not be released.
+    """
+
+    def __init__(self, factory: Callable[[str], Any], per_voice: int) -> None:
+        self._factory = factory
+        self.per_voice = per_voice
+        self._idle: dict[str, queue.SimpleQueue] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _queue(self, voice_id: str) -> queue.SimpleQueue:
+        with self._lock:
+            return self._idle.setdefault(voice_id, queue.SimpleQueue())
+
+    def acquire(self, voice_id: str) -> Any:
+        try:
+            synthesizer = self._queue(voice_id).get_nowait()
+            with self._lock:
+                self.reused += 1
+            return synthesizer
+        except queue.Empty:
+            with self._lock:
+                self.created += 1
+            return self._factory(voice_id)
+
+    def release(self, voice_id: str, synthesizer: Any) -> None:
+        idle = self._queue(voice_id)
+        if idle.qsize() < self.per_voice:
+            idle.put(synthesizer)
+
+    def warm(self, voice_id: str, prepare: Callable[[Any], None] | None = None) -> None:
+        """Fill the voice's idle pool, optionally preparing each synthesizer (e.g. opening its connection)."""
+        idle = self._queue(voice_id)
+        while idle.qsize() < self.per_voice:
+            synthesizer = self._factory(voice_id)
+            with self._lock:
+                self.created += 1
+            if prepare is not None:
+                prepare(synthesizer)
+            idle.put(synthesizer)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = {voice: q.qsize() for voice, q in self._idle.items()}
+        return {"per_voice": self.per_voice, "created": self.created, "reused": self.reused, "idle": idle}
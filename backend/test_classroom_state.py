@@ -0,0 +1,137 @@
+"""
+ClassroomState: the array roster against the per-student rules it replaced.
+Run from the backend directory: python -m pytest test_classroom_state.py
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from agents.orchestrator import generate_coaching_hint, update_student_states
+from models import EMOTION_CODES, ClassroomState, EmotionalState, SessionConfig, SessionState, StudentState
+
+_ENGAGEMENT_DRIFT = {"bored": -0.06, "distracted": -0.06, "anxious": -0.04, "frustrated": -0.04,
+                     "confused": -0.02, "engaged": 0.02, "eager": -0.02}
+_COMPREHENSION_DRIFT = {"confused": -0.04, "bored": -0.02, "distracted": -0.02}
+
+
+def _clamp(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+def _scalar_update(students: dict[str, StudentState], responses: list[dict]) -> None:
+    """The per-student loop update_student_states used before the arrays."""
+    responding = set()
+    for response in responses:
+        student = students[response["student_id"]]
+        responding.add(student.id)
+        comp_delta = response["comprehension_delta"] / 60.0
+        eng_delta = response["engagement_delta"] / 60.0
+        emotion = response["emotional_state"]
+        if emotion in ("bored", "distracted") and eng_delta > 0:
+            eng_delta = -abs(eng_delta)
+        elif emotion in ("eager", "engaged") and eng_delta < 0:
+            eng_delta = abs(eng_delta)
+        student.comprehension = _clamp(student.comprehension + comp_delta)
+        student.engagement = _clamp(student.engagement + eng_delta)
+        student.emotional_state = EmotionalState(emotion)
+        student.consecutive_turns_speaking += 1
+
+    for student in students.values():
+        if student.id in responding:
+            continue
+        emotion = student.emotional_state.value
+        student.engagement = _clamp(student.engagement + _ENGAGEMENT_DRIFT.get(emotion, 0.0))
+        student.comprehension = _clamp(student.comprehension + _COMPREHENSION_DRIFT.get(emotion, 0.0))
+        student.consecutive_turns_speaking = 0
+        eng, comp = student.engagement, student.comprehension
+        if eng >= 0.65 and comp >= 0.55:
+            student.emotional_state = EmotionalState.engaged
+        elif comp < 0.35:
+            student.emotional_state = EmotionalState.confused
+        elif eng < 0.30:
+            student.emotional_state = EmotionalState.bored
+        elif eng < 0.45:
+            student.emotional_state = EmotionalState.distracted
+
+
+def _roster(rng: random.Random, size: int = 5) -> dict[str, StudentState]:
+    return {
+        f"s{i}": StudentState(
+            id=f"s{i}", name=f"Student{i}", persona="p", voice_id="v",
+            engagement=rng.random(), comprehension=rng.random(),
+            emotional_state=rng.choice(list(EmotionalState)),
+        )
+        for i in range(size)
+    }
+
+
+def _session(students: dict[str, StudentState]) -> SessionState:
+    return SessionState(
+        session_id="s",
+        config=SessionConfig(subject="Math", topic="Fractions", grade_level="Grade 7"),
+        students={sid: s.model_copy() for sid, s in students.items()},
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_update_matches_scalar_rules(seed):
+    rng = random.Random(seed)
+    reference = _roster(rng, size=rng.randint(1, 12))
+    session = _session(reference)
+    emotions = [e.value for e in EmotionalState]
+    for turn in range(1, 11):
+        responders = rng.sample(list(reference), rng.randint(0, min(3, len(reference))))
+        responses = [
+            {
+                "student_id": sid, "text": "reply", "emotional_state": rng.choice(emotions),
+                "comprehension_delta": rng.randint(-20, 20), "engagement_delta": rng.randint(-20, 20),
+            }
+            for sid in responders
+        ]
+        session.turn_count = turn
+        update_student_states(session, responses)
+        _scalar_update(reference, responses)
+        for sid, expected in reference.items():
+            actual = session.students[sid]
+            assert actual.engagement == pytest.approx(expected.engagement, abs=1e-12)
+            assert actual.comprehension == pytest.approx(expected.comprehension, abs=1e-12)
+            assert actual.emotional_state == expected.emotional_state
+            assert actual.consecutive_turns_speaking == expected.consecutive_turns_speaking
+        generate_coaching_hint(session)
+
+
+def test_snapshots_are_detached_from_the_arrays():
+    session = _session(_roster(random.Random(1)))
+    engagement = session.students["s0"].engagement
+    snapshot = session.students["s0"]
+    snapshot.engagement = 0.0
+    assert session.students["s0"].engagement == engagement
+    assert session.students.engagement[0] == engagement
+
+
+def test_round_trip_and_dict_interface():
+    roster = _roster(random.Random(2))
+    session = _session(roster)
+    restored = SessionState.model_validate_json(session.model_dump_json())
+    assert isinstance(restored.students, ClassroomState)
+    assert list(restored.students) == list(roster)
+    assert dict(restored.students.items()) == roster
+    assert "s1" in restored.students and "nope" not in restored.students
+    assert restored.students.get("nope") is None
+    assert session.model_dump()["students"] == {sid: s.model_dump() for sid, s in roster.items()}
+
+
+def test_coaching_hint_reads_the_arrays():
+    session = _session({
+        "a": StudentState(id="a", name="Ana", persona="p", voice_id="v", engagement=0.9, comprehension=0.9),
+        "b": StudentState(id="b", name="Ben", persona="p", voice_id="v", engagement=0.2,
+                          comprehension=0.6, emotional_state=EmotionalState.bored),
+    })
+    assert generate_coaching_hint(session).startswith("⚠️ Ben is disengaging")
+    session.students.emotion[0] = EMOTION_CODES["confused"]
+    assert generate_coaching_hint(session).startswith("💡 Ana looks confused")
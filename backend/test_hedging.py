@@ -0,0 +1,121 @@
+"""
+Request hedging: the percentile threshold and which latencies feed it.
+Run from the backend directory: python -m pytest test_hedging.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from services import hedging
+from services.llm_scheduler import LLMScheduler, Priority
+
+
+@pytest.fixture
+def tracker(request, monkeypatch):
+    monkeypatch.setattr(hedging, "_ENABLED", True)
+    agent = request.node.name
+    yield agent, hedging._tracker(agent)
+    hedging._agents.pop(agent, None)
+
+
+def _warm(tracker, seconds: float = 0.05) -> None:
+    tracker.samples.extend([seconds] * hedging._MIN_SAMPLES)
+
+
+def test_threshold_needs_min_samples_then_tracks_the_percentile(tracker):
+    _, latency = tracker
+    latency.samples.extend([0.01] * (hedging._MIN_SAMPLES - 1))
+    assert latency.percentile(95) is None
+    latency.samples.extend([0.01] * 80 + [1.0] * 19)  # 100 samples, the slowest 19% at 1s
+    assert latency.percentile(50) == 0.01
+    assert latency.percentile(95) == 1.0
+
+
+def test_fast_call_is_not_hedged(tracker):
+    agent, latency = tracker
+    _warm(latency)
+    calls = 0
+
+    async def call() -> str:
+        nonlocal calls
+        calls += 1
+        return "ok"
+
+    assert asyncio.run(hedging.hedged(agent, call)) == "ok"
+    assert calls == 1 and latency.hedged == 0
+    assert len(latency.samples) == hedging._MIN_SAMPLES + 1
+
+
+def test_duplicate_wins_and_the_cancelled_primary_is_still_sampled(tracker):
+    agent, latency = tracker
+    _warm(latency)
+    scheduler = LLMScheduler()
+    delays = [1.0, 0.01]
+    cancelled = []
+
+    async def upstream() -> float:
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    async def scenario() -> tuple[float, float]:
+        started = time.monotonic()
+        result = await hedging.hedged(agent, lambda: scheduler.run(Priority.LIVE, 10, upstream))
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(0.01)  # let the cancelled primary unwind
+        return result, elapsed
+
+    result, elapsed = asyncio.run(scenario())
+    assert result == 0.01 and elapsed < 0.5
+    assert cancelled == [1.0]
+    assert latency.hedged == 1 and latency.hedge_wins == 1
+    # One sample for the call: the primary's time until it was cancelled, not the duplicate's
+    assert len(latency.samples) == hedging._MIN_SAMPLES + 1
+    assert latency.samples[-1] >= 0.05
+
+
+def test_latency_excludes_time_queued_in_the_scheduler(tracker):
+    agent, latency = tracker
+    scheduler = LLMScheduler(max_concurrent=1)
+
+    async def upstream() -> None:
+        await asyncio.sleep(0.05)
+
+    async def scenario() -> None:
+        holder = asyncio.create_task(scheduler.run(Priority.LIVE, 10, lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        await hedging.hedged(agent, lambda: scheduler.run(Priority.LIVE, 10, upstream))
+        await holder
+
+    asyncio.run(scenario())
+    assert latency.samples[-1] == pytest.approx(0.05, abs=0.03)
+
+
+def test_call_cancelled_while_queued_records_nothing(tracker):
+    agent, latency = tracker
+    scheduler = LLMScheduler(max_concurrent=1)
+
+    async def upstream() -> None:
+        await asyncio.sleep(0.01)
+
+    async def scenario() -> None:
+        holder = asyncio.create_task(scheduler.run(Priority.LIVE, 10, lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hedging.hedged(agent, lambda: scheduler.run(Priority.LIVE, 10, upstream)))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        await holder
+
+    asyncio.run(scenario())
+    assert len(latency.samples) == 0
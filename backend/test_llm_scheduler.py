@@ -0,0 +1,124 @@
+"""
+LLMScheduler: priority lanes, the analysis token reserve and 429 pauses.
+Run from the backend directory: python -m pytest test_llm_scheduler.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+import openai
+import pytest
+
+from services.llm_scheduler import LLMScheduler, Priority, _retry_after
+
+
+def _rate_limit_error(headers: dict[str, str]) -> openai.RateLimitError:
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://example.invalid"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_waiters_start_in_priority_order():
+    async def scenario() -> list[str]:
+        scheduler = LLMScheduler(max_concurrent=1)
+        release = asyncio.Event()
+        order: list[str] = []
+
+        async def blocker() -> None:
+            await release.wait()
+
+        def call(name: str):
+            async def run() -> None:
+                order.append(name)
+            return run
+
+        holding = asyncio.create_task(scheduler.run(Priority.LIVE, 10, blocker))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.create_task(scheduler.run(priority, 10, call(priority.name)))
+            for priority in (Priority.ANALYSIS, Priority.ORCHESTRATOR, Priority.LIVE, Priority.ANALYSIS)
+        ]
+        await asyncio.sleep(0.01)
+        assert order == []
+        release.set()
+        await asyncio.gather(holding, *waiting)
+        return order
+
+    assert asyncio.run(scenario()) == ["LIVE", "ORCHESTRATOR", "ANALYSIS", "ANALYSIS"]
+
+
+def test_analysis_leaves_the_token_reserve_to_live_requests():
+    async def scenario() -> tuple[bool, bool]:
+        scheduler = LLMScheduler(tpm=6000, analysis_reserve=0.5)
+
+        async def noop() -> None:
+            return None
+
+        await scheduler.run(Priority.LIVE, 2000, noop)
+        # 4000 tokens left: another 2000 would dip into the 3000-token reserve
+        analysis = asyncio.create_task(scheduler.run(Priority.ANALYSIS, 2000, noop))
+        await asyncio.sleep(0.05)
+        analysis_started = analysis.done()
+        analysis.cancel()
+        live = asyncio.create_task(scheduler.run(Priority.LIVE, 2000, noop))
+        await asyncio.sleep(0.05)
+        return analysis_started, live.done()
+
+    analysis_started, live_started = asyncio.run(scenario())
+    assert not analysis_started
+    assert live_started
+
+
+def test_rate_limit_pauses_every_request_then_retries():
+    async def scenario() -> tuple[float, float, LLMScheduler]:
+        scheduler = LLMScheduler(max_retries=2)
+        attempts = 0
+
+        async def limited_once() -> str:
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise _rate_limit_error({"retry-after-ms": "200"})
+            return "ok"
+
+        async def other() -> float:
+            return time.monotonic()
+
+        started = time.monotonic()
+        first = asyncio.create_task(scheduler.run(Priority.LIVE, 10, limited_once))
+        await asyncio.sleep(0.02)  # the 429 has arrived and the pause is in effect
+        other_started = await scheduler.run(Priority.LIVE, 10, other)
+        assert await first == "ok"
+        return started, other_started, scheduler
+
+    started, other_started, scheduler = asyncio.run(scenario())
+    assert other_started - started >= 0.18
+    assert scheduler.rate_limited == 1
+    assert scheduler.retries == 1
+
+
+def test_rate_limit_gives_up_after_max_retries():
+    async def scenario() -> None:
+        scheduler = LLMScheduler(max_retries=1)
+
+        async def always_limited() -> None:
+            raise _rate_limit_error({"retry-after-ms": "10"})
+
+        await scheduler.run(Priority.LIVE, 10, always_limited)
+
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after-ms": "1500"}, 1.5),
+    ({"retry-after": "3"}, 3.0),
+    ({"retry-after": "soon"}, None),
+    ({}, None),
+])
+def test_retry_after_headers(headers, expected):
+    assert _retry_after(_rate_limit_error(headers)) == expected
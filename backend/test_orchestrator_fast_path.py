@@ -0,0 +1,105 @@
+"""
+Orchestrator fast path: local decisions against the LLM orchestrator's.
+Run from the backend directory: python -m pytest test_orchestrator_fast_path.py
+
+Each case is a turn with the LLM orchestrator's pick. The demo-script turns come from
+docs/test-conversation.md; the rest follow the orchestrator prompt's rules. The fast path
+may escalate any turn, but when it decides locally it must pick the same students.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from agents import orchestrator
+from main import DEFAULT_STUDENTS
+from models import EmotionalState, SessionConfig, SessionState
+
+E = EmotionalState
+_LOW = {"engagement": 0.15, "emotional_state": E.bored}
+
+
+def _session(**overrides: dict) -> SessionState:
+    students = {s.id: s.model_copy(update=overrides.get(s.id, {})) for s in DEFAULT_STUDENTS}
+    return SessionState(
+        session_id="s",
+        config=SessionConfig(subject="Biology", topic="Photosynthesis", grade_level="Grade 9"),
+        students=students,
+    )
+
+
+DECISIONS = [
+    # questions
+    ("What do plants need to make their own food?", {}, {"maya", "carlos"}),
+    ("Why do you think leaves are green?", {"maya": {"consecutive_turns_speaking": 2}}, {"carlos"}),
+    ("Does anyone know what chlorophyll is?", {sid: _LOW for sid in ("maya", "carlos", "jake", "priya", "marcus")}, set()),
+    # statements
+    ("Good job, that's exactly right.", {}, set()),
+    ("Photosynthesis is the biochemical transduction of solar electromagnetic radiation into "
+     "chemical potential energy via chlorophyll-mediated oxidative phosphorylation.", {}, {"carlos"}),
+    ("Okay, open your books to page 40.", {sid: _LOW for sid in ("maya", "carlos", "jake", "priya", "marcus")}, set()),
+    ("Let me walk you through the light reactions step by step.",
+     {"jake": {"engagement": 0.9, "emotional_state": E.engaged}, "maya": _LOW, "carlos": _LOW}, {"jake"}),
+    # name mentions
+    ("Carlos, Marcus — before I go further, what do you two think? Does anything about how "
+     "plants work already make sense to you, or is it a mystery?", {}, {"carlos", "marcus"}),
+    ("Jake — just you, nobody else. Since your phone's already out: is water a solid, liquid, "
+     "or gas right before it evaporates? One word.", {}, {"jake"}),
+    ("Marcus — here's a controversial one: scientists want to engineer super-plants that "
+     "photosynthesize 10x faster to fight climate change. Good idea, or are we playing with fire?",
+     {"marcus": {"engagement": 0.6, "emotional_state": E.engaged}}, {"marcus", "maya"}),
+    ("Priya — Marcus just said it could backfire. Do you agree with him, or does your gut say "
+     "something different? No wrong answer.", {"marcus": {"engagement": 0.8, "emotional_state": E.engaged}}, {"priya"}),
+    ("Good job, Maya.", {sid: _LOW for sid in ("carlos", "jake", "priya", "marcus")}, {"maya"}),
+]
+
+
+@pytest.mark.parametrize("teacher_input, overrides, llm_pick", DECISIONS)
+def test_fast_path_agrees_with_llm_or_escalates(teacher_input, overrides, llm_pick):
+    local = orchestrator._fast_path_responders(teacher_input, _session(**overrides))
+    if local is not None:
+        assert {r["student_id"] for r in local} == llm_pick
+
+
+def test_fast_path_still_decides_clear_turns():
+    decided = [
+        orchestrator._fast_path_responders(text, _session(**overrides)) is not None
+        for text, overrides, _ in DECISIONS
+    ]
+    assert sum(decided) >= len(DECISIONS) // 2
+
+
+@pytest.mark.parametrize("teacher_input, overrides, llm_pick", [
+    ("Good morning everyone! Today we're learning about photosynthesis — how plants turn sunlight "
+     "into food. Who can tell me what they already know about it?", {},
+     {"maya", "carlos", "jake", "priya", "marcus"}),
+    ("Let's go around the room, one by one: tell me one thing you learned today.",
+     {"jake": {"consecutive_turns_speaking": 3}}, {"maya", "carlos", "priya", "marcus"}),
+])
+def test_group_addresses_are_decided_locally(teacher_input, overrides, llm_pick):
+    session = _session(**overrides)
+    assert not orchestrator.needs_llm_decision(teacher_input, session)
+    responders = asyncio.run(orchestrator.decide_responders(teacher_input, session))
+    assert {r["student_id"] for r in responders} == llm_pick
+
+
+@pytest.mark.parametrize("sid, state", [
+    ("carlos", {}),                                                       # confused, default roster
+    ("maya", {"engagement": 0.9, "emotional_state": E.confused}),
+    ("marcus", {"engagement": 0.8, "emotional_state": E.anxious}),
+    ("jake", {"engagement": 0.9, "emotional_state": E.engaged}),          # class clown
+])
+def test_statements_can_draw_confused_anxious_and_class_clown(sid, state):
+    session = _session(**{sid: state})
+    score = orchestrator.score_responders("Plants turn sunlight into sugar.", session)[sid]
+    assert score > orchestrator._SELECT_THRESHOLD - orchestrator._FAST_PATH_MARGIN
+
+
+def test_mentioned_student_is_left_to_the_llm():
+    scores = orchestrator.score_responders("Priya — Marcus just said it could backfire.", _session())
+    assert scores["priya"] == 1.0
+    assert scores["marcus"] == orchestrator._SELECT_THRESHOLD
@@ -0,0 +1,68 @@
+"""
+Responder scheduling: which classmates' replies each student's LLM call sees.
+Run from the backend directory: python -m pytest test_responder_scheduling.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient
+
+import main
+from agents.student_agent import StudentResponse
+from models import EmotionalState
+
+
+def _play_turn(monkeypatch, scheduling: str) -> dict[str, list[str]]:
+    """Run one group-addressed turn; returns the speakers each student's generation saw."""
+    seen: dict[str, list[str]] = {}
+
+    async def spy_generate(student_dict, teacher_input, history, lesson_context, use_cache=True):
+        seen[student_dict["name"]] = [e["speaker"] for e in history]
+        return StudentResponse(
+            text=f"{student_dict['name']} answers.",
+            emotional_state=EmotionalState.engaged,
+            comprehension_delta=5,
+            engagement_delta=5,
+        )
+
+    async def no_audio(text, voice_id):
+        return None
+
+    monkeypatch.setattr(main, "generate_response", spy_generate)
+    monkeypatch.setattr(main, "text_to_speech", no_audio)
+    with TestClient(main.app) as client:
+        session_id = client.post("/session", json={
+            "subject": "Math", "topic": "Fractions", "grade_level": "Grade 7",
+            "responder_scheduling": scheduling,
+        }).json()["session_id"]
+        with client.websocket_connect(f"/ws/{session_id}") as ws:
+            ws.send_text(json.dumps({"type": "teacher_input", "text": "Everyone, what is a half of a half?"}))
+            while json.loads(ws.receive_text())["type"] not in ("state_update", "error"):
+                pass
+    return seen
+
+
+def test_first_then_parallel_later_students_see_first_reply(monkeypatch):
+    seen = _play_turn(monkeypatch, "first_then_parallel")
+    assert len(seen) > 2
+    first, *rest = seen
+    assert seen[first] == ["teacher"]
+    for name in rest:
+        assert seen[name] == ["teacher", first]
+
+
+def test_parallel_students_see_only_teacher(monkeypatch):
+    seen = _play_turn(monkeypatch, "parallel")
+    assert len(seen) > 2
+    assert all(speakers == ["teacher"] for speakers in seen.values())
+
+
+def test_sequential_students_see_every_earlier_reply(monkeypatch):
+    seen = _play_turn(monkeypatch, "sequential")
+    names = list(seen)
+    for index, name in enumerate(names):
+        assert seen[name] == ["teacher", *names[:index]]
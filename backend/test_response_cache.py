@@ -0,0 +1,140 @@
+"""
+Student response cache: key bucketing, context hashing, TTL and per-session opt-out.
+Run from the backend directory: python -m pytest test_response_cache.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agents import student_agent
+from agents.student_agent import StudentResponse, StudentState, _cache_key
+from models import EmotionalState
+from personas.personas import get_persona
+from services import lru_cache
+
+_LESSON = {"subject": "Biology", "topic": "Photosynthesis", "grade_level": "Grade 9"}
+_HISTORY = [{"speaker": "teacher", "text": "Today: photosynthesis."}, {"speaker": "Maya", "text": "Ooh, plants!"}]
+_QUESTION = "What do plants need to make food?"
+
+
+def _state(comprehension: int = 80, engagement: int = 90) -> StudentState:
+    return StudentState("Maya", comprehension, engagement, EmotionalState.eager, [])
+
+
+def _key(state: StudentState | None = None, teacher_input: str = _QUESTION,
+         history: list[dict] = _HISTORY, lesson: dict | None = _LESSON) -> tuple:
+    state = state or _state()
+    return _cache_key(state, get_persona(state.name), teacher_input, history, lesson)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lru_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """Fresh response cache; counts the student LLM calls that get past it."""
+    calls = []
+    monkeypatch.setattr(student_agent, "_response_cache", lru_cache.LRUCache(max_entries=16, ttl=300))
+
+    async def fake_hedged(agent, call):
+        calls.append(agent)
+        return {"text": f"Sunlight and water! ({len(calls)})", "emotional_state": "eager",
+                "comprehension_delta": 5, "engagement_delta": 5}
+    monkeypatch.setattr(student_agent, "hedged", fake_hedged)
+    return calls
+
+
+def _ask(use_cache: bool = True, state: StudentState | None = None) -> StudentResponse:
+    return asyncio.run(student_agent.generate_response(state or _state(), _QUESTION, _HISTORY, _LESSON, use_cache=use_cache))
+
+
+def test_scores_are_bucketed_to_tens():
+    assert _key(_state(80, 90)) == _key(_state(89, 99))
+    assert _key(_state(80, 90)) != _key(_state(79, 90))
+    assert _key(_state(80, 90)) != _key(_state(80, 89))
+
+
+def test_wording_is_normalized():
+    assert _key(teacher_input="  what do PLANTS need, to make food?") == _key()
+    assert _key(teacher_input="What do plants need to make food.") != _key()
+
+
+def test_history_and_lesson_separate_contexts():
+    other_reply = [_HISTORY[0], {"speaker": "Carlos", "text": "Ooh, plants!"}]
+    assert _key(history=other_reply) != _key()
+    assert _key(history=[]) != _key()
+    assert _key(lesson={**_LESSON, "topic": "Cell respiration"}) != _key()
+    assert _key(lesson={**_LESSON, "grade_level": "Grade 5"}) != _key()
+    assert _key(lesson=None) != _key()
+
+
+def test_history_beyond_the_prompt_window_is_ignored():
+    older = [{"speaker": "teacher", "text": f"Point {i}."} for i in range(student_agent.HISTORY_WINDOW)]
+    assert _key(history=older + _HISTORY) == _key(history=older[2:] + _HISTORY)
+
+
+def test_equivalent_prompt_is_served_from_cache(llm_calls):
+    first = _ask()
+    assert _ask(state=_state(85, 95)) is first
+    assert len(llm_calls) == 1
+    stats = student_agent.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl(llm_calls, clock):
+    first = _ask()
+    clock[0] += 299
+    assert _ask() is first
+    clock[0] += 2
+    assert _ask() is not first
+    assert len(llm_calls) == 2
+    stats = student_agent.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+
+
+def test_use_cache_false_bypasses_the_cache(llm_calls):
+    _ask()
+    _ask(use_cache=False)
+    _ask(use_cache=False)
+    assert len(llm_calls) == 3
+    stats = student_agent.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 1, 1)
+
+
+@pytest.mark.parametrize("response_cache", [True, False])
+def test_session_config_controls_cache_use(monkeypatch, response_cache):
+    seen = []
+
+    async def spy_generate(student_dict, teacher_input, history, lesson_context, use_cache=True):
+        seen.append(use_cache)
+        return StudentResponse(text="Sunlight!", emotional_state=EmotionalState.eager,
+                               comprehension_delta=5, engagement_delta=5)
+
+    async def no_audio(text, voice_id):
+        return None
+
+    monkeypatch.setattr(main, "generate_response", spy_generate)
+    monkeypatch.setattr(main, "text_to_speech", no_audio)
+    with TestClient(main.app) as client:
+        session_id = client.post("/session", json={
+            "subject": "Biology", "topic": "Photosynthesis", "grade_level": "Grade 9",
+            "response_cache": response_cache,
+        }).json()["session_id"]
+        with client.websocket_connect(f"/ws/{session_id}") as ws:
+            ws.send_text(json.dumps({"type": "teacher_input", "text": "Everyone, what do plants need?"}))
+            while json.loads(ws.receive_text())["type"] not in ("state_update", "error"):
+                pass
+    assert seen and all(use_cache is response_cache for use_cache in seen)
@@ -0,0 +1,403 @@
+"""
+Session store: leases, versions and eviction, for the memory and SQLite backends.
+Run from the backend directory: python -m pytest test_session_store.py
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import httpx
+import pytest
+
+import main
+from agents.student_agent import StudentResponse
+from models import _SESSION_ENVELOPE_BYTES, ClassroomState, EmotionalState, SessionConfig, SessionState, TurnLog
+from services import session_store
+from services.session_actor import SessionActors
+from services.session_store import SessionBusy, SessionConflict, SessionStore, SQLiteSessionStore
+
+_CONFIG = SessionConfig(subject="Biology", topic="Photosynthesis", grade_level="Grade 9")
+
+
+def _sqlite(tmp_path, **kwargs) -> SQLiteSessionStore:
+    options = {"idle_ttl": 3600, "ended_ttl": 60, "max_bytes": 1 << 30, "lease_wait": 0.2, **kwargs}
+    return SQLiteSessionStore(SessionState, str(tmp_path / "sessions.db"), **options)
+
+
+def _new_session(session_id: str = "s1") -> SessionState:
+    students = {s.id: s.model_copy(deep=True) for s in main.DEFAULT_STUDENTS}
+    return SessionState(session_id=session_id, config=_CONFIG, students=students)
+
+
+def _store(backend: str, tmp_path, **kwargs) -> SessionStore:
+    if backend == "sqlite":
+        return _sqlite(tmp_path, **kwargs)
+    return SessionStore(SessionState, **{"idle_ttl": 3600, "ended_ttl": 60, "max_bytes": 1 << 30, **kwargs})
+
+
+async def _end(store: SessionStore, session_id: str) -> None:
+    async with store.lease(session_id) as session:
+        session.active = False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """One fake clock behind the store's monotonic (resident) and wall (row) timestamps."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(session_store, "time", SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0]))
+    return now
+
+
+def _lease_row(store: SQLiteSessionStore, session_id: str) -> tuple:
+    rows, _ = store._execute("SELECT owner, lease_until FROM sessions WHERE session_id = ?", (session_id,))
+    return rows[0]
+
+
+def _held_by_other_worker(store: SQLiteSessionStore, session_id: str, until: float) -> None:
+    store._execute("UPDATE sessions SET owner = 'other-host:1', lease_until = ? WHERE session_id = ?", (until, session_id))
+
+
+# --- leases ---
+
+def test_lease_is_released_after_the_block(tmp_path):
+    store = _sqlite(tmp_path)
+
+    async def scenario() -> tuple:
+        await store.save(_new_session())
+        async with store.lease("s1") as session:
+            session.turn_count += 1
+            held = _lease_row(store, "s1")
+        return held
+
+    owner, until = asyncio.run(scenario())
+    assert owner is not None and until > time.time()
+    assert _lease_row(store, "s1") == (None, None)
+    assert store.known_version("s1") == 2
+
+
+def test_live_lease_of_another_worker_makes_the_session_busy(tmp_path):
+    store = _sqlite(tmp_path)
+
+    async def scenario() -> None:
+        await store.save(_new_session())
+        _held_by_other_worker(store, "s1", time.time() + 30)
+        async with store.lease("s1"):
+            pass
+
+    with pytest.raises(SessionBusy):
+        asyncio.run(scenario())
+    assert store.lease_waits == 1
+
+
+def test_expired_lease_of_another_worker_is_taken_over(tmp_path):
+    store = _sqlite(tmp_path)
+
+    async def scenario() -> int:
+        await store.save(_new_session())
+        _held_by_other_worker(store, "s1", time.time() - 1)
+        async with store.lease("s1") as session:
+            session.turn_count = 7
+        return (await store.get("s1")).turn_count
+
+    assert asyncio.run(scenario()) == 7
+    assert store.lease_waits == 0
+
+
+# --- versions ---
+
+def test_lease_reloads_a_session_saved_by_another_worker(tmp_path):
+    first, second = _sqlite(tmp_path), _sqlite(tmp_path)
+
+    async def scenario() -> int:
+        await first.save(_new_session())
+        assert (await second.get("s1")).turn_count == 0
+        async with first.lease("s1") as session:
+            session.turn_count = 3
+        async with second.lease("s1") as session:
+            return session.turn_count
+
+    assert asyncio.run(scenario()) == 3
+    assert second.loads == 2
+
+
+def test_save_over_a_moved_version_conflicts(tmp_path):
+    first, second = _sqlite(tmp_path), _sqlite(tmp_path)
+
+    async def scenario() -> None:
+        await first.save(_new_session())
+        stale = await second.get("s1")
+        # second's lease expired mid-command and first saved in the meantime
+        async with first.lease("s1") as session:
+            session.turn_count = 1
+        stale.turn_count = 99
+        await second.save(stale)
+
+    with pytest.raises(SessionConflict):
+        asyncio.run(scenario())
+    assert second.conflicts == 1
+    assert asyncio.run(first.get("s1")).turn_count == 1
+
+
+def test_held_session_is_refreshed_in_place(tmp_path):
+    first, second = _sqlite(tmp_path), _sqlite(tmp_path)
+
+    async def scenario() -> tuple:
+        await first.save(_new_session())
+        held = await second.get("s1")
+        async with first.lease("s1") as session:
+            session.turn_count = 5
+        return held, await second.get("s1")
+
+    held, current = asyncio.run(scenario())
+    assert current is held and held.turn_count == 5
+    assert second.known_version("s1") == 2
+
+
+def test_session_deleted_by_another_worker_is_gone(tmp_path):
+    first, second = _sqlite(tmp_path), _sqlite(tmp_path)
+
+    async def scenario() -> SessionState | None:
+        await first.save(_new_session())
+        assert await second.get("s1") is not None
+        await first.delete("s1")
+        return await second.get("s1")
+
+    assert asyncio.run(scenario()) is None
+    assert second.known_version("s1") is None and second.bytes == 0
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_every_save_moves_the_version(backend, tmp_path):
+    store = _store(backend, tmp_path)
+
+    async def scenario() -> None:
+        await store.save(_new_session())
+        for _ in range(3):
+            async with store.lease("s1") as session:
+                session.turn_count += 1
+
+    asyncio.run(scenario())
+    assert store.known_version("s1") == 4
+    assert asyncio.run(store.version("s1")) == 4
+
+
+# --- eviction ---
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_idle_sessions_are_swept(backend, tmp_path, clock):
+    store = _store(backend, tmp_path, idle_ttl=100)
+
+    async def scenario() -> None:
+        await store.save(_new_session("s1"))
+        await store.save(_new_session("s2"))
+        clock[0] += 60
+        async with store.lease("s2"):
+            pass
+        clock[0] += 60
+        await store.sweep()
+
+    asyncio.run(scenario())
+    assert asyncio.run(store.get("s1")) is None
+    assert asyncio.run(store.get("s2")) is not None
+    assert asyncio.run(store.count()) == 1
+    assert store.evictions == {"idle": 1, "ended": 0, "memory": 0}
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_ended_sessions_are_swept_after_their_ttl(backend, tmp_path, clock):
+    store = _store(backend, tmp_path, idle_ttl=3600, ended_ttl=60)
+
+    async def scenario() -> list:
+        await store.save(_new_session("live"))
+        await store.save(_new_session("ended"))
+        await _end(store, "ended")
+        clock[0] += 30
+        await store.sweep()
+        kept = sorted(store._resident)
+        clock[0] += 31
+        await store.sweep()
+        return kept
+
+    assert asyncio.run(scenario()) == ["ended", "live"]
+    assert asyncio.run(store.get("ended")) is None
+    assert asyncio.run(store.get("live")) is not None
+    assert store.evictions == {"idle": 0, "ended": 1, "memory": 0}
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_memory_budget_evicts_ended_then_least_recently_used(backend, tmp_path):
+    store = _store(backend, tmp_path)
+
+    async def scenario() -> list[list[str]]:
+        await store.save(_new_session("s1"))
+        size = store.bytes
+        store.max_bytes = int(size * 3.5)
+        await store.save(_new_session("s2"))
+        await store.save(_new_session("s3"))
+        await _end(store, "s2")
+        await store.get("s1")  # least recently used: s3, then s2 (ended), then s1
+        gc.collect()  # nothing outside the store holds a session
+        order = []
+        for session_id in ("s4", "s5", "s6"):
+            await store.save(_new_session(session_id))
+            order.append(sorted(store._resident))
+            gc.collect()
+        return order
+
+    assert asyncio.run(scenario()) == [
+        ["s1", "s3", "s4"],  # the ended session goes first even though s3 is older
+        ["s1", "s4", "s5"],  # then the least recently used live one
+        ["s4", "s5", "s6"],
+    ]
+    assert store.evictions["memory"] == 3
+    assert store.bytes <= store.max_bytes
+    # memory: eviction deletes; sqlite: only the resident copy goes and the row reloads
+    reloaded = asyncio.run(store.get("s3"))
+    if backend == "memory":
+        assert reloaded is None
+    else:
+        assert reloaded is not None and store.loads == 1
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_memory_budget_keeps_a_session_a_handler_still_holds(backend, tmp_path):
+    store = _store(backend, tmp_path)
+
+    async def scenario() -> tuple:
+        held = _new_session("s1")
+        await store.save(held)
+        store.max_bytes = store.bytes
+        await store.save(_new_session("s2"))
+        return held, await store.get("s1")
+
+    held, current = asyncio.run(scenario())
+    assert current is held
+    assert store.evictions["memory"] >= 1
+
+
+# --- byte accounting ---
+
+def test_turn_log_bytes_follow_appends_and_round_trip():
+    log = TurnLog()
+    entries = [{"turn": 1, "speaker": "teacher", "text": "What is chlorophyll?"},
+               {"turn": 1, "speaker": "Maya", "student_id": "maya", "text": "The green stuff!"}]
+    for entry in entries:
+        log.append(entry)
+    assert log.bytes == sum(len(json.dumps(e)) for e in entries)
+    session = _new_session()
+    session.timeline = log
+    assert SessionState.model_validate_json(session.model_dump_json()).timeline.bytes == log.bytes
+
+
+def test_classroom_bytes_are_the_roster_json():
+    classroom = ClassroomState(s.model_copy() for s in main.DEFAULT_STUDENTS)
+    assert classroom.bytes == sum(len(s.model_dump_json()) for s in main.DEFAULT_STUDENTS)
+    session = _new_session()
+    assert SessionState.model_validate_json(session.model_dump_json()).students.bytes == classroom.bytes
+
+
+def test_approx_bytes_never_underestimates_the_serialized_session():
+    session = _new_session()
+    for turn in range(1, 41):
+        session.timeline.append({"turn": turn, "speaker": "teacher", "text": "Why are leaves green? " * 5})
+        session.timeline.append({"turn": turn, "speaker": "Maya", "student_id": "maya", "text": "Chlorophyll!"})
+    serialized = len(session.model_dump_json())
+    assert session.approx_bytes() == _SESSION_ENVELOPE_BYTES + session.students.bytes + session.timeline.bytes
+    assert serialized <= session.approx_bytes() < serialized * 1.25
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_store_bytes_track_saves_and_drops(backend, tmp_path):
+    store = _store(backend, tmp_path)
+
+    async def scenario() -> tuple[list[int], SessionState]:
+        session = _new_session()
+        await store.save(session)
+        sizes = [store.bytes]
+        session.timeline.append({"turn": 1, "speaker": "teacher", "text": "Why are leaves green?"})
+        await store.save(session)
+        sizes.append(store.bytes)
+        await store.save(_new_session("s2"))
+        sizes.append(store.bytes)
+        await store.delete("s1")
+        await store.delete("s2")
+        sizes.append(store.bytes)
+        return sizes, session
+
+    (first, grown, both, emptied), session = asyncio.run(scenario())
+    # sqlite holds the JSON it wrote; memory never serializes and uses the estimate
+    expected = len(session.model_dump_json()) if backend == "sqlite" else session.approx_bytes()
+    assert grown == expected and grown > first
+    assert both > grown
+    assert emptied == 0
+
+
+# --- HTTP ---
+
+@pytest.fixture
+def sqlite_app(tmp_path, monkeypatch):
+    store = _sqlite(tmp_path)
+    monkeypatch.setattr(main, "sessions", store)
+    monkeypatch.setattr(main, "actors", SessionActors(store))
+
+    async def reaction(student_dict, teacher_input, history, lesson_context, use_cache=True):
+        return StudentResponse(text="Whoa!", emotional_state=EmotionalState.distracted, comprehension_delta=0, engagement_delta=-5)
+
+    monkeypatch.setattr(main, "generate_response", reaction)
+    yield store
+    store.close()
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+
+
+def test_chaos_answers_409_while_another_worker_holds_the_lease(sqlite_app):
+    async def scenario() -> httpx.Response:
+        async with _client() as client:
+            session_id = (await client.post("/session", json=_CONFIG.model_dump())).json()["session_id"]
+            _held_by_other_worker(sqlite_app, session_id, time.time() + 30)
+            return await client.post(f"/session/{session_id}/chaos")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 409
+    assert "busy" in response.json()["detail"]
+
+
+def test_chaos_releases_the_lease_before_waiting_for_audio(sqlite_app, monkeypatch):
+    audio_ready = asyncio.Event()
+
+    async def slow_synthesis(segments):
+        await audio_ready.wait()
+        return [b"mp3"] * len(segments)
+
+    monkeypatch.setattr(main, "synthesize_speech_many", slow_synthesis)
+
+    async def scenario() -> tuple[tuple, httpx.Response]:
+        async with _client() as client:
+            session_id = (await client.post("/session", json=_CONFIG.model_dump())).json()["session_id"]
+            chaos = asyncio.create_task(client.post(f"/session/{session_id}/chaos"))
+
+            async def saved() -> None:
+                while sqlite_app.known_version(session_id) == 1:
+                    await asyncio.sleep(0.01)
+
+            try:
+                await asyncio.wait_for(saved(), timeout=2.0)  # the chaos command saves before its audio is ready
+                row = _lease_row(sqlite_app, session_id)
+                assert not chaos.done()
+            finally:
+                audio_ready.set()
+            return row, await chaos
+
+    row, response = asyncio.run(scenario())
+    assert row == (None, None)  # free for other workers while the audio was still being synthesized
+    assert response.status_code == 200
+    assert all(r["audio_base64"] for r in response.json()["responders"])
@@ -0,0 +1,125 @@
+"""
+Speculative generation: hit/waste accounting and cleanup when a turn fails.
+Run from the backend directory: python -m pytest test_speculation.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agents import speculation
+from agents.student_agent import StudentResponse
+from models import EmotionalState
+
+_STUDENT = {"name": "Maya", "comprehension": 80, "engagement": 90, "emotional_state": "eager", "response_history": []}
+_REPLY = StudentResponse(text="Oh! I know!", emotional_state=EmotionalState.eager, comprehension_delta=5, engagement_delta=5)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(speculation, "_stats", {"turns": 0, "started": 0, "hits": 0, "wasted": 0, "wasted_tokens": 0})
+
+
+def _generating(monkeypatch, behaviour):
+    async def fake_generate(student_state, teacher_input, history, lesson_context, use_cache=True):
+        return await behaviour()
+    monkeypatch.setattr(speculation, "generate_response", fake_generate)
+
+
+def test_committed_reply_is_a_hit(monkeypatch):
+    async def reply():
+        return _REPLY
+    _generating(monkeypatch, reply)
+
+    async def scenario():
+        spec = speculation.Speculation()
+        spec.start("maya", _STUDENT, "What is photosynthesis?", [], None)
+        return await spec.take("maya")
+
+    assert asyncio.run(scenario()) == _REPLY
+    stats = speculation.get_speculation_stats()
+    assert (stats["hits"], stats["wasted"], stats["hit_rate"]) == (1, 0, 1.0)
+
+
+def test_discarded_reply_is_waste(monkeypatch):
+    async def slow():
+        await asyncio.sleep(1)
+        return _REPLY
+    _generating(monkeypatch, slow)
+
+    async def scenario():
+        spec = speculation.Speculation()
+        spec.start("maya", _STUDENT, "What is photosynthesis?", [], None)
+        assert spec.take("carlos") is None
+        spec.discard()
+
+    asyncio.run(scenario())
+    stats = speculation.get_speculation_stats()
+    assert (stats["hits"], stats["wasted"], stats["hit_rate"]) == (0, 1, 0.0)
+    assert stats["wasted_tokens"] > 0
+
+
+@pytest.mark.parametrize("outcome", ["raises", "times out"])
+def test_committed_reply_that_fails_is_waste_not_a_hit(monkeypatch, outcome):
+    async def failing():
+        if outcome == "raises":
+            raise RuntimeError("upstream error")
+        await asyncio.sleep(1)
+    _generating(monkeypatch, failing)
+
+    async def scenario():
+        spec = speculation.Speculation()
+        spec.start("maya", _STUDENT, "What is photosynthesis?", [], None)
+        with pytest.raises((RuntimeError, asyncio.TimeoutError)):
+            await asyncio.wait_for(spec.take("maya"), timeout=0.05)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    stats = speculation.get_speculation_stats()
+    assert (stats["hits"], stats["wasted"]) == (0, 1)
+    assert stats["wasted_tokens"] > 0
+
+
+@pytest.mark.parametrize("failing", ["orchestration", "generation"])
+def test_failed_turn_cancels_speculative_replies(monkeypatch, failing):
+    cancelled = []
+
+    async def pending():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+    _generating(monkeypatch, pending)
+
+    async def decide(teacher_input, session):
+        await asyncio.sleep(0.01)  # the speculative replies are running by now
+        if failing == "orchestration":
+            raise RuntimeError("LLM down")
+        return [{"student_id": "jake", "reason": "not speculated"}]
+
+    async def generate(*args, **kwargs):
+        raise RuntimeError("LLM down")
+
+    monkeypatch.setattr(main, "needs_llm_decision", lambda teacher_input, session: True)
+    monkeypatch.setattr(main, "decide_responders", decide)
+    monkeypatch.setattr(main, "generate_response", generate)
+    with TestClient(main.app) as client:
+        session_id = client.post("/session", json={
+            "subject": "Biology", "topic": "Photosynthesis", "grade_level": "Grade 9",
+            "speculative_generation": True,
+        }).json()["session_id"]
+        with client.websocket_connect(f"/ws/{session_id}") as ws:
+            ws.send_text(json.dumps({"type": "teacher_input", "text": "What is photosynthesis?"}))
+            error = json.loads(ws.receive_text())
+    assert error["type"] == "error" and "LLM down" in error["message"]
+    stats = speculation.get_speculation_stats()
+    assert stats["started"] > 0
+    assert len(cancelled) == stats["started"] == stats["wasted"]
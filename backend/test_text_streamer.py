@@ -0,0 +1,56 @@
+"""
+_TextFieldStreamer: decoding the "text" value of a student reply while it streams.
+Run from the backend directory: python -m pytest test_text_streamer.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from agents.student_agent import _TextFieldStreamer
+
+
+def _stream(raw: str, step: int = 1) -> str:
+    streamer = _TextFieldStreamer()
+    return "".join(streamer.feed(raw[i:i + step]) for i in range(0, len(raw), step))
+
+
+@pytest.mark.parametrize("text", [
+    "Oh! So that means the plant eats sunlight?",
+    'She said "wait"\\ and left.\nThen\ttabs',
+    "Café — naïve 😀 ok",
+    "",
+])
+@pytest.mark.parametrize("step", [1, 3, 1000])
+def test_matches_json_decoding_in_any_fragment_size(text, step):
+    for ensure_ascii in (True, False):
+        raw = json.dumps({"text": text, "emotional_state": "eager"}, ensure_ascii=ensure_ascii)
+        assert _stream(raw, step) == text
+
+
+def test_surrogate_pair_split_across_fragments_is_one_character():
+    streamer = _TextFieldStreamer()
+    assert streamer.feed('{"text": "hi \\uD83D') == "hi "
+    assert streamer.feed("\\uDE") == ""
+    assert streamer.feed('00!"') == "😀!"
+
+
+def test_malformed_escape_does_not_raise():
+    assert _stream('{"text": "bad \\uZZ12 escape"}') == "bad �ZZ12 escape"
+
+
+def test_unpaired_surrogates_become_replacement_characters():
+    assert _stream('{"text": "a\\uD83Db"}') == "a�b"
+    assert _stream('{"text": "a\\uDE00b"}') == "a�b"
+    assert _stream('{"text": "a\\uD83D\\u0041"}') == "a�A"
+    assert _stream('{"text": "a\\uD83D"}') == "a�"
+
+
+def test_stops_at_end_of_value():
+    streamer = _TextFieldStreamer()
+    assert streamer.feed('{"text": "done", "emotional_state": "eager", "text2": "x"') == "done"
+    assert streamer.feed('}') == ""
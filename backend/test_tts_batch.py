@@ -0,0 +1,107 @@
+"""
+Multi-voice TTS batches: the SSML document, cutting its MP3 per segment and caching the clips.
+Run from the backend directory: python -m pytest test_tts_batch.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from services import azure_speech
+from services.tts_cache import TTSCache, cache_key
+from services.tts_pool import MeteredExecutor, SynthesizerPool
+
+_FRAME = azure_speech._MP3_FRAME_BYTES
+_SECONDS = azure_speech._MP3_FRAME_SECONDS
+
+
+def _frames(*labels: int) -> bytes:
+    """CBR MPEG-2 Layer III frames, each filled with its label byte after the sync word."""
+    return b"".join(b"\xff\xf3" + bytes([label]) * (_FRAME - 2) for label in labels)
+
+
+def _labels(clip: bytes) -> list[int]:
+    return [clip[i + 2] for i in range(0, len(clip), _FRAME)]
+
+
+def test_batch_ssml_has_a_voice_and_bookmark_per_segment():
+    ssml = azure_speech._batch_ssml([("en-US-AriaNeural", "Huh?"), ("en-US-GuyNeural", 'Tom & "Jerry" <3')])
+    assert ssml.startswith("<speak ") and ssml.endswith("</speak>")
+    assert '<voice name="en-US-AriaNeural"><bookmark mark="s0"/>Huh?</voice>' in ssml
+    assert '<voice name="en-US-GuyNeural"><bookmark mark="s1"/>Tom &amp; "Jerry" &lt;3</voice>' in ssml
+
+
+def test_split_mp3_cuts_on_the_nearest_frame_boundary():
+    audio = _frames(0, 0, 0, 1, 1, 2)
+    clips = azure_speech._split_mp3(audio, [0.0, 3 * _SECONDS + 0.01, 5 * _SECONDS - 0.01])
+    assert [_labels(clip) for clip in clips] == [[0, 0, 0], [1, 1], [2]]
+
+
+def test_split_mp3_skips_an_id3_tag():
+    tag = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + b"\xff\x00" * 5  # a stray 0xFF that is not a frame sync
+    clips = azure_speech._split_mp3(tag + _frames(0, 1), [0.0, _SECONDS])
+    assert [_labels(clip) for clip in clips] == [[0], [1]]
+
+
+def test_split_mp3_offsets_past_the_end_give_empty_clips():
+    audio = _frames(0, 1)
+    clips = azure_speech._split_mp3(audio, [0.0, _SECONDS, 10.0])
+    assert [_labels(clip) for clip in clips] == [[0], [1], []]
+    assert b"".join(clips) == audio
+
+
+class _FailingSynthesizer:
+    class _Signal:
+        def connect(self, handler) -> None:
+            pass
+
+        def disconnect_all(self) -> None:
+            pass
+
+    def __init__(self) -> None:
+        self.bookmark_reached = self._Signal()
+
+    def speak_ssml_async(self, ssml: str):
+        raise RuntimeError("connection reset")
+
+
+def test_failed_batch_returns_the_synthesizer_to_the_pool(monkeypatch):
+    pool = SynthesizerPool(lambda voice_id: _FailingSynthesizer(), per_voice=2)
+    monkeypatch.setattr(azure_speech, "_synthesizers", pool)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            azure_speech._synthesize_ssml_batch([("en-US-AriaNeural", "Huh?"), ("en-US-GuyNeural", "What?")])
+    stats = pool.stats()
+    assert stats["idle"] == {"en-US-AriaNeural": 1}
+    assert stats["created"] == 1 and stats["reused"] == 2
+
+
+def test_batch_clips_are_not_served_as_single_voice_audio(monkeypatch):
+    segments = [("en-US-AriaNeural", "Huh?"), ("en-US-GuyNeural", "What?")]
+    cache = TTSCache(memory_bytes=1 << 20)
+    batches = []
+
+    def fake_batch(batch: list[tuple[str, str]]) -> list[bytes]:
+        batches.append(batch)
+        return [_frames(i) for i in range(len(batch))]
+
+    monkeypatch.setattr(azure_speech, "_AVAILABLE", True)
+    monkeypatch.setattr(azure_speech, "_tts_cache", cache)
+    monkeypatch.setattr(azure_speech, "_synthesize_ssml_batch", fake_batch)
+    monkeypatch.setattr(azure_speech, "_tts_executor", MeteredExecutor(1, "tts-test"))  # app tests shut down the shared one
+
+    async def scenario() -> tuple[list, list, bytes | None]:
+        first = await azure_speech.synthesize_speech_many(segments)
+        again = await azure_speech.synthesize_speech_many(segments)
+        single = await cache.get(cache_key("en-US-AriaNeural", azure_speech._OUTPUT_FORMAT, "Huh?"))
+        return first, again, single
+
+    first, again, single = asyncio.run(scenario())
+    assert first == again == [_frames(0), _frames(1)]
+    assert len(batches) == 1  # the second call was served from the batch-clip keys
+    assert single is None
+    assert cache.stats()["misses"] == 3  # two batch misses, one single-voice lookup
@@ -0,0 +1,95 @@
+"""
+TurnLog: indexed lookups, read-only views and the session JSON round trip.
+Run from the backend directory: python -m pytest test_turn_log.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+from agents.orchestrator import update_student_states
+from models import EntryView, SessionConfig, SessionState, StudentState, TurnLog
+
+
+def _log(turns: int = 3) -> TurnLog:
+    log = TurnLog()
+    for turn in range(1, turns + 1):
+        log.append({"turn": turn, "speaker": "teacher", "text": f"question {turn}"})
+        log.append({"turn": turn, "speaker": "Maya", "student_id": "maya", "text": f"maya {turn}"})
+        if turn % 2:
+            log.append({"turn": turn, "speaker": "Jake", "student_id": "jake", "text": f"jake {turn}"})
+    return log
+
+
+def test_recent_returns_last_entries_in_order():
+    log = _log()
+    assert [e["text"] for e in log.recent(3)] == ["question 3", "maya 3", "jake 3"]
+    assert len(log.recent(100)) == len(log)
+    assert list(log.recent(0)) == []
+
+
+def test_indexes_by_turn_and_speaker():
+    log = _log()
+    assert [e["speaker"] for e in log.for_turn(1)] == ["teacher", "Maya", "Jake"]
+    assert [e["text"] for e in log.for_speaker("jake")] == ["jake 1", "jake 3"]
+    assert len(log.for_speaker("teacher")) == 3
+    assert list(log.for_turn(99)) == []
+    assert list(log.for_speaker("priya")) == []
+
+
+def test_views_share_entries_and_ignore_later_appends():
+    log = _log()
+    spoken = log.for_speaker("maya")
+    assert isinstance(spoken, EntryView)
+    assert spoken[-1] is list(log)[-2]
+    log.append({"turn": 4, "speaker": "Maya", "student_id": "maya", "text": "maya 4"})
+    assert len(spoken) == 3
+    assert len(log.for_speaker("maya")) == 4
+
+
+def test_view_indexing_and_slicing():
+    view = _log().for_speaker("teacher")
+    assert view[0]["text"] == "question 1"
+    assert view[-1]["text"] == "question 3"
+    assert [e["text"] for e in view[1:]] == ["question 2", "question 3"]
+    assert [e["text"] for e in view[-2:][1:]] == ["question 3"]
+    assert list(view[5:]) == []
+    with pytest.raises(IndexError):
+        view[3]
+    with pytest.raises(IndexError):
+        view[-4]
+
+
+def test_session_round_trip_rebuilds_indexes():
+    session = SessionState(
+        session_id="s",
+        config=SessionConfig(subject="Math", topic="Fractions", grade_level="Grade 7"),
+        timeline=list(_log()),
+    )
+    restored = SessionState.model_validate_json(session.model_dump_json())
+    assert isinstance(restored.timeline, TurnLog)
+    assert list(restored.timeline) == list(session.timeline)
+    assert [e["text"] for e in restored.timeline.for_speaker("jake")] == ["jake 1", "jake 3"]
+    assert session.model_dump()["timeline"] == list(session.timeline)
+
+
+def test_silent_replies_update_state_but_are_not_logged():
+    session = SessionState(
+        session_id="s",
+        config=SessionConfig(subject="Math", topic="Fractions", grade_level="Grade 7"),
+        students={
+            "maya": StudentState(id="maya", name="Maya", persona="p", voice_id="v"),
+            "jake": StudentState(id="jake", name="Jake", persona="p", voice_id="v"),
+        },
+    )
+    session.turn_count = 1
+    update_student_states(session, [
+        {"student_id": "maya", "text": "A quarter!", "emotional_state": "eager", "comprehension_delta": 6, "engagement_delta": 6},
+        {"student_id": "jake", "text": "  ", "emotional_state": "bored", "comprehension_delta": 0, "engagement_delta": -6},
+    ])
+    assert [e["student_id"] for e in session.timeline] == ["maya"]
+    assert session.students["jake"].consecutive_turns_speaking == 1
+    assert session.students["jake"].engagement == pytest.approx(0.65)